@@ -1,19 +1,28 @@
 # app.py - Flask web interface for the network diagnostic agent
 
+import json
 import os
 import sys
 from dotenv import load_dotenv
-from flask import Flask, render_template_string, request
+from flask import Flask, Response, jsonify, render_template_string, request, stream_with_context, url_for
 
 load_dotenv()
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from src.agent.core import diagnose_react
-from src.agent.llm import DEFAULT_MODEL, MODEL_OPTIONS
+from src import tracing
+from src.agent.clients import warm_up
+from src.agent.llm import DEFAULT_MODEL, MODEL_OPTIONS, provider_for
+from src.jobs import JobManager, QueueFull
 
 app = Flask(__name__)
 
+# diagnoses run here, not in the request thread (JOB_WORKERS / JOB_QUEUE_DEPTH in .env)
+jobs = JobManager()
+
+# build the default model's client once so the first request skips the setup
+warm_up(provider_for(DEFAULT_MODEL), DEFAULT_MODEL)
+
 HTML = """
 <!doctype html>
 <html lang="en">
@@ -47,7 +56,7 @@ HTML = """
           <label class="form-label fw-semibold">Describe your problem</label>
           <textarea class="form-control" name="symptom" rows="3"
             placeholder='e.g. "I can&#39;t load any websites" or "My video calls keep dropping"'
-            required>{{ symptom or "" }}</textarea>
+            required></textarea>
         </div>
 
         <div class="mb-4">
@@ -68,75 +77,151 @@ HTML = """
           Run Diagnostics
         </button>
         <span class="ms-3 text-muted small" id="loadingMsg" style="display:none">
-          Running... this may take 30-60 seconds
+          Running... steps show up below as they happen
         </span>
 
       </form>
     </div>
   </div>
 
-  {% if error %}
-  <div class="alert alert-danger">{{ error }}</div>
-  {% endif %}
+  <div class="alert alert-danger" id="errorBox" style="display:none"></div>
 
-  {% if result %}
-  <div class="card shadow-sm">
+  <div class="card shadow-sm" id="resultCard" style="display:none">
     <div class="card-body p-4">
       <h5 class="fw-bold mb-4">Diagnosis</h5>
 
-      {% if result.react_trace %}
       <div class="mb-3">
         <div class="label">Reasoning Trace</div>
-        {% for step in result.react_trace %}
-        <div class="mb-1 font-monospace" style="font-size:0.82rem;">
-          <span class="text-secondary">Step {{ step.step }}</span>
-          &nbsp;·&nbsp;
-          <span class="text-primary">Thought:</span> {{ step.thought }}
-          &nbsp;·&nbsp;
-          <span class="text-success">Action:</span>
-          {% if step.action == "DIAGNOSE" %}final diagnosis{% else %}run {{ step.action }}{% endif %}
-        </div>
-        {% endfor %}
-        <div class="text-muted mt-1" style="font-size:0.78rem;">
-          {{ result.steps_taken }} step(s) · tools used: {{ result.tools_used | join(", ") or "none" }}
-        </div>
+        <div id="trace"></div>
+        <div class="text-muted mt-1" style="font-size:0.78rem;" id="traceSummary"></div>
       </div>
-      <hr class="my-3">
-      {% endif %}
 
-      <div class="mb-3">
-        <div class="label">Summary</div>
-        <p class="mb-0">{{ result.summary }}</p>
-      </div>
+      <div id="diagnosis" style="display:none">
+        <hr class="my-3">
 
-      <hr class="my-3">
+        <div class="mb-3">
+          <div class="label">Summary</div>
+          <p class="mb-0" id="summary"></p>
+        </div>
 
-      <div class="mb-3">
-        <div class="label">Root Cause</div>
-        <p class="mb-0">{{ result.root_cause }}</p>
-      </div>
+        <hr class="my-3">
 
-      <hr class="my-3">
+        <div class="mb-3">
+          <div class="label">Root Cause</div>
+          <p class="mb-0" id="rootCause"></p>
+        </div>
 
-      <div>
-        <div class="label">Recommendations</div>
-        <ol>
-          {% for rec in result.recommendations %}
-          <li>{{ rec }}</li>
-          {% endfor %}
-        </ol>
+        <hr class="my-3">
+
+        <div>
+          <div class="label">Recommendations</div>
+          <ol id="recommendations"></ol>
+        </div>
       </div>
 
     </div>
   </div>
-  {% endif %}
 
 </div>
 
 <script>
-  document.getElementById("diagForm").addEventListener("submit", function () {
+  // the POST only queues the diagnosis - each step streams in over
+  // server-sent events as the agent works through it
+  const form = document.getElementById("diagForm");
+  const trace = document.getElementById("trace");
+
+  function done() {
+    document.getElementById("submitBtn").disabled = false;
+    document.getElementById("loadingMsg").style.display = "none";
+  }
+
+  function showError(message) {
+    const box = document.getElementById("errorBox");
+    box.textContent = message;
+    box.style.display = "block";
+    done();
+  }
+
+  function stepLine(step) {
+    let line = document.getElementById("step-" + step);
+    if (!line) {
+      line = document.createElement("div");
+      line.id = "step-" + step;
+      line.className = "mb-1 font-monospace";
+      line.style.fontSize = "0.82rem";
+      line.innerHTML = '<span class="text-secondary"></span>&nbsp;·&nbsp;' +
+        '<span class="text-primary">Thought:</span> <span class="thought"></span>' +
+        '<span class="action"></span>';
+      line.querySelector(".text-secondary").textContent = "Step " + step;
+      trace.appendChild(line);
+    }
+    return line;
+  }
+
+  function setAction(line, text) {
+    const action = line.querySelector(".action");
+    action.innerHTML = '&nbsp;·&nbsp;<span class="text-success">Action:</span> ';
+    action.appendChild(document.createTextNode(text));
+  }
+
+  function showDiagnosis(result) {
+    // replace the live trace with the final one (covers non-streamed thoughts too)
+    trace.innerHTML = "";
+    for (const step of result.react_trace || []) {
+      const line = stepLine(step.step);
+      line.querySelector(".thought").textContent = step.thought;
+      setAction(line, step.action === "DIAGNOSE" ? "final diagnosis"
+        : step.action === "RULE" ? "matched rule " + step.rule + " (no LLM call)"
+        : "run " + step.action);
+    }
+    document.getElementById("traceSummary").textContent =
+      (result.steps_taken || 0) + " step(s) · tools used: " + ((result.tools_used || []).join(", ") || "none");
+    document.getElementById("summary").textContent = result.summary || "";
+    document.getElementById("rootCause").textContent = result.root_cause || "";
+    const recs = document.getElementById("recommendations");
+    recs.innerHTML = "";
+    for (const rec of result.recommendations || []) {
+      const li = document.createElement("li");
+      li.textContent = rec;
+      recs.appendChild(li);
+    }
+    document.getElementById("diagnosis").style.display = "block";
+  }
+
+  form.addEventListener("submit", async function (e) {
+    e.preventDefault();
     document.getElementById("submitBtn").disabled = true;
     document.getElementById("loadingMsg").style.display = "inline";
+    document.getElementById("errorBox").style.display = "none";
+    document.getElementById("diagnosis").style.display = "none";
+    document.getElementById("traceSummary").textContent = "";
+    trace.innerHTML = "";
+
+    const response = await fetch("/diagnose", { method: "POST", body: new FormData(form) });
+    const job = await response.json();
+    if (!response.ok) {
+      showError(job.error || "Could not start the diagnosis.");
+      return;
+    }
+    document.getElementById("resultCard").style.display = "block";
+
+    const events = new EventSource(job.events_url);
+    events.addEventListener("thought", (ev) => {
+      const data = JSON.parse(ev.data);
+      stepLine(data.step).querySelector(".thought").textContent += data.text;
+    });
+    events.addEventListener("action", (ev) => {
+      const data = JSON.parse(ev.data);
+      const line = stepLine(data.step);
+      line.querySelector(".thought").textContent = data.thought;
+      setAction(line, "run " + data.tool);
+    });
+    events.addEventListener("diagnosis", (ev) => showDiagnosis(JSON.parse(ev.data).diagnosis));
+    events.addEventListener("done", () => { events.close(); done(); });
+    events.addEventListener("error", (ev) => {
+      events.close();
+      showError(ev.data ? JSON.parse(ev.data).message : "Lost connection to the diagnosis.");
+    });
   });
 </script>
 </body>
@@ -150,34 +235,76 @@ def index():
         HTML,
         models=MODEL_OPTIONS,
         selected_model=DEFAULT_MODEL,
-        symptom=None,
-        result=None,
-        error=None,
     )
 
 
 @app.route("/diagnose", methods=["POST"])
 def run_diagnosis():
+    # queue the diagnosis and return straight away - progress comes from
+    # /jobs/<id>/events, the final result from /jobs/<id>
     symptom = request.form.get("symptom", "").strip()
     model   = request.form.get("model", DEFAULT_MODEL)
-    result  = None
-    error   = None
 
-    if symptom:
-        try:
-            result = diagnose_react(symptom, model=model)
-        except Exception as e:
-            error = f"Diagnosis failed: {e}"
+    if not symptom:
+        return jsonify({"error": "Please describe the problem."}), 400
 
-    return render_template_string(
-        HTML,
-        models=MODEL_OPTIONS,
-        selected_model=model,
-        symptom=symptom,
-        result=result,
-        error=error,
+    try:
+        job = jobs.submit(symptom, model)
+    except QueueFull:
+        return jsonify({"error": "The agent is busy, please try again in a minute."}), 503, {"Retry-After": "30"}
+
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for("job_status", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+    }), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+
+    def sse():
+        for event in jobs.stream(job):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return Response(
+        stream_with_context(sse()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.route("/traces/<trace_id>", methods=["GET"])
+def trace(trace_id):
+    # the diagnosis result carries its trace_id - ?format=otlp for an
+    # OpenTelemetry collector / viewer
+    found = tracing.get_trace(trace_id)
+    if found is None:
+        return jsonify({"error": "Unknown trace."}), 404
+    if request.args.get("format") == "otlp":
+        return jsonify(tracing.trace_to_otlp(found))
+    return jsonify(tracing.trace_to_json(found))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # prometheus scrape endpoint - latency histograms per phase, provider and tool
+    return Response(tracing.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5001)
+    app.run(debug=True, host="0.0.0.0", port=5001, threaded=True)
@@ -0,0 +1,52 @@
+# evaluation/labels.py
+
+"""
+root cause category of a diagnosis, for scoring against a scenario's label
+
+the production prompts only ask for summary / root_cause / recommendations,
+so the category is read off the diagnosis here: a rule diagnosis carries
+its own label, anything else goes by keywords in root_cause (then summary).
+first match wins, so the narrow categories come before the broad ones -
+"intermittent packet loss" is intermittent_loss, not packet_loss.
+"""
+
+import re
+
+ROOT_CAUSE_LABELS = [
+    "dns_failure", "packet_loss", "high_latency", "route_failure", "port_blocked",
+    "no_connectivity", "intermittent_loss", "bandwidth_throttle", "high_jitter",
+    "duplicate_packets", "other",
+]
+
+# label -> word stems that point at it, checked in this order
+KEYWORDS = [
+    ("duplicate_packets", ["duplicat", "dup packets"]),
+    ("high_jitter", ["jitter"]),
+    ("bandwidth_throttle", ["throttl", "bandwidth", "rate limit", "rate-limit", "shaping", "shaped"]),
+    ("intermittent_loss", ["intermittent", "sporadic", "burst", "flapping"]),
+    ("port_blocked", ["port", "firewall", "blocked", "filtered"]),
+    ("dns_failure", ["dns", "nxdomain", "resolv", "name server", "nameserver"]),
+    ("route_failure", ["route", "routing", "hop", "black hole", "blackhole"]),
+    ("no_connectivity", ["no connectivity", "no network", "no internet", "outage", "offline", "disconnected"]),
+    ("packet_loss", ["packet loss", "loss", "dropp"]),
+    ("high_latency", ["latency", "slow", "delay", "round-trip", "rtt"]),
+]
+
+_PATTERNS = [(label, re.compile(r"\b(?:" + "|".join(map(re.escape, stems)) + ")", re.IGNORECASE))
+             for label, stems in KEYWORDS]
+
+
+def label_of(diagnosis: dict) -> str:
+    """the category a diagnosis names, "other" if nothing fits, None for no diagnosis"""
+    if not diagnosis:
+        return None
+    if diagnosis.get("label") in ROOT_CAUSE_LABELS:
+        return diagnosis["label"]
+    for field in ("root_cause", "summary"):
+        text = diagnosis.get(field)
+        if not isinstance(text, str):
+            continue
+        for label, pattern in _PATTERNS:
+            if pattern.search(text):
+                return label
+    return "other"
@@ -0,0 +1,102 @@
+# evaluation/resilience.py
+
+"""
+LLM policy benchmark - hedging and circuit breakers against stub providers
+
+registers two stub providers: "stub-flaky" (the primary - some calls fail,
+some stall) and "stub" (a healthy fallback), then asks for the same ReAct
+decisions with the policy off (no fallbacks: one provider, timeout only)
+and on (stub-flaky hedged / failing over to stub). no network, no API keys.
+
+    python -m evaluation.resilience
+    python -m evaluation.resilience --calls 200 --failure-rate 0.2 --slow-rate 0.1 --slow-latency 3
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agent import llm
+from src.agent.resilience import LLMPolicy
+from evaluation import scenarios as scenario_set
+from evaluation.stubs import StubLLM
+
+PRIMARY = "stub-flaky"
+FALLBACK = "stub"
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)], 4)
+
+
+def run(policy, calls: int, stream: bool) -> dict:
+    llm.set_llm_policy(policy)
+    conversation = [
+        {"role": "system", "content": llm.SYSTEM_PROMPT},
+        {"role": "user", "content": "I can't load example.com"},
+    ]
+    walls, errors = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            if stream:
+                llm.stream_react_decision(conversation, model=PRIMARY)
+            else:
+                llm.get_react_decision(conversation, model=PRIMARY)
+        except Exception:
+            errors += 1
+        walls.append(time.perf_counter() - start)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "p50_seconds": _percentile(walls, 50),
+        "p95_seconds": _percentile(walls, 95),
+        "p99_seconds": _percentile(walls, 99),
+        "max_seconds": round(max(walls), 4),
+        "policy": policy.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM hedging / circuit breaker benchmark")
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.1, help="normal stub call, seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of primary calls that fail")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="share of primary calls that stall")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="seconds a stalled call takes")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--no-stream", action="store_true")
+    options = parser.parse_args(argv)
+
+    flaky = StubLLM(latency=options.latency, failure_rate=options.failure_rate,
+                    slow_rate=options.slow_rate, slow_latency=options.slow_latency, seed=1)
+    healthy = StubLLM(latency=options.latency, seed=2)
+    flaky.scenario = healthy.scenario = scenario_set.get([1])[0]
+    llm.register_provider(PRIMARY, flaky.call, stream=flaky.stream, models=[PRIMARY])
+    llm.register_provider(FALLBACK, healthy.call, stream=healthy.stream, models=[FALLBACK])
+
+    stream = not options.no_stream
+    saved = llm.llm_policy()
+    try:
+        report = {
+            "options": vars(options),
+            "off": run(LLMPolicy(llm.provider_for, timeout=options.timeout), options.calls, stream),
+            "on": run(LLMPolicy(llm.provider_for, fallbacks={PRIMARY: [FALLBACK]}, timeout=options.timeout),
+                      options.calls, stream),
+        }
+    finally:
+        llm.set_llm_policy(saved)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
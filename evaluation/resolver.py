@@ -0,0 +1,170 @@
+# evaluation/resolver.py
+
+"""
+DNS client check against a stub server - no network, no real resolvers
+
+starts a UDP + TCP DNS server on a free 127.0.0.1 port with a small fixed
+zone and runs the in-process client (src/tools/resolver.py) and the dns
+tool against it: a truncated UDP answer retried over TCP, a name with only
+AAAA records, NXDOMAIN, short names through the search list (ndots), an
+address with no PTR record and a name no query can carry. exits 1 if any
+check fails.
+
+    python -m evaluation.resolver
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools import resolver
+from src.tools.dns import DNSTool
+from src.tools.scheduler import SCHEDULER
+
+TTL = 60
+BIG_RECORDS = 40    # more A records than fit in 512 bytes of UDP
+
+# name -> {qtype: [values]}. names not here are NXDOMAIN, a qtype missing
+# from a name's entry is NOERROR with no records. None = never answered
+ZONE = {
+    "big.test": {"A": [f"10.1.0.{i}" for i in range(1, BIG_RECORDS + 1)]},
+    "v6only.test": {"A": None, "AAAA": ["2001:db8::1"]},
+    "host.corp.test": {"A": ["10.0.0.5"]},
+    "a.b.corp.test": {"A": ["10.0.0.6"]},
+    "a.b": {"A": ["10.0.0.7"]},
+}
+
+
+def _respond(query: bytes, tcp: bool):
+    """the stub's reply to one query, None to stay silent"""
+    name, offset = resolver._read_name(query, 12)
+    qtype = resolver.QTYPE_NAMES.get(struct.unpack("!H", query[offset:offset + 2])[0])
+    question = query[12:offset + 4]
+    entry = ZONE.get(name.lower())
+    values = [] if entry is None else entry.get(qtype, [])
+    if values is None:
+        return None
+
+    truncated = not tcp and len(values) * 16 + len(question) + 12 > 512
+    records = b""
+    if not truncated:
+        for value in values:
+            family = socket.AF_INET if qtype == "A" else socket.AF_INET6
+            rdata = socket.inet_pton(family, value)
+            records += b"\xc0\x0c" + struct.pack("!HHIH", resolver.QTYPES[qtype], 1, TTL, len(rdata)) + rdata
+    # QR, RD, RA, TC when it didn't fit, rcode 3 (NXDOMAIN) for unknown names
+    flags = 0x8180 | (0x0200 if truncated else 0) | (3 if entry is None else 0)
+    count = 0 if truncated else len(values)
+    return struct.pack("!HHHHHH", struct.unpack("!H", query[:2])[0], flags, 1, count, 0, 0) + question + records
+
+
+class _Udp(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        reply = _respond(data, tcp=False)
+        if reply is not None:
+            sock.sendto(reply, self.client_address)
+
+
+class _Tcp(socketserver.BaseRequestHandler):
+    def handle(self):
+        length = struct.unpack("!H", self.request.recv(2))[0]
+        reply = _respond(self.request.recv(length), tcp=True)
+        if reply is not None:
+            self.request.sendall(struct.pack("!H", len(reply)) + reply)
+
+
+def start_stub():
+    """the UDP and TCP servers, on the same free port -> (servers, "127.0.0.1:port")"""
+    tcp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Tcp)
+    udp = socketserver.ThreadingUDPServer(("127.0.0.1", tcp.server_address[1]), _Udp)
+    for server in (tcp, udp):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return (tcp, udp), f"127.0.0.1:{tcp.server_address[1]}"
+
+
+def checks(stub: str, timeout: float) -> list[dict]:
+    def lookup(name, **kwargs):
+        return asyncio.run(resolver.lookup(name, servers=[stub], timeout=timeout, **kwargs))
+
+    def check(name, ok, detail):
+        return {"check": name, "ok": bool(ok), "detail": detail}
+
+    results = []
+
+    big = lookup("big.test", qtypes=("A",), search=[], ndots=1)["answers"]["A"]
+    results.append(check("truncated UDP answer retried over TCP",
+                         big and big["tcp"] and len(big["records"]) == BIG_RECORDS,
+                         {"tcp": big and big["tcp"], "records": len(big["records"]) if big else 0}))
+
+    v6 = DNSTool().run("v6only.test", servers=[stub], timeout=timeout)
+    results.append(check("AAAA-only name counts as answered",
+                         v6["success"] and v6["data"]["rcode"] == "NOERROR",
+                         {"success": v6["success"], "rcode": v6["data"].get("rcode"),
+                          "addresses": v6["data"].get("ip_addresses")}))
+
+    missing = DNSTool().run("missing.test", servers=[stub], timeout=timeout)
+    results.append(check("unknown name is NXDOMAIN",
+                         not missing["success"] and missing["data"]["rcode"] == "NXDOMAIN",
+                         {"success": missing["success"], "rcode": missing["data"].get("rcode")}))
+
+    short = lookup("host", qtypes=("A",), search=["corp.test"], ndots=1)
+    results.append(check("short name resolved through the search list",
+                         short["name"] == "host.corp.test" and resolver._found(short),
+                         {"name": short["name"], "searched": short.get("searched")}))
+
+    dotted = lookup("a.b", qtypes=("A",), search=["corp.test"], ndots=1)
+    many_dots = lookup("a.b", qtypes=("A",), search=["corp.test"], ndots=2)
+    results.append(check("ndots decides whether the name or the search list goes first",
+                         dotted["name"] == "a.b" and many_dots["name"] == "a.b.corp.test",
+                         {"ndots 1": dotted["name"], "ndots 2": many_dots["name"]}))
+
+    absolute = lookup("host.", qtypes=("A",), search=["corp.test"], ndots=1)
+    results.append(check("a trailing dot skips the search list",
+                         absolute["name"] == "host" and not resolver._found(absolute),
+                         {"name": absolute["name"], "searched": absolute.get("searched")}))
+
+    no_ptr = DNSTool().run("192.0.2.7", servers=[stub], timeout=timeout)
+    results.append(check("an address without a PTR record is not a DNS failure",
+                         no_ptr["success"] and not no_ptr["data"]["resolved"] and no_ptr["data"].get("note"),
+                         {"success": no_ptr["success"], "rcode": no_ptr["data"].get("rcode")}))
+
+    too_long = DNSTool().run("a" * 70 + ".com", servers=[stub], timeout=timeout)
+    results.append(check("a label over 63 bytes is a failed result, not an exception",
+                         not too_long["success"] and "label" in too_long["error"],
+                         {"error": too_long["error"]}))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DNS client check against a stub server")
+    parser.add_argument("--timeout", type=float, default=0.5, help="per query, seconds")
+    options = parser.parse_args(argv)
+
+    servers, stub = start_stub()
+    SCHEDULER.enabled = False   # every check asks the stub, never a cached answer
+    try:
+        results = checks(stub, options.timeout)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    print(json.dumps({"stub": stub, "checks": results}, indent=2))
+    failed = [r["check"] for r in results if not r["ok"]]
+    if failed:
+        print(f"FAILED: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"all {len(results)} checks passed")
+
+
+if __name__ == "__main__":
+    main()
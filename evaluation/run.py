@@ -0,0 +1,298 @@
+# evaluation/run.py
+
+"""
+offline accuracy + latency benchmark
+
+runs every scenario in scenarios.py through diagnose_react (and the Iter 1
+diagnose pipeline) with scripted tools and, by default, the stub LLM - no
+network, no API keys. pass real model names with --models to score actual
+providers against the same scripted tool results.
+
+    python -m evaluation.run
+    python -m evaluation.run --modes react --llm-latency 0.5 --out before.json
+    python -m evaluation.run --baseline before.json     # exit 1 on a regression
+    python -m evaluation.run --models stub,gpt-4o-mini --scenarios 1,4,6
+    python -m evaluation.run --deadline 2 --llm-latency 0.5     # does it still answer in time?
+
+writes a JSON report with one record per (scenario, mode, model) - label
+predicted, correct, steps, tools, tokens, wall time split into llm / tool
+/ parse - and a summary per mode and model.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agent import core, llm
+from evaluation import scenarios as scenario_set
+from evaluation.labels import label_of
+from evaluation.stubs import STUB_MODEL, Phases, StubLLM, scripted_tool
+
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json")
+MODES = ("react", "iter1")
+
+# what counts as a regression against --baseline
+MAX_SLOWDOWN = 0.20     # p50 wall time up by more than 20%
+
+
+@contextmanager
+def instrumented(scenario, phases, time_scale):
+    """
+    swap in the scenario's scripted tools and time every llm / parse call,
+    putting everything back afterwards
+    """
+    saved_tools = dict(core.AVAILABLE_TOOLS)
+    saved_calls = dict(llm.PROVIDER_CALLS)
+    saved_streams = dict(llm.PROVIDER_STREAMS)
+    saved_react_parse = core.parse_react_response
+    saved_json_parse = llm._parse_json
+
+    for name, result in scenario["tools"].items():
+        core.AVAILABLE_TOOLS[name] = scripted_tool(name, result, time_scale, phases)
+    for provider, call in saved_calls.items():
+        llm.PROVIDER_CALLS[provider] = phases.wrap_call(call)
+    for provider, stream in saved_streams.items():
+        llm.PROVIDER_STREAMS[provider] = phases.wrap_stream(stream)
+    core.parse_react_response = phases.wrap("parse", saved_react_parse)
+    llm._parse_json = phases.wrap("parse", saved_json_parse)
+    try:
+        yield
+    finally:
+        core.AVAILABLE_TOOLS.clear()
+        core.AVAILABLE_TOOLS.update(saved_tools)
+        llm.PROVIDER_CALLS.clear()
+        llm.PROVIDER_CALLS.update(saved_calls)
+        llm.PROVIDER_STREAMS.clear()
+        llm.PROVIDER_STREAMS.update(saved_streams)
+        core.parse_react_response = saved_react_parse
+        llm._parse_json = saved_json_parse
+
+
+def run_one(scenario, mode, model, stub, options) -> dict:
+    phases = Phases()
+    stub.scenario = scenario
+    record = {
+        "scenario": scenario["id"],
+        "name": scenario["name"],
+        "mode": mode,
+        "model": model,
+        "label": scenario["label"],
+    }
+
+    start = time.perf_counter()
+    try:
+        with instrumented(scenario, phases, options.tool_time_scale):
+            if mode == "react":
+                diagnosis = core.diagnose_react(
+                    scenario["symptom"],
+                    model=model,
+                    target=scenario["target"],
+                    verbose=False,
+                    stream=not options.no_stream,
+                    speculate=not options.no_speculate,
+                    fast_path=not options.no_rules,
+                    # the scenarios script the tools, not this host's links
+                    local_state=False,
+                    deadline=options.deadline,
+                    layered=options.layers,
+                )
+            else:
+                # the Iter 1 pipeline prints as it goes
+                with contextlib.redirect_stdout(io.StringIO()):
+                    diagnosis = core.diagnose(scenario["symptom"], model=model, deadline=options.deadline)
+        error = ""
+    except Exception as e:
+        diagnosis, error = {}, f"{e.__class__.__name__}: {e}"
+    wall = time.perf_counter() - start
+
+    predicted = label_of(diagnosis)
+    record.update({
+        "predicted": predicted,
+        "correct": predicted == scenario["label"],
+        "rule": diagnosis.get("rule"),
+        "steps_taken": diagnosis.get("steps_taken"),
+        "forced": diagnosis.get("forced"),
+        "tools_used": diagnosis.get("tools_used", []),
+        "observation_tokens": diagnosis.get("observation_tokens"),
+        "speculation": diagnosis.get("speculation"),
+        "prompt_cache": [step.get("prompt_cache") for step in diagnosis.get("react_trace", [])],
+        "wall_seconds": round(wall, 4),
+        "phases": phases.snapshot(wall),
+        "error": error,
+    })
+    return record
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(records) -> dict:
+    """one entry per "mode/model" """
+    groups = {}
+    for record in records:
+        groups.setdefault(f"{record['mode']}/{record['model']}", []).append(record)
+
+    summary = {}
+    for key, group in groups.items():
+        walls = [r["wall_seconds"] for r in group]
+        summary[key] = {
+            "scenarios": len(group),
+            "accuracy": round(sum(r["correct"] for r in group) / len(group), 3),
+            "errors": sum(1 for r in group if r["error"]),
+            "rule_hits": sum(1 for r in group if r["rule"]),
+            "forced": sum(1 for r in group if r.get("forced")),
+            "avg_steps": round(sum(r["steps_taken"] or 0 for r in group) / len(group), 2),
+            "avg_tools": round(sum(len(r["tools_used"]) for r in group) / len(group), 2),
+            "llm_calls": sum(r["phases"]["llm_calls"] for r in group),
+            "prompt_tokens_est": sum(r["phases"]["prompt_tokens_est"] for r in group),
+            "completion_tokens_est": sum(r["phases"]["completion_tokens_est"] for r in group),
+            "p50_wall_seconds": _percentile(walls, 50),
+            "p95_wall_seconds": _percentile(walls, 95),
+            "total_wall_seconds": round(sum(walls), 4),
+            "phase_seconds": {
+                phase: round(sum(r["phases"][phase] for r in group), 4)
+                for phase in ("llm", "tool", "parse", "other")
+            },
+            "prompt_cache": _cache_summary(group),
+        }
+    return summary
+
+
+def _cache_summary(group) -> dict:
+    """share of reported input tokens that came from the prompt cache, overall and per ReAct step"""
+    by_step = {}
+    for record in group:
+        for step, cache in enumerate(record.get("prompt_cache") or [], 1):
+            if cache:
+                totals = by_step.setdefault(step, [0, 0])
+                totals[0] += cache["input_tokens"]
+                totals[1] += cache["cached_tokens"]
+    input_tokens = sum(t[0] for t in by_step.values())
+    cached_tokens = sum(t[1] for t in by_step.values())
+    return {
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_share": round(cached_tokens / input_tokens, 3) if input_tokens else None,
+        "cached_share_by_step": {step: round(c / i, 3) for step, (i, c) in sorted(by_step.items()) if i},
+    }
+
+
+def compare(summary, baseline) -> list[str]:
+    """regressions of `summary` against a baseline report's summary"""
+    problems = []
+    for key, now in summary.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if now["accuracy"] < before["accuracy"]:
+            problems.append(f"{key}: accuracy {before['accuracy']} -> {now['accuracy']}")
+        if before["p50_wall_seconds"] and now["p50_wall_seconds"] > before["p50_wall_seconds"] * (1 + MAX_SLOWDOWN):
+            problems.append(
+                f"{key}: p50 wall {before['p50_wall_seconds']}s -> {now['p50_wall_seconds']}s "
+                f"(more than {int(MAX_SLOWDOWN * 100)}% slower)"
+            )
+    return problems
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary):
+    print(f"{'mode/model':32s} {'acc':>5s} {'rules':>5s} {'steps':>5s} {'llm':>4s} "
+          f"{'p50 s':>7s} {'p95 s':>7s}  llm/tool/parse/other s")
+    for key, s in summary.items():
+        p = s["phase_seconds"]
+        print(f"{key:32s} {s['accuracy']:5.2f} {s['rule_hits']:5d} {s['avg_steps']:5.2f} {s['llm_calls']:4d} "
+              f"{s['p50_wall_seconds']:7.3f} {s['p95_wall_seconds']:7.3f}  "
+              f"{p['llm']:.2f}/{p['tool']:.2f}/{p['parse']:.3f}/{p['other']:.2f}")
+    for key, s in summary.items():
+        cache = s["prompt_cache"]
+        if cache["cached_share"] is not None:
+            steps = ", ".join(f"step {n}: {share:.0%}" for n, share in cache["cached_share_by_step"].items())
+            print(f"{key:32s} prompt cache {cache['cached_share']:.0%} of input tokens ({steps})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="offline accuracy + latency benchmark")
+    parser.add_argument("--models", default=STUB_MODEL, help="comma separated, 'stub' needs no API key")
+    parser.add_argument("--modes", default=",".join(MODES), help="react, iter1 or both")
+    parser.add_argument("--scenarios", default="", help="comma separated scenario ids, default all")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--tool-time-scale", type=float, default=0.1,
+                        help="scripted tools take duration_seconds x this")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--no-speculate", action="store_true")
+    parser.add_argument("--no-rules", action="store_true")
+    parser.add_argument("--deadline", type=float, help="seconds each diagnosis may take")
+    parser.add_argument("--layers", action="store_true",
+                        help="run the layered probe first - scenarios only script the target, so the "
+                             "gateway and resolvers get its ping result too (a failed target ping "
+                             "looks like a LAN fault)")
+    parser.add_argument("--batch-actions", action="store_true",
+                        help="the stub model asks for its whole tool plan on one ACTION line")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--baseline", help="earlier report to check for accuracy / latency regressions")
+    options = parser.parse_args(argv)
+
+    stub = StubLLM(latency=options.llm_latency, batch_actions=options.batch_actions)
+    llm.register_provider(STUB_MODEL, stub.call, stream=stub.stream, models=[STUB_MODEL])
+
+    models = [m for m in options.models.split(",") if m]
+    modes = [m for m in options.modes.split(",") if m]
+    chosen = scenario_set.get([i for i in options.scenarios.split(",") if i])
+
+    records = []
+    for model in models:
+        for mode in modes:
+            for scenario in chosen:
+                records.append(run_one(scenario, mode, model, stub, options))
+
+    summary = summarize(records)
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git_commit(),
+        "options": vars(options),
+        "summary": summary,
+        "results": records,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(options.out)), exist_ok=True)
+    with open(options.out, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print_summary(summary)
+    print(f"\nreport written to {options.out}")
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            problems = compare(summary, json.load(f)["summary"])
+        if problems:
+            print("\nregressions against " + options.baseline + ":")
+            for problem in problems:
+                print("  " + problem)
+            sys.exit(1)
+        print("\nno regressions against " + options.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# evaluation/scenarios.py
+
+"""
+the 10 fault scenarios from the README, as scripted tool results
+
+each scenario has the symptom a user would type, the target, what
+ping / dns / traceroute return under that fault, the ground truth label,
+and the tool order the stub LLM follows before answering (see stubs.py).
+"""
+
+PING_FIELDS = {
+    "packet_loss_percent": 0.0,
+    "avg_rtt_ms": 18.0,
+    "min_rtt_ms": 15.2,
+    "max_rtt_ms": 22.9,
+    "jitter_ms": 1.4,
+    "p50_rtt_ms": 17.8,
+    "p95_rtt_ms": 22.1,
+    "p99_rtt_ms": 22.9,
+    "duplicate_percent": 0.0,
+    "out_of_order": 0,
+    "loss_bursts": 0,
+    "max_loss_burst": 0,
+}
+
+
+def ping(target, success=True, duration=0.8, **fields):
+    if not success:
+        return {
+            "tool_name": "ping",
+            "target": target,
+            "success": False,
+            "data": {},
+            "raw_output": f"--- {target} ping statistics ---\n4 packets transmitted, 0 packets received, 100.0% packet loss\n",
+            "error": f"ping failed for {target}",
+            "duration_seconds": duration,
+        }
+    data = {**PING_FIELDS, **fields}
+    return {
+        "tool_name": "ping",
+        "target": target,
+        "success": True,
+        "data": data,
+        "raw_output": (
+            f"--- {target} ping statistics ---\n"
+            f"4 packets transmitted, {round(4 * (100 - data['packet_loss_percent']) / 100)} packets received, "
+            f"{data['packet_loss_percent']}% packet loss\n"
+            f"round-trip min/avg/max/stddev = {data['min_rtt_ms']}/{data['avg_rtt_ms']}/{data['max_rtt_ms']}/1.0 ms\n"
+        ),
+        "error": "",
+        "duration_seconds": duration,
+    }
+
+
+def dns(target, rcode="NOERROR", addresses=("93.184.215.14",), duration=0.03):
+    resolved = rcode == "NOERROR" and bool(addresses)
+    data = {
+        "resolved": resolved,
+        "ip_addresses": list(addresses) if resolved else [],
+        "response_time_ms": 12.5 if rcode else None,
+        "rcode": rcode,
+        "ttl": 300 if resolved else None,
+        "cnames": [],
+        "nameservers": [],
+        "answered_by": "192.168.1.1" if rcode else None,
+        "resolvers": {"192.168.1.1": {
+            "latency_ms": 12.5 if rcode else None,
+            "rcode": rcode,
+            "error": "" if rcode else "timed out",
+            "answered": 1 if rcode else 0,
+        }},
+    }
+    if rcode == "NOERROR" and resolved:
+        error = ""
+    elif rcode is None:
+        error = f"DNS lookup failed for {target} (no resolver answered: 192.168.1.1 timed out)"
+    else:
+        error = f"DNS lookup failed for {target} ({rcode} from 192.168.1.1)"
+    return {
+        "tool_name": "dns",
+        "target": target,
+        "success": not error,
+        "data": data,
+        "raw_output": "",
+        "error": error,
+        "duration_seconds": duration,
+    }
+
+
+def traceroute(target, hops, success=True, duration=3.0):
+    """hops: list of (ip, rtt_ms) - (None, None) for a silent hop"""
+    return {
+        "tool_name": "traceroute",
+        "target": target,
+        "success": success,
+        "data": {
+            "hops": [
+                {"hop_num": i, "ip": ip, "rtt_ms": rtt, "timed_out": ip is None}
+                for i, (ip, rtt) in enumerate(hops, 1)
+            ],
+            "total_hops": len(hops),
+            "aborted_early": not success,
+        },
+        "raw_output": "",
+        "error": "" if success else f"traceroute failed for {target}",
+        "duration_seconds": duration,
+    }
+
+
+PATH = [("192.168.1.1", 1.2), ("10.20.0.1", 8.4), ("72.14.0.9", 12.0), ("93.184.215.14", 18.0)]
+
+SCENARIOS = [
+    {
+        "id": 1,
+        "name": "DNS Failure",
+        "label": "dns_failure",
+        "symptom": "I can't load example.com or any other website",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", success=False, duration=0.01),
+            "dns": dns("example.com", rcode=None, duration=2.0),
+            "traceroute": traceroute("example.com", [], success=False, duration=0.01),
+        },
+        "llm_plan": ["ping", "dns"],
+    },
+    {
+        "id": 2,
+        "name": "High Packet Loss",
+        "label": "packet_loss",
+        "symptom": "example.com keeps timing out and pages half load",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", packet_loss_percent=30.0, loss_bursts=1, max_loss_burst=2),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping", "traceroute"],
+    },
+    {
+        "id": 3,
+        "name": "High Latency",
+        "label": "high_latency",
+        "symptom": "everything on example.com is really slow",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", avg_rtt_ms=518.0, min_rtt_ms=502.1, max_rtt_ms=540.3,
+                         p50_rtt_ms=515.0, p95_rtt_ms=538.0, p99_rtt_ms=540.3),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", [(ip, rtt + 500) for ip, rtt in PATH]),
+        },
+        "llm_plan": ["ping", "traceroute"],
+    },
+    {
+        "id": 4,
+        "name": "Route Failure",
+        "label": "route_failure",
+        "symptom": "I can't reach example.com but DNS seems fine",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", success=False, duration=4.0),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH[:2] + [(None, None)] * 5, success=False, duration=5.0),
+        },
+        "llm_plan": ["ping", "dns", "traceroute"],
+    },
+    {
+        "id": 5,
+        "name": "Port Blocked",
+        "label": "port_blocked",
+        "symptom": "https://example.com won't load but ping works",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com"),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping", "dns"],
+    },
+    {
+        "id": 6,
+        "name": "Complete Outage",
+        "label": "no_connectivity",
+        "symptom": "nothing works, I can't even reach 8.8.8.8",
+        "target": "8.8.8.8",
+        "tools": {
+            "ping": ping("8.8.8.8", success=False, duration=4.0),
+            "dns": dns("8.8.8.8", rcode=None, duration=2.0),
+            "traceroute": traceroute("8.8.8.8", [(None, None)] * 5, success=False, duration=5.0),
+        },
+        "llm_plan": ["ping"],
+    },
+    {
+        "id": 7,
+        "name": "Intermittent Loss",
+        "label": "intermittent_loss",
+        "symptom": "my connection to example.com drops out for a few seconds every now and then",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", packet_loss_percent=12.5, loss_bursts=2, max_loss_burst=3),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping"],
+    },
+    {
+        "id": 8,
+        "name": "Bandwidth Throttle",
+        "label": "bandwidth_throttle",
+        "symptom": "downloads from example.com crawl at a few KB/s",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", avg_rtt_ms=190.0, max_rtt_ms=420.0, p95_rtt_ms=410.0, jitter_ms=35.0),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping", "traceroute"],
+    },
+    {
+        "id": 9,
+        "name": "High Jitter",
+        "label": "high_jitter",
+        "symptom": "video calls to example.com are choppy",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", avg_rtt_ms=104.0, min_rtt_ms=21.0, max_rtt_ms=183.0,
+                         jitter_ms=76.0, p95_rtt_ms=180.0, p99_rtt_ms=183.0),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping"],
+    },
+    {
+        "id": 10,
+        "name": "Duplicate Packets",
+        "label": "duplicate_packets",
+        "symptom": "my ssh session to example.com behaves strangely and retransmits a lot",
+        "target": "example.com",
+        "tools": {
+            "ping": ping("example.com", duplicate_percent=20.0),
+            "dns": dns("example.com"),
+            "traceroute": traceroute("example.com", PATH),
+        },
+        "llm_plan": ["ping"],
+    },
+]
+
+
+def get(scenario_ids=None) -> list[dict]:
+    if not scenario_ids:
+        return SCENARIOS
+    wanted = {int(i) for i in scenario_ids}
+    return [s for s in SCENARIOS if s["id"] in wanted]
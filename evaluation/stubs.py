@@ -0,0 +1,234 @@
+# evaluation/stubs.py
+
+"""
+local stand-ins so the harness runs with no network and no API keys
+
+  - scripted_tool() builds a BaseTool that returns a scenario's canned
+    result after a (scaled) sleep, and can be cancelled like a real one
+  - StubLLM answers like a model that follows the scenario's tool plan and
+    then diagnoses the scenario's fault, with a fixed latency per call - and
+    optionally some calls that fail or stall, to exercise the LLM policy
+    (batch_actions: the whole plan on one multi-tool ACTION line).
+    it reports usage like a provider with automatic prefix caching, so a
+    conversation whose prefix changes between steps shows up as cache misses
+  - Phases adds up wall time spent in llm / tool / parse code
+"""
+
+import copy
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from src.agent.clients import report_usage
+from src.agent.observations import estimate_tokens
+from src.tools.base import BaseTool
+
+STUB_MODEL = "stub"
+
+
+class Phases:
+    """
+    thread-safe totals of seconds spent per phase, plus llm token estimates
+    only the outermost timed call on a thread counts, so a parse inside a
+    parse isn't added twice
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = {"llm": 0.0, "tool": 0.0, "parse": 0.0}
+            self.llm_calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.seconds[phase] += seconds
+
+    def count_llm_call(self, messages, reply: str):
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += sum(estimate_tokens(m["content"]) for m in messages)
+            self.completion_tokens += estimate_tokens(reply)
+
+    @contextmanager
+    def timing(self, phase: str):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self.add(phase, time.perf_counter() - start)
+
+    def wrap(self, phase: str, fn):
+        def timed(*args, **kwargs):
+            with self.timing(phase):
+                return fn(*args, **kwargs)
+        return timed
+
+    def wrap_call(self, fn):
+        """wrap a provider call(messages, model, ...) -> text"""
+        def timed(messages, model, **kwargs):
+            with self.timing("llm"):
+                reply = fn(messages, model, **kwargs)
+            self.count_llm_call(messages, reply)
+            return reply
+        return timed
+
+    def wrap_stream(self, fn):
+        """wrap a provider stream(messages, model, ...) -> chunks, timing until it's closed"""
+        def timed(messages, model, **kwargs):
+            start = time.perf_counter()
+            chunks = []
+            try:
+                for chunk in fn(messages, model, **kwargs):
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                self.add("llm", time.perf_counter() - start)
+                self.count_llm_call(messages, "".join(chunks))
+        return timed
+
+    def snapshot(self, wall_seconds: float) -> dict:
+        with self._lock:
+            seconds = {k: round(v, 4) for k, v in self.seconds.items()}
+            return {
+                **seconds,
+                # tools can run while the llm is thinking (speculation), so
+                # the phases may add up to more than the wall time
+                "other": round(max(0.0, wall_seconds - sum(self.seconds.values())), 4),
+                "llm_calls": self.llm_calls,
+                "prompt_tokens_est": self.prompt_tokens,
+                "completion_tokens_est": self.completion_tokens,
+            }
+
+
+def scripted_tool(name: str, result: dict, time_scale: float, phases: Phases):
+    """a tool class that returns `result` after duration_seconds * time_scale"""
+
+    class ScriptedTool(BaseTool):
+        def run(self, target: str, budget: float = None, **kwargs) -> dict:
+            with phases.timing("tool"):
+                duration = result["duration_seconds"] * time_scale
+                # wait on the cancel flag so cancel() cuts the sleep short
+                self._cancelled.wait(duration if budget is None else min(duration, budget))
+                if self.cancelled:
+                    return {**copy.deepcopy(result), "success": False, "data": {},
+                            "error": f"{name} cancelled"}
+                if budget is not None and duration > budget:
+                    return {**copy.deepcopy(result), "success": False, "data": {},
+                            "error": f"{name} timed out for {target} (budget {budget:.1f}s)",
+                            "duration_seconds": budget}
+                return copy.deepcopy(result)
+
+    ScriptedTool.__name__ = f"Scripted{name.title()}Tool"
+    return ScriptedTool
+
+
+class StubFailure(RuntimeError):
+    """what a failing stub call raises, like a provider's 5xx"""
+
+
+class StubLLM:
+    """
+    plays a model that runs the scenario's llm_plan tools in order, then
+    diagnoses the scenario's fault by name. the step it's on comes from the
+    number of assistant turns in the conversation, so it needs no state
+    beyond the current scenario
+
+    failure_rate of the calls raise StubFailure and slow_rate of them take
+    slow_latency instead of latency (seeded, so runs are repeatable)
+
+    the longest run of leading messages it has been sent before counts as
+    cached input, if it's at least cache_min_tokens (real providers want
+    1024 or more)
+    """
+
+    def __init__(self, latency: float = 0.2, chunk_size: int = 12, failure_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 5.0, seed: int = 0,
+                 cache_min_tokens: int = 0, batch_actions: bool = False):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.cache_min_tokens = cache_min_tokens
+        self.batch_actions = batch_actions
+        self.scenario = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes = set()   # hashes of every message prefix sent so far
+
+    def _latency(self) -> float:
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+            slow = self._random.random() < self.slow_rate
+        if fail:
+            time.sleep(self.latency / 4)
+            raise StubFailure("injected stub LLM failure")
+        return self.slow_latency if slow else self.latency
+
+    def _diagnosis(self) -> dict:
+        s = self.scenario
+        return {
+            "summary": f"Scripted diagnosis for the {s['name']} scenario.",
+            "root_cause": s["name"],
+            "recommendations": ["Scripted recommendation one", "Scripted recommendation two"],
+        }
+
+    def reply(self, messages, json_mode: bool) -> str:
+        if json_mode:
+            return json.dumps(self._diagnosis())
+        turn = sum(1 for m in messages if m["role"] == "assistant")
+        plan = self.scenario["llm_plan"]
+        if self.batch_actions:
+            # the whole plan on one ACTION line, like a model that knows what it needs
+            plan = [", ".join(plan)] if plan else []
+        if turn < len(plan):
+            tool = plan[turn]
+            return f"THOUGHT: Checking {tool} next to narrow this down.\nACTION: {tool}"
+        return (
+            "THOUGHT: I have enough evidence to diagnose.\nDIAGNOSIS:\n"
+            + json.dumps(self._diagnosis(), indent=2)
+        )
+
+    def _report_usage(self, messages, reply: str):
+        digest = hashlib.sha256()
+        keys = []
+        for m in messages:
+            digest.update(json.dumps([m["role"], m["content"]]).encode())
+            keys.append(digest.hexdigest())
+        tokens = [estimate_tokens(m["content"]) for m in messages]
+        with self._lock:
+            hit = max((i + 1 for i, key in enumerate(keys) if key in self._prefixes), default=0)
+            self._prefixes.update(keys)
+        cached = sum(tokens[:hit])
+        report_usage(input_tokens=sum(tokens), cached_tokens=cached if cached >= self.cache_min_tokens else 0,
+                     output_tokens=estimate_tokens(reply))
+
+    def call(self, messages, model, max_tokens=500, json_mode=True) -> str:
+        time.sleep(self._latency())
+        reply = self.reply(messages, json_mode)
+        self._report_usage(messages, reply)
+        return reply
+
+    def stream(self, messages, model, max_tokens=600):
+        latency = self._latency()
+        text = self.reply(messages, json_mode=False)
+        self._report_usage(messages, text)
+        # first token after half the latency, the rest spread over the other half
+        time.sleep(latency / 2)
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for piece in pieces:
+            time.sleep(latency / 2 / len(pieces))
+            yield piece
@@ -0,0 +1,145 @@
+# src/agent/batch.py
+
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src import tracing
+from src.agent.core import diagnose_react
+from src.agent.llm import DEFAULT_MODEL, max_concurrent_llm_calls
+from src.tools.base import max_concurrent_tools
+from src.tools.scheduler import SCHEDULER
+
+
+DEFAULT_WORKERS = 4
+
+
+def load_jobs(lines, default_model=DEFAULT_MODEL) -> list[dict]:
+    """
+    one job per non-empty line, either plain text (just the symptom) or a
+    JSON object: {"symptom": "...", "target": "...", "model": "...", "deadline": 30}
+    target, model and deadline (seconds) are optional
+    a line that can't be read becomes a job with an "error" and no symptom -
+    run_batch reports it like a failed diagnosis and goes on with the rest
+    """
+    jobs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                jobs.append({"id": len(jobs) + 1, "line": number, "error": f"line {number}: not valid JSON ({e})"})
+                continue
+            if not isinstance(job, dict) or not isinstance(job.get("symptom"), str) or not job["symptom"].strip():
+                jobs.append({"id": len(jobs) + 1, "line": number, "error": f"line {number}: no \"symptom\""})
+                continue
+        else:
+            job = {"symptom": line}
+        jobs.append({
+            "id": job.get("id", len(jobs) + 1),
+            "symptom": job["symptom"],
+            "target": job.get("target"),
+            "model": job.get("model") or default_model,
+            "deadline": job.get("deadline"),
+        })
+    return jobs
+
+
+def jobs_from_sweep(records, default_model=DEFAULT_MODEL) -> list[dict]:
+    """one diagnosis job per unhealthy target from a fleet sweep (src/tools/sweep.py)"""
+    return [
+        {
+            "id": record["target"],
+            "symptom": f"{record['target']} looks unhealthy in a fleet reachability sweep: {record['reason']}",
+            "target": record["target"],
+            "model": default_model,
+        }
+        for record in records
+        if not record["healthy"]
+    ]
+
+
+def _run_job(job, deadline=None) -> dict:
+    start = time.time()
+    record = {
+        "id": job["id"],
+        "symptom": job["symptom"],
+        "target": job["target"],
+        "model": job["model"],
+    }
+    try:
+        record["diagnosis"] = diagnose_react(
+            job["symptom"],
+            model=job["model"],
+            target=job["target"],
+            verbose=False,
+            deadline=job.get("deadline") or deadline,
+        )
+        record["ok"] = True
+    except Exception as e:
+        record["ok"] = False
+        record["error"] = str(e)
+    record["latency_seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def _percentile(values, pct):
+    # nearest-rank, good enough for a summary line
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_batch(jobs, workers=DEFAULT_WORKERS, max_llm_calls=None, max_tool_calls=None, on_result=None,
+              deadline=None) -> dict:
+    """
+    run diagnose_react for every job on a pool of `workers` threads
+    on_result(record) is called as each diagnosis finishes, in completion order
+    deadline (seconds) applies to each job that doesn't set its own
+    the limits are this batch's own - another batch in the same process
+    (the daemon, the web app) keeps its own
+    returns the throughput summary
+    """
+    latencies = []
+    failed = 0
+    start = time.time()
+    # lines load_jobs couldn't read - reported, not run
+    unreadable = [job for job in jobs if "error" in job]
+    jobs = [job for job in jobs if "error" not in job]
+    for job in unreadable:
+        failed += 1
+        if on_result:
+            on_result({"id": job["id"], "line": job["line"], "ok": False, "error": job["error"]})
+
+    with max_concurrent_llm_calls(max_llm_calls), max_concurrent_tools(max_tool_calls) as tool_runs, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        # bound, so the workers (and every pool they hand work to) see the limits
+        futures = [pool.submit(tracing.bind(_run_job), job, deadline) for job in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            latencies.append(record["latency_seconds"])
+            if not record["ok"]:
+                failed += 1
+            if on_result:
+                on_result(record)
+
+    wall = time.time() - start
+    summary = {
+        "diagnoses": len(latencies),
+        "failed": failed,
+        "unreadable": len(unreadable),
+        "workers": workers,
+        "wall_seconds": round(wall, 3),
+        "diagnoses_per_minute": round(len(latencies) / wall * 60, 2) if wall else 0.0,
+        "p50_latency_seconds": _percentile(latencies, 50),
+        "p95_latency_seconds": _percentile(latencies, 95),
+        "probes": SCHEDULER.stats(),
+    }
+    if max_tool_calls:
+        summary["tool_runs"] = tool_runs.stats()
+    return summary
@@ -0,0 +1,252 @@
+# src/agent/clients.py
+
+"""
+long-lived LLM provider clients
+
+building an SDK client per call means a fresh connection pool, so every
+ReAct step paid for a new TLS handshake. this keeps one client per
+(provider, model) for the life of the process, backed by a pooled httpx
+client with keep-alive, so the CLI, app.py and batch runs all reuse warm connections.
+
+every call made through timed() is logged so call_stats() can show what
+the warm clients are saving - and, when the provider says, how many of its
+input tokens came out of the provider's prompt cache.
+"""
+
+import contextvars
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# max connections per client, override with LLM_POOL_SIZE in .env
+POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "10"))
+KEEPALIVE_SECONDS = 60.0
+
+_clients = {}
+_lock = threading.Lock()
+_calls = deque(maxlen=1000)
+
+# usage totals being collected by the callers up the stack, see collect_usage
+_usage_sinks = contextvars.ContextVar("llm_usage_sinks", default=())
+_usage_lock = threading.Lock()
+
+
+# httpx builds an SDK's DefaultHttpxClient may be made from - newer SDKs
+# pin their own (httpx2) and reject any other client class
+HTTPX_MODULES = ("httpx2", "httpx")
+
+
+def _httpx_for(sdk):
+    """the httpx module sdk.DefaultHttpxClient is a Client of, or None"""
+    for name in HTTPX_MODULES:
+        try:
+            httpx = importlib.import_module(name)
+        except ImportError:
+            continue
+        if issubclass(sdk.DefaultHttpxClient, httpx.Client):
+            return httpx
+    return None
+
+
+def _http_client(sdk):
+    """
+    keep-alive pool for one SDK, built from the SDK's own DefaultHttpxClient
+    None (the SDK's own default pool) if it's built on an httpx we don't know
+    """
+    httpx = _httpx_for(sdk)
+    if httpx is None:
+        print(f"warning: {sdk.__name__}.DefaultHttpxClient isn't built on "
+              f"{' or '.join(HTTPX_MODULES)}, using its default connection pool", file=sys.stderr)
+        return None
+    return sdk.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def _build(provider, model, system=None, json_mode=False):
+    if provider == "openai":
+        import openai
+        return openai.OpenAI(http_client=_http_client(openai))
+
+    if provider == "anthropic":
+        import anthropic
+        return anthropic.Anthropic(http_client=_http_client(anthropic))
+
+    if provider == "groq":
+        import groq
+        return groq.Groq(http_client=_http_client(groq))
+
+    if provider == "google":
+        # gemini bakes the system prompt and config into the model object,
+        # so those are part of the cache key for this provider
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
+        config = {"temperature": 0.3}
+        if json_mode:
+            config["response_mime_type"] = "application/json"  # force json like openai does
+        return genai.GenerativeModel(
+            model_name=model,
+            system_instruction=system,
+            generation_config=genai.GenerationConfig(**config),
+        )
+
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+def get_client(provider: str, model: str, system: str = None, json_mode: bool = False):
+    """
+    return the shared client for this provider/model, building it on first use
+    returns (client, setup_seconds) - setup_seconds is 0 when it was reused
+    """
+    key = (provider, model, system, json_mode) if provider == "google" else (provider, model)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client, 0.0
+
+    with _lock:
+        # another thread may have built it while we waited
+        client = _clients.get(key)
+        if client is not None:
+            return client, 0.0
+        start = time.perf_counter()
+        client = _build(provider, model, system, json_mode)
+        _clients[key] = client
+        return client, time.perf_counter() - start
+
+
+def warm_up(provider: str, model: str):
+    """build a client ahead of the first request, errors (e.g. no key) are ignored"""
+    try:
+        get_client(provider, model)
+    except Exception:
+        pass
+
+
+@contextmanager
+def timed(provider: str, model: str, setup_seconds: float = 0.0):
+    """
+    log how long one provider call took
+
+        with timed("openai", model, setup_seconds):
+            client.chat.completions.create(...)
+    """
+    start = time.perf_counter()
+    ok = False
+    call = {}
+    try:
+        yield call
+        ok = True
+    except GeneratorExit:
+        # a stream we stopped reading on purpose
+        ok = True
+        raise
+    finally:
+        entry = {
+            "provider": provider,
+            "model": model,
+            "reused_client": setup_seconds == 0.0,
+            "setup_ms": round(setup_seconds * 1000, 2),
+            "call_ms": round((time.perf_counter() - start) * 1000, 2),
+            "ok": ok,
+        }
+        with _usage_lock:
+            usage = call.get("usage")
+            call["entry"] = entry   # for usage that only turns up later, see report_late_usage
+        if usage:
+            entry.update(usage)
+            report_usage(**usage)
+        _calls.append(entry)
+
+
+@contextmanager
+def collect_usage():
+    """
+    add up the token usage providers report for every call made inside the
+    block (including on threads it hands work to through tracing.bind)
+
+        with collect_usage() as usage:
+            get_react_decision(...)
+        usage["cached_tokens"], usage["input_tokens"]
+    """
+    usage = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+    token = _usage_sinks.set(_usage_sinks.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_sinks.reset(token)
+
+
+def report_usage(input_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0,
+                 output_tokens: int = 0):
+    """
+    one call's usage, as the provider reported it. input_tokens counts all
+    of the prompt, cached_tokens the part of it read from the prompt cache
+    """
+    with _usage_lock:
+        for usage in _usage_sinks.get():
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["cache_write_tokens"] += cache_write_tokens
+            usage["output_tokens"] += output_tokens
+
+
+def report_late_usage(call: dict, usage: dict):
+    """
+    usage for a timed() call that may already be logged - a stream closed
+    early, whose usage chunk is read in the background. run it in the
+    call's context (tracing.bind) so it reaches the same collect_usage()
+    """
+    with _usage_lock:
+        entry = call.get("entry")
+        if entry is None:
+            # timed() hasn't finished yet, it'll pick this up itself
+            call["usage"] = usage
+            return
+    entry.update(usage)
+    report_usage(**usage)
+
+
+def recent_calls() -> list[dict]:
+    """per-call timing log, oldest first"""
+    return list(_calls)
+
+
+def call_stats() -> dict:
+    """
+    per model: number of calls, how long the first (cold) call took vs the
+    average warm one, the total client setup time, and the input tokens the
+    provider reported, with how many of them were served from its cache
+    """
+    stats = {}
+    for call in _calls:
+        s = stats.setdefault(call["model"], {
+            "provider": call["provider"],
+            "calls": 0,
+            "cold_call_ms": None,
+            "warm_calls": 0,
+            "avg_warm_call_ms": None,
+            "setup_ms": 0.0,
+            "input_tokens": 0,
+            "cached_tokens": 0,
+        })
+        s["calls"] += 1
+        s["setup_ms"] = round(s["setup_ms"] + call["setup_ms"], 2)
+        s["input_tokens"] += call.get("input_tokens", 0)
+        s["cached_tokens"] += call.get("cached_tokens", 0)
+        if not call["reused_client"]:
+            s["cold_call_ms"] = call["call_ms"]
+        else:
+            total = (s["avg_warm_call_ms"] or 0.0) * s["warm_calls"] + call["call_ms"]
+            s["warm_calls"] += 1
+            s["avg_warm_call_ms"] = round(total / s["warm_calls"], 2)
+    return stats
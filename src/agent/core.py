@@ -1,9 +1,27 @@
 # src/agent/core.py
 
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from src.tools.ping import PingTool
 from src.tools.dns import DNSTool
 from src.tools.traceroute import TracerouteTool
-from src.agent.llm import get_diagnosis, get_react_decision, parse_react_response, DEFAULT_MODEL
+from src.tools import netstate
+from src import tracing
+from src.agent.speculation import Speculator, predict_next_tools
+from src.agent import layers as layered_probe
+from src.agent import rules
+from src.agent import deadline as time_budget
+from src.agent.llm import (
+    get_diagnosis,
+    get_react_decision,
+    stream_react_decision,
+    parse_react_response,
+    DEFAULT_MODEL,
+    MAX_ACTIONS_PER_STEP,
+)
+from src.agent.clients import collect_usage
+from src.agent.observations import ObservationEncoder
 from src.agent.prompts import (
     REACT_SYSTEM_PROMPT,
     build_react_observation,
@@ -31,33 +49,78 @@ def extract_target(symptom):
     return DEFAULT_TARGET
 
 
-def run_diagnostics(target):
-    """
-    run all 3 tools against the target and return results
-    in iter 2 this will be replaced by the react loop
-    """
-    # known limitation: we always run all 3 tools even if ping fails immediately
-    # e.g. if there's a complete outage, running traceroute after a failed ping
-    # is pointless and just adds ~30s of timeout waiting
-    # the react loop in iter 2 fixes this by stopping early when it has enough info
-    tools = [
-        PingTool(),
-        DNSTool(),
-        TracerouteTool(),
-    ]
+# once the first tool comes back with this result, the listed tools can't
+# tell us anything new - e.g. traceroute after 100% ping loss just burns
+# ~30s of "* * *" timeouts
+CANCEL_RULES = [
+    ("ping", lambda result: not result["success"], ["traceroute"]),
+]
 
-    results = []
-    for tool in tools:
-        print(f"  Running {tool.__class__.__name__} on {target}...")
-        result = tool.run(target)
-        results.append(result)
 
-    return results
+def _skipped_result(tool_name, target, reason, duration=0.0):
+    return {
+        "tool_name": tool_name,
+        "target": target,
+        "success": False,
+        "data": {},
+        "raw_output": "",
+        "error": f"{tool_name} skipped: {reason}",
+        "duration_seconds": duration,
+    }
 
 
-def diagnose(symptom, model=DEFAULT_MODEL):
+def run_diagnostics(target, budget=None):
+    """
+    run all 3 tools against the target at the same time and return results
+    (always in ping, dns, traceroute order)
+    budget: seconds each tool may take (see the tools' run())
+
+    when a decisive result comes in (see CANCEL_RULES) the tools it makes
+    pointless are cancelled, killing their subprocess if it already started
+    """
+    tools = {name: tool_class() for name, tool_class in AVAILABLE_TOOLS.items()}
+
+    results = {}
+    cancel_reasons = {}
+    started = time.time()
+
+    with ThreadPoolExecutor(max_workers=len(tools)) as pool:
+        futures = {}
+        for name, tool in tools.items():
+            print(f"  Running {tool.__class__.__name__} on {target}...")
+            futures[pool.submit(tracing.bind(tool.run), target, budget=budget)] = name
+
+        for future in as_completed(futures):
+            name = futures[future]
+            tool = tools[name]
+
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = _skipped_result(name, target, f"tool crashed ({e})", time.time() - started)
+                continue
+            if tool.cancelled and not results[name]["success"]:
+                results[name] = _skipped_result(name, target, cancel_reasons[name], time.time() - started)
+                continue
+
+            for trigger, is_decisive, to_cancel in CANCEL_RULES:
+                if trigger != name or not is_decisive(results[name]):
+                    continue
+                for other in to_cancel:
+                    if other in results or tools[other].cancelled:
+                        continue
+                    cancel_reasons[other] = f"{trigger} result made it unnecessary"
+                    print(f"  Cancelling {tools[other].__class__.__name__} ({cancel_reasons[other]})")
+                    tools[other].cancel()
+
+    return [results[name] for name in tools]
+
+
+def diagnose(symptom, model=DEFAULT_MODEL, deadline=None):
     """
     main function - takes a symptom string, runs diagnostics, returns diagnosis dict
+    deadline: seconds the whole diagnosis may take, tools get what's left
+    after the reserve for the LLM call
     """
     print(f"\nAnalyzing: {symptom}")
     print("Running diagnostics...\n")
@@ -65,15 +128,40 @@ def diagnose(symptom, model=DEFAULT_MODEL):
     target = extract_target(symptom)
     print(f"  Target identified: {target}")
 
-    tool_results = run_diagnostics(target)
-
-    print("\nGenerating diagnosis...\n")
-    diagnosis = get_diagnosis(symptom, tool_results, model=model)
+    with time_budget.scope(deadline), tracing.span("diagnosis", mode="iter1", model=model, target=target) as span:
+        reserve = _reserve(deadline)
+        tool_results = run_diagnostics(target, budget=_tool_budget(reserve, steps_left=1))
+        by_name = {r["tool_name"]: r for r in tool_results}
+
+        match = rules.evaluate(target, by_name)
+        if match:
+            print(f"\nRule '{match['rule']}' matched, skipping the LLM\n")
+            diagnosis = match["diagnosis"]
+            diagnosis["rule"] = match["rule"]
+            diagnosis["rule_confidence"] = match["confidence"]
+        else:
+            print("\nGenerating diagnosis...\n")
+            encoder = ObservationEncoder()
+            try:
+                diagnosis = get_diagnosis(symptom, tool_results, model=model, encoder=encoder)
+            except TimeoutError:
+                print("  LLM did not answer in time, diagnosing from the tool results\n")
+                diagnosis = _fallback_diagnosis(target, by_name, "the time budget ran out")
+            diagnosis["observation_tokens"] = encoder.stats()
+        diagnosis["trace_id"] = span.trace.trace_id
 
     return diagnosis
 
 
-MAX_STEPS = 5  # safety limit — agent can't run more than 5 tool calls
+MAX_STEPS = 5  # safety limit — at most 5 LLM turns, each running up to llm.MAX_ACTIONS_PER_STEP tools
+
+# with a deadline: the share of it kept back for the final diagnosis call,
+# and how many steps the rest is split over - most diagnoses take 2-3, so
+# splitting by MAX_STEPS would starve every tool
+DIAGNOSIS_RESERVE = 0.25
+MIN_DIAGNOSIS_RESERVE = 1.5     # seconds
+EXPECTED_STEPS = 3
+MIN_STEP_SECONDS = 1.0          # less than this left for a step and we diagnose
 
 AVAILABLE_TOOLS = {
     "ping":       PingTool,
@@ -82,7 +170,116 @@ AVAILABLE_TOOLS = {
 }
 
 
-def diagnose_react(symptom: str, model: str = DEFAULT_MODEL) -> dict:
+def _quiet(*args, **kwargs):
+    pass
+
+
+def _emit(on_event, event_type, **fields):
+    # progress callback for live displays (web UI, daemon clients)
+    if on_event:
+        on_event({"type": event_type, **fields})
+
+
+# what the rules look at. dns runs for ip targets too (a PTR lookup), it's
+# what tells "whole network down" apart from "this host is down"
+FAST_PATH_TOOLS = ["ping", "dns"]
+
+
+def _reserve(deadline):
+    """seconds of a deadline kept back for the final diagnosis call"""
+    if deadline is None:
+        return 0.0
+    return min(deadline / 2, max(MIN_DIAGNOSIS_RESERVE, deadline * DIAGNOSIS_RESERVE))
+
+
+def _usable(reserve):
+    """seconds left before the reserve, None without a deadline"""
+    left = time_budget.remaining()
+    return None if left is None else max(0.0, left - reserve)
+
+
+def _tool_budget(reserve, steps_left=EXPECTED_STEPS):
+    """one step's share of what's left before the reserve, None without a deadline"""
+    usable = _usable(reserve)
+    return None if usable is None else usable / max(1, min(steps_left, EXPECTED_STEPS))
+
+
+def _fallback_diagnosis(target, results, why):
+    """no usable answer from the LLM - a rule's diagnosis if one matches, else "incomplete"."""
+    match = rules.evaluate(target, results)
+    if match:
+        diagnosis = match["diagnosis"]
+        diagnosis["rule"] = match["rule"]
+        return diagnosis
+    return {
+        "summary": f"Diagnosis incomplete — {why}.",
+        "root_cause": "unknown",
+        "recommendations": ["Please try again with a more specific symptom description."],
+    }
+
+
+def _run_fast_path(target, say, budget=None):
+    """run the tools the rules look at, all at once -> {tool name: result}"""
+    names = FAST_PATH_TOOLS
+    say(f"  Fast path: running {', '.join(names)} for the rule engine...")
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        futures = {
+            name: pool.submit(tracing.bind(AVAILABLE_TOOLS[name]().run), target, budget=budget)
+            for name in names
+        }
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = _skipped_result(name, target, f"tool crashed ({e})")
+    return results
+
+
+def _read_local_state(say):
+    """the host's own links, routes and counters - no probes, a few ms"""
+    with tracing.span("netstate") as span:
+        local = netstate.snapshot()
+        span.set(read_ms=local["read_ms"])
+    say(f"  Local network state ({local['read_ms']} ms from /proc and /sys):")
+    for line in netstate.describe(local).splitlines()[1:]:
+        say(f"  {line.strip()}")
+    return local
+
+
+def _run_layers(target, say, budget=None, local=None):
+    """gateway, resolvers and target in one parallel round -> (layers, {tool name: result})"""
+    say("  Layered probe: gateway, DNS resolvers and target in parallel...")
+    with tracing.span("layers", target=target) as span:
+        layers, results = layered_probe.probe(target, AVAILABLE_TOOLS, budget=budget, local=local)
+        span.set(fault_layer=layers["fault_layer"] or "")
+    for line in layered_probe.describe(layers).splitlines()[1:]:
+        say(f"  {line.strip()}")
+    return layers, results
+
+
+def _rule_diagnosis(match, results, started):
+    diagnosis = match["diagnosis"]
+    diagnosis["react_trace"] = [{
+        "step": 1,
+        "thought": f"The tool results match the '{match['rule']}' rule "
+                   f"(confidence {match['confidence']}), no LLM call needed.",
+        "action": "RULE",
+        "rule": match["rule"],
+        "confidence": match["confidence"],
+        "observation": results,
+        "time_to_action_seconds": round(time.time() - started, 3),
+    }]
+    diagnosis["tools_used"] = list(results)
+    diagnosis["steps_taken"] = 1
+    diagnosis["rule"] = match["rule"]
+    return diagnosis
+
+
+def diagnose_react(symptom: str, model: str = DEFAULT_MODEL, speculate: bool = True,
+                   stream: bool = True, on_event=None, target: str = None,
+                   verbose: bool = True, fast_path: bool = True, deadline: float = None,
+                   layered: bool = True, local_state: bool = True) -> dict:
     """
     ReAct loop implementation — replaces the fixed 3-tool pipeline from Iter 1.
     
@@ -90,108 +287,367 @@ def diagnose_react(symptom: str, model: str = DEFAULT_MODEL) -> dict:
     It stops as soon as it has enough information, rather than always running all 3 tools.
     
     Args:
-        symptom: Natural language problem description
-        model:   LLM provider/model to use
+        symptom:   Natural language problem description
+        model:     LLM provider/model to use
+        speculate: Start the tools the LLM will most likely ask for next while
+                   it is still thinking (see src/agent/speculation.py)
+        stream:    Stream each LLM reply - the thought prints as it is written
+                   and the tool starts as soon as the ACTION line is complete
+        on_event:  Optional callback, called with a dict for each step, thought
+                   chunk, action, observation and the final diagnosis
+        target:    Host to probe, instead of guessing it from the symptom
+        verbose:   Print progress to stdout (batch runs turn this off)
+        fast_path: Run ping (and dns) first and return straight away if a
+                   rule in src/agent/rules.py matches - no LLM call. If none
+                   does, the ReAct loop reuses those results
+        deadline:  Seconds the whole diagnosis may take. Each tool gets a share
+                   of what's left as its budget, each LLM call times out in
+                   time, and when too little is left the loop diagnoses from
+                   the evidence it has
+        layered:   Probe the default gateway, the DNS resolvers and the
+                   target in one parallel round first (src/agent/layers.py).
+                   The rules see which layer failed and the LLM gets the
+                   per-layer picture in its first message
+        local_state: Read the host's links, default route, resolvers and
+                   error counters from /proc and /sys first
+                   (src/tools/netstate.py). The LLM starts with them, and
+                   each observation mentions counters that climbed since
+                   the last step
     
     Returns:
         Dict with keys: summary, root_cause, recommendations, react_trace
         react_trace contains the full reasoning chain for display/debugging
+        speculation (when enabled) has the prefetch hit rate and time saved
+        observation_tokens has the estimated observation tokens before/after
+        compact encoding
+        trace_id names this run's spans, see src/tracing.py
     """
-    print(f"\nAnalyzing: {symptom}")
-    print(f"Model: {model}")
-    print("Starting ReAct loop...\n")
+    say = print if verbose else _quiet
+
+    say(f"\nAnalyzing: {symptom}")
+    say(f"Model: {model}")
+    say("Starting ReAct loop...\n")
+
+    target = target or extract_target(symptom)
+
+    started = time.time()
+    with time_budget.scope(deadline), tracing.span("diagnosis", mode="react", model=model, target=target) as span:
+        diagnosis = _diagnose_react(symptom, model, target, speculate, stream, on_event, say, fast_path,
+                                    _reserve(deadline), layered, local_state)
+        diagnosis["trace_id"] = span.trace.trace_id
+        span.set(steps=diagnosis.get("steps_taken") or 0, rule=diagnosis.get("rule") or "")
+    if deadline is not None:
+        diagnosis["deadline"] = {
+            "seconds": deadline,
+            "used_seconds": round(time.time() - started, 3),
+            "forced": diagnosis.get("forced") == "deadline",
+        }
+
+    _emit(on_event, "diagnosis", diagnosis=diagnosis)
+    return diagnosis
+
+
+def _diagnose_react(symptom, model, target, speculate, stream, on_event, say, fast_path, reserve, layered,
+                    local_state):
+    ready = {}
+    layers = None
+    local = _read_local_state(say) if local_state else None
+    if local:
+        _emit(on_event, "local_state", local_state=local)
+    if fast_path or layered:
+        started = time.time()
+        with tracing.span("fast_path", layered=layered) as span:
+            if layered:
+                layers, ready = _run_layers(target, say, _tool_budget(reserve), local)
+                _emit(on_event, "layers", layers=layers)
+                span.set(fault_layer=layers["fault_layer"] or "")
+            else:
+                ready = _run_fast_path(target, say, _tool_budget(reserve))
+            match = (rules.evaluate(target, ready, layers=layers, local=netstate.facts(local) if local else None)
+                     if fast_path else None)
+            span.set(rule=match["rule"] if match else "")
+        if match:
+            say(f"  Rule '{match['rule']}' matched, skipping the LLM\n")
+            _emit(on_event, "rule", step=1, rule=match["rule"], confidence=match["confidence"])
+            diagnosis = _rule_diagnosis(match, ready, started)
+            if layers:
+                diagnosis["layers"] = layers
+            if local:
+                diagnosis["local_state"] = local
+            return diagnosis
+
+    speculator = Speculator(AVAILABLE_TOOLS, target) if speculate else None
+
+    context = "\n\n".join(block for block in (
+        netstate.describe(local) if local else None,
+        layered_probe.describe(layers) if layers else None,
+    ) if block) or None
+    tracker = netstate.Tracker(local) if local else None
+    try:
+        diagnosis = _react_loop(symptom, model, target, speculator, stream, on_event, say, ready, reserve,
+                                context, tracker)
+    finally:
+        if speculator:
+            speculator.shutdown()
+
+    if speculator:
+        diagnosis["speculation"] = speculator.stats()
+    if layers:
+        diagnosis["layers"] = layers
+    if local:
+        diagnosis["local_state"] = local
+    return diagnosis
+
 
-    # Build initial conversation history
+def _react_loop(symptom, model, target, speculator, stream, on_event, say, ready, reserve, context=None,
+                tracker=None):
+    # Build initial conversation history. it only ever grows at the end -
+    # nothing before the last message changes - so every step's request
+    # starts with the previous one byte for byte and hits the provider's
+    # prompt cache (see llm.py). anything per-run goes after the system prompt
     conversation = [
         {"role": "system",    "content": REACT_SYSTEM_PROMPT},
-        {"role": "user",      "content": build_react_initial_message(symptom)},
+        {"role": "user",      "content": build_react_initial_message(symptom, context)},
     ]
 
-    tools_used = set()      # track which tools have run, prevent duplicates
+    tools_used = set()      # "ping", or "ping 1.1.1.1" off the main target - prevents duplicates
     react_trace = []        # full reasoning chain for display
-    target = extract_target(symptom)
+    results = {}            # tool name -> result dict, drives speculation
+    encoder = ObservationEncoder()  # keeps observations inside the token budget
+
+    def obtain(tool_name, where, budget):
+        """(result, how it was got) - the fast path's or a prefetched run if there is one, else a new run"""
+        if where == target and tool_name in ready:
+            return ready.pop(tool_name), {"fast_path": True}
+        prefetched = speculator.take(tool_name) if speculator and where == target else None
+        if prefetched:
+            result, saved = prefetched
+            return result, {"speculative": True, "time_saved_seconds": round(saved, 3)}
+        return AVAILABLE_TOOLS[tool_name]().run(where, budget=budget), {}
+
+    def conclude(message, steps_taken, why):
+        diagnosis = _force_diagnosis(conversation, model, message, target, {**ready, **results}, why)
+        diagnosis["react_trace"] = react_trace
+        diagnosis["tools_used"] = list(tools_used)
+        diagnosis["steps_taken"] = steps_taken
+        diagnosis["observation_tokens"] = encoder.stats()
+        return diagnosis
 
     for step in range(MAX_STEPS):
-        print(f"  Step {step + 1}: asking LLM what to do next...")
-
-        # Ask LLM for next decision
-        raw_response = get_react_decision(conversation, model=model)
-        parsed = parse_react_response(raw_response)
-
-        # Add LLM response to conversation history
-        conversation.append({"role": "assistant", "content": raw_response})
-
-        if parsed["type"] == "action":
-            tool_name = parsed["tool"]
-            thought = parsed["thought"]
-
-            print(f"  Thought: {thought}")
-            print(f"  Action:  run {tool_name}")
-
-            react_trace.append({
-                "step": step + 1,
-                "thought": thought,
-                "action": tool_name,
-            })
+        usable = _usable(reserve)
+        if usable is not None and usable < MIN_STEP_SECONDS:
+            say("  Time budget running low, diagnosing from what we have...")
+            diagnosis = conclude(
+                "You are out of time. Provide your DIAGNOSIS now based on what you have.",
+                step, "the time budget ran out",
+            )
+            diagnosis["forced"] = "deadline"
+            return diagnosis
 
-            # Guard: don't run unknown or already-used tools
-            if tool_name not in AVAILABLE_TOOLS:
-                observation = f"OBSERVATION: Unknown tool '{tool_name}'. Available: ping, dns, traceroute"
-            elif tool_name in tools_used:
-                observation = f"OBSERVATION: {tool_name} already ran. Use a different tool or provide diagnosis."
-            else:
-                # Run the tool
-                tool = AVAILABLE_TOOLS[tool_name]()
-                result = tool.run(target)
-                tools_used.add(tool_name)
-                observation = build_react_observation(tool_name, result)
-                react_trace[-1]["observation"] = result
-
-            print(f"  Observation: {observation[:100]}...")  # truncate for readability
+        with tracing.span("react_step", step=step + 1) as step_span:
+            say(f"  Step {step + 1}: asking LLM what to do next...")
+            _emit(on_event, "step", step=step + 1)
+
+            # Start likely next tools so they run while the LLM is thinking
+            if speculator:
+                speculator.prefetch([t for t in predict_next_tools(target, results) if t not in ready],
+                                    budget=_tool_budget(reserve, MAX_STEPS - step))
+
+            # Ask LLM for next decision - when streaming, the thought shows up
+            # live and we get control back the moment the ACTION line is complete
+            asked = time.time()
+            streamed = []
+            try:
+                # the decision mustn't eat into the final diagnosis's reserve
+                with time_budget.scope(_usable(reserve)), collect_usage() as usage:
+                    if stream:
+                        def show_thought(text, step=step + 1):
+                            if not streamed:
+                                say("  Thought: ", end="")
+                            streamed.append(text)
+                            say(text, end="", flush=True)
+                            _emit(on_event, "thought", step=step, text=text)
+
+                        raw_response = stream_react_decision(conversation, model=model, on_thought=show_thought)
+                        if streamed:
+                            say()
+                    else:
+                        raw_response = get_react_decision(conversation, model=model)
+            except TimeoutError:
+                say("\n  LLM did not answer in time, diagnosing from what we have...")
+                step_span.set(action="timeout")
+                diagnosis = conclude(
+                    "You are out of time. Provide your DIAGNOSIS now based on what you have.",
+                    step + 1, "the time budget ran out",
+                )
+                diagnosis["forced"] = "deadline"
+                return diagnosis
+            decision_seconds = time.time() - asked
+            with tracing.span("parse"):
+                parsed = parse_react_response(raw_response)
+            # input tokens the provider read from its prompt cache this step
+            prompt_cache = ({"input_tokens": usage["input_tokens"], "cached_tokens": usage["cached_tokens"]}
+                            if usage["calls"] else None)
+            step_span.set(action=parsed["type"])
+
+            # Add LLM response to conversation history
+            conversation.append({"role": "assistant", "content": raw_response})
+
+            if parsed["type"] == "action":
+                thought = parsed["thought"]
+
+                # one turn can ask for several tools, each on the diagnosis's
+                # target unless it names another host. they run in parallel
+                # and all their observations go back in one message
+                plan = []
+                actions = [a for a in parsed["actions"] if not a.get("over_limit")]
+                not_run = [" ".join(filter(None, (a["tool"], a["target"] or a.get("bad_target"))))
+                           for a in parsed["actions"] if a.get("over_limit")]
+                for action in actions:
+                    tool_name, where = action["tool"], action["target"] or target
+                    # a dotless word is only a host when it's the problem's own
+                    bad_target = action.get("bad_target")
+                    if bad_target and bad_target.lower() == target.lower():
+                        bad_target = None
+                    if where.lower() == target.lower():
+                        where = target
+                    label = tool_name if where == target else f"{tool_name} {where}"
+                    # Guard: don't run unknown or already-used tools (per target),
+                    # or anything on a "host" that isn't one
+                    if tool_name not in AVAILABLE_TOOLS:
+                        note = f"OBSERVATION: Unknown tool '{tool_name}'. Available: ping, dns, traceroute"
+                    elif bad_target:
+                        label = f"{tool_name} {bad_target}"
+                        note = (f"OBSERVATION: '{bad_target}' is not a hostname or IP address, "
+                                f"{tool_name} was not run. Separate tools with commas, and name a host "
+                                f"as e.g. {tool_name} 1.1.1.1")
+                    elif label in tools_used or any(p["label"] == label for p in plan):
+                        note = f"OBSERVATION: {label} already ran. Use a different tool or provide diagnosis."
+                    else:
+                        note = None
+                    plan.append({"tool": tool_name, "target": where, "label": label, "note": note})
+                action_text = ", ".join(p["label"] for p in plan)
+                step_span.set(action=action_text)
+
+                if not streamed:
+                    say(f"  Thought: {thought}")
+                say(f"  Action:  run {action_text}")
+                _emit(on_event, "action", step=step + 1, thought=thought, tool=action_text,
+                      tools=[p["label"] for p in plan])
+
+                react_trace.append({
+                    "step": step + 1,
+                    "thought": thought,
+                    "action": action_text,
+                    "time_to_action_seconds": round(decision_seconds, 3),
+                })
+                if prompt_cache:
+                    react_trace[-1]["prompt_cache"] = prompt_cache
+
+                runnable = [p for p in plan if p["note"] is None]
+                if speculator:
+                    speculator.keep({p["tool"] for p in runnable if p["target"] == target})
+                budget = _tool_budget(reserve, MAX_STEPS - step)
+                if len(runnable) > 1:
+                    with ThreadPoolExecutor(max_workers=len(runnable)) as pool:
+                        futures = [pool.submit(tracing.bind(obtain), p["tool"], p["target"], budget)
+                                   for p in runnable]
+                    outcomes = [future.result() for future in futures]
+                else:
+                    outcomes = [obtain(p["tool"], p["target"], budget) for p in runnable]
+                for p, outcome in zip(runnable, outcomes):
+                    p["outcome"] = outcome
+
+                parts, details = [], []
+                for p in plan:
+                    if p["note"] is not None:
+                        parts.append(p["note"])
+                        continue
+                    result, how = p["outcome"]
+                    tools_used.add(p["label"])
+                    if p["target"] == target:
+                        results[p["tool"]] = result
+                    parts.append(build_react_observation(p["tool"], result, encoder,
+                                                         p["label"] if p["target"] != target else None))
+                    details.append({"tool": p["tool"], "target": p["target"], **how, "observation": result,
+                                    "observation_tokens": encoder.last_tokens})
+                if not_run:
+                    parts.append(f"OBSERVATION: only {MAX_ACTIONS_PER_STEP} tools run per ACTION - "
+                                 f"{', '.join(not_run)} were not run. Ask again if you still need them.")
+                    react_trace[-1]["not_run"] = not_run
+                observation = "\n\n".join(parts)
+                react_trace[-1]["actions"] = details
+                if len(details) == 1:
+                    react_trace[-1].update({k: v for k, v in details[0].items() if k not in ("tool", "target")})
+
+                # error counters climbing or a link dropping while we probe
+                # is evidence too - a few ms of /proc reads, no probe
+                if tracker:
+                    local_changes = netstate.describe_diff(tracker.poll())
+                    if local_changes:
+                        observation += f"\nLOCAL: {local_changes}"
+                        react_trace[-1]["local_changes"] = local_changes
+
+                say(f"  Observation: {observation[:100]}...")  # truncate for readability
+                _emit(on_event, "observation", step=step + 1, tool=action_text, text=observation)
             
-            # Add observation to conversation so LLM sees it next turn
-            conversation.append({"role": "user", "content": observation})
-
-        elif parsed["type"] == "diagnosis":
-            thought = parsed["thought"]
-            diagnosis = parsed["diagnosis"]
-
-            print(f"  Thought: {thought}")
-            print(f"  → Diagnosis ready after {step + 1} step(s), {len(tools_used)} tool(s) used\n")
-
-            react_trace.append({
-                "step": step + 1,
-                "thought": thought,
-                "action": "DIAGNOSE",
-            })
-
-            # Add trace info to the diagnosis for display
-            diagnosis["react_trace"] = react_trace
-            diagnosis["tools_used"] = list(tools_used)
-            diagnosis["steps_taken"] = step + 1
-            return diagnosis
+                # Add observation to conversation so LLM sees it next turn
+                conversation.append({"role": "user", "content": observation})
+
+            elif parsed["type"] == "diagnosis":
+                thought = parsed["thought"]
+                diagnosis = parsed["diagnosis"]
+
+                if not streamed:
+                    say(f"  Thought: {thought}")
+                say(f"  → Diagnosis ready after {step + 1} step(s), {len(tools_used)} tool(s) used\n")
+
+                react_trace.append({
+                    "step": step + 1,
+                    "thought": thought,
+                    "action": "DIAGNOSE",
+                })
+                if prompt_cache:
+                    react_trace[-1]["prompt_cache"] = prompt_cache
+
+                # Add trace info to the diagnosis for display
+                diagnosis["react_trace"] = react_trace
+                diagnosis["tools_used"] = list(tools_used)
+                diagnosis["steps_taken"] = step + 1
+                diagnosis["observation_tokens"] = encoder.stats()
+                return diagnosis
 
-        else:
-            # Parsing failed — fallback
-            print(f"  Warning: could not parse LLM response at step {step + 1}")
-            conversation.append({
-                "role": "user",
-                "content": "OBSERVATION: Could not parse your response. Please follow the exact format."
-            })
+            else:
+                # Parsing failed — fallback
+                say(f"  Warning: could not parse LLM response at step {step + 1}")
+                conversation.append({
+                    "role": "user",
+                    "content": "OBSERVATION: Could not parse your response. Please follow the exact format."
+                })
 
     # Safety fallback if we hit MAX_STEPS without a diagnosis
-    print(f"  Warning: reached MAX_STEPS ({MAX_STEPS}) without diagnosis, forcing conclusion...")
-    raw_response = get_react_decision(conversation + [{
-        "role": "user",
-        "content": "You have reached the maximum number of steps. Provide your DIAGNOSIS now based on what you have."
-    }], model=model)
-    parsed = parse_react_response(raw_response)
-    diagnosis = parsed.get("diagnosis", {
-        "summary": "Diagnosis incomplete — maximum steps reached.",
-        "root_cause": "unknown",
-        "recommendations": ["Please try again with a more specific symptom description."]
-    })
-    diagnosis["react_trace"] = react_trace
-    diagnosis["tools_used"] = list(tools_used)
-    diagnosis["steps_taken"] = MAX_STEPS
-    return diagnosis
\ No newline at end of file
+    say(f"  Warning: reached MAX_STEPS ({MAX_STEPS}) without diagnosis, forcing conclusion...")
+    diagnosis = conclude(
+        "You have reached the maximum number of steps. Provide your DIAGNOSIS now based on what you have.",
+        MAX_STEPS, "maximum steps reached",
+    )
+    diagnosis["forced"] = "max_steps"
+    return diagnosis
+
+
+def _force_diagnosis(conversation, model, message, target, results, why):
+    """
+    one last LLM call for a diagnosis from the evidence so far - it gets
+    whatever is left of the deadline, and if that's nothing (or it times
+    out, or the answer doesn't parse) the tool results speak for themselves
+    """
+    left = time_budget.remaining()
+    if left is None or left > 0:
+        try:
+            raw_response = get_react_decision(conversation + [{"role": "user", "content": message}], model=model)
+            parsed = parse_react_response(raw_response)
+            if "diagnosis" in parsed:
+                return parsed["diagnosis"]
+        except TimeoutError:
+            pass
+    return _fallback_diagnosis(target, results, why)
\ No newline at end of file
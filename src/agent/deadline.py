@@ -0,0 +1,61 @@
+# src/agent/deadline.py
+
+"""
+end-to-end time budget for one diagnosis
+
+    with deadline.scope(30):                  # the whole diagnosis
+        ...
+        with deadline.scope(deadline.remaining() - reserve):
+            get_react_decision(...)           # its LLM call times out in time
+
+the current deadline lives in a contextvar, so it follows the work into
+tool / LLM pool threads submitted through tracing.bind(). a nested scope
+can only tighten the deadline, never extend it. llm.py caps every call's
+timeout at remaining(); tools get their share explicitly as `budget`.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+
+def current():
+    return _current.get()
+
+
+def remaining():
+    """seconds left on the current deadline, None if there isn't one"""
+    d = _current.get()
+    return None if d is None else d.remaining()
+
+
+@contextmanager
+def scope(seconds: float = None):
+    """run the block under a deadline `seconds` from now (None = no new limit)"""
+    outer = _current.get()
+    if seconds is None:
+        yield outer
+        return
+    d = Deadline(max(0.0, seconds))
+    if outer is not None and outer.at < d.at:
+        d = outer
+    token = _current.set(d)
+    try:
+        yield d
+    finally:
+        _current.reset(token)
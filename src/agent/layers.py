@@ -0,0 +1,184 @@
+# src/agent/layers.py
+
+"""
+layered fault location in one parallel round
+
+a single target can't tell a LAN fault from an ISP fault from a broken
+destination - ping 8.8.8.8 fails the same way for all three. so before the
+ReAct loop, probe every layer at once:
+
+    gateway      the default route's next hop (LAN)
+    resolvers    each nameserver in resolv.conf (DNS, and past the gateway)
+    destination  the symptom's host
+
+the gateway, every resolver and the destination get pinged and the
+destination gets looked up (the dns tool asks every resolver and records
+each one's answer), all in parallel. the result is one combined per-layer
+view: what answered, and the first layer that didn't (fault_layer). the
+rules can act on it, and the LLM gets it in its first message instead of
+finding it out one tool per step.
+"""
+
+import ipaddress
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import tracing
+from src.tools import netstate, resolver
+
+MAX_RESOLVERS = 3   # what the libc resolver uses, too
+
+
+def _is_loopback(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def discover(target: str, local: dict = None) -> dict:
+    """the addresses to probe, per layer - from `local` (a netstate snapshot) when given"""
+    local = local or netstate.snapshot()
+    if "routes" in local["unavailable"]:
+        gateway = {"address": None, "status": "unknown", "note": "routing table not readable here"}
+    elif local["default_route"]:
+        gateway = dict(local["default_route"])
+    elif local["default_route_v6"]:
+        gateway = {**local["default_route_v6"], "status": "unknown", "note": "IPv6 default route only, not probed"}
+    else:
+        gateway = {"address": None, "status": "no_route"}
+    return {"gateway": gateway, "resolvers": local["resolvers"][:MAX_RESOLVERS], "destination": target}
+
+
+def _ping_summary(result: dict) -> dict:
+    data = result.get("data") or {}
+    return {
+        "status": "reachable" if result["success"] else "unreachable",
+        "loss_percent": data.get("packet_loss_percent"),
+        "rtt_ms": data.get("avg_rtt_ms"),
+    }
+
+
+def probe(target: str, tool_classes: dict, budget: float = None, local: dict = None):
+    """
+    one parallel round over every layer
+    returns (layers, results) - results is {"ping", "dns"} for the
+    destination, the same shape the rules and the ReAct loop already use
+    local is a netstate snapshot already taken, if there is one
+    """
+    found = discover(target, local)
+    gateway = found["gateway"]
+    # a gateway that was found has no status yet - the ping gives it one
+    probe_gateway = "status" not in gateway
+
+    # one ping per address - a home router is often the gateway and the
+    # resolver both. loopback resolvers (a local stub) always answer, no point
+    ping_addresses = [gateway["address"]] if probe_gateway else []
+    ping_addresses += [r for r in found["resolvers"] if not _is_loopback(r)]
+    ping_addresses = list(dict.fromkeys(ping_addresses + [target]))
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=len(ping_addresses) + 1) as pool:
+        pings = {address: pool.submit(tracing.bind(tool_classes["ping"]().run), address, budget=budget)
+                 for address in ping_addresses}
+        lookup = pool.submit(tracing.bind(tool_classes["dns"]().run), target, budget=budget)
+
+    def result_of(future, tool_name, address):
+        try:
+            return future.result()
+        except Exception as e:
+            return {"tool_name": tool_name, "target": address, "success": False, "data": {},
+                    "raw_output": "", "error": f"{tool_name} crashed ({e})", "duration_seconds": 0.0}
+
+    ping_results = {address: result_of(future, "ping", address) for address, future in pings.items()}
+    dns = result_of(lookup, "dns", target)
+
+    layers = {"gateway": dict(gateway)}
+    if probe_gateway:
+        layers["gateway"].update(_ping_summary(ping_results[gateway["address"]]))
+
+    per_resolver = (dns.get("data") or {}).get("resolvers") or {}
+    layers["resolvers"] = []
+    for address in found["resolvers"]:
+        answer = per_resolver.get(address) or {}
+        entry = {"address": address, "dns_rcode": answer.get("rcode"), "dns_ms": answer.get("latency_ms"),
+                 "dns_error": answer.get("error") or ""}
+        if _is_loopback(address):
+            entry["status"] = "local"
+        else:
+            entry.update(_ping_summary(ping_results[address]))
+        layers["resolvers"].append(entry)
+
+    destination = ping_results[target]
+    layers["destination"] = {
+        "address": target,
+        **_ping_summary(destination),
+        "resolved": (dns.get("data") or {}).get("resolved", False),
+        "dns_rcode": (dns.get("data") or {}).get("rcode"),
+    }
+    layers["fault_layer"] = locate_fault(layers, target)
+    layers["seconds"] = round(time.time() - started, 3)
+    return layers, {"ping": destination, "dns": dns}
+
+
+def _is_ip(target: str) -> bool:
+    try:
+        ipaddress.ip_address(target)
+        return True
+    except ValueError:
+        return False
+
+
+def locate_fault(layers: dict, target: str):
+    """
+    the first layer that looks broken: "lan", "upstream" (past the gateway,
+    the ISP), "dns", "destination", or None when everything answered
+    a hint for the rules and the LLM, not a verdict - plenty of gateways
+    and hosts just don't answer pings
+    """
+    gateway, destination = layers["gateway"], layers["destination"]
+    if gateway["status"] == "no_route":
+        return "lan"
+    dns_answered = any(r["dns_rcode"] in resolver.FINAL_RCODES for r in layers["resolvers"])
+    if destination["status"] == "reachable":
+        if not _is_ip(target) and not destination["resolved"]:
+            return "dns"
+        return None
+    # something past the gateway answered - the way out works
+    upstream = dns_answered or any(r["status"] == "reachable" for r in layers["resolvers"])
+    if upstream:
+        return "destination"
+    if gateway["status"] == "unreachable":
+        return "lan"
+    return "upstream"
+
+
+def describe(layers: dict) -> str:
+    """the combined per-layer observation the LLM gets"""
+    def ping_text(layer):
+        if layer["status"] == "reachable":
+            return f"answers ping ({layer['loss_percent']}% loss, {layer['rtt_ms']} ms)"
+        if layer["status"] == "unreachable":
+            return "no ping replies"
+        return layer["status"]
+
+    gateway = layers["gateway"]
+    lines = ["Layered probe (gateway, DNS resolvers and destination, probed in parallel):"]
+    if gateway["status"] == "no_route":
+        lines.append("  gateway: NO DEFAULT ROUTE")
+    elif gateway["status"] == "unknown":
+        lines.append(f"  gateway: {gateway.get('address') or 'unknown'} ({gateway.get('note', 'not probed')})")
+    else:
+        lines.append(f"  gateway {gateway['address']} ({gateway['interface']}): {ping_text(gateway)}")
+    if not layers["resolvers"]:
+        lines.append("  resolvers: none configured")
+    for r in layers["resolvers"]:
+        dns = (f"DNS {r['dns_rcode']} in {r['dns_ms']} ms" if r["dns_rcode"]
+               else f"DNS no answer{' (' + r['dns_error'] + ')' if r['dns_error'] else ''}")
+        where = "local stub resolver" if r["status"] == "local" else ping_text(r)
+        lines.append(f"  resolver {r['address']}: {where}; {dns}")
+    d = layers["destination"]
+    lookup = "resolved" if d["resolved"] else f"not resolved ({d['dns_rcode'] or 'no answer'})"
+    lines.append(f"  destination {d['address']}: {ping_text(d)}; {lookup}")
+    lines.append(f"  first failing layer: {layers['fault_layer'] or 'none - every layer answered'}")
+    return "\n".join(lines)
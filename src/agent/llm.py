@@ -1,7 +1,18 @@
 # src/agent/llm.py
 
+import contextvars
+import hashlib
+import ipaddress
 import json
-import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from src import tracing
+from . import deadline
+from .clients import collect_usage, get_client, report_late_usage, timed
+from .observations import estimate_tokens
+from .resilience import LLMPolicy
 from .prompts import SYSTEM_PROMPT, build_user_prompt
 
 DEFAULT_MODEL = "gpt-4o-mini"
@@ -21,67 +32,415 @@ GOOGLE_MODELS    = {"gemini-2.5-flash"}
 GROQ_MODELS      = {"llama-3.3-70b-versatile"}
 
 
-def _call_openai(messages, model):
-    from openai import OpenAI
-    client = OpenAI()
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.3,
-        max_tokens=500,
-        response_format={"type": "json_object"},  # force json
-    )
-    return response.choices[0].message.content
+# extra providers plugged in at runtime (e.g. the offline stub the evaluation
+# harness uses), model name -> provider name, see register_provider
+CUSTOM_MODELS = {}
 
 
-def _call_anthropic(messages, model):
-    import anthropic
-    client = anthropic.Anthropic()
-    # anthropic takes system separately, not in messages list
+def provider_for(model):
+    if model in CUSTOM_MODELS:
+        return CUSTOM_MODELS[model]
+    if model in ANTHROPIC_MODELS:
+        return "anthropic"
+    if model in GOOGLE_MODELS:
+        return "google"
+    if model in GROQ_MODELS:
+        return "groq"
+    return "openai"  # default to openai
+
+
+# prompt caching. the ReAct conversation only ever grows at the end (see
+# _react_loop), so each step's request starts with the previous step's whole
+# request, byte for byte. openai and groq cache a repeated prefix on their
+# own, anthropic caches up to the cache_control breakpoints we put in
+CACHE_CONTROL = {"type": "ephemeral"}
+# a streamed answer's usage comes after its last chunk. one closed at the
+# ACTION line reads up to this many more chunks for it, in the background -
+# ACTION is the end of the answer, so there's rarely more than the finish
+# chunk to go
+USAGE_DRAIN_CHUNKS = 4
+
+# tools one ACTION line may ask for - they run in parallel. REACT_SYSTEM_PROMPT
+# tells the model the same number
+MAX_ACTIONS_PER_STEP = 4
+
+
+def _openai_usage(usage):
+    """openai / groq usage -> report_usage() counts (cached tokens are part of prompt_tokens)"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        "output_tokens": usage.completion_tokens or 0,
+    }
+
+
+def _anthropic_usage(usage):
+    # anthropic's input_tokens is only what came after the last cache hit/write
+    read = usage.cache_read_input_tokens or 0
+    written = usage.cache_creation_input_tokens or 0
+    return {
+        "input_tokens": usage.input_tokens + read + written,
+        "cached_tokens": read,
+        "cache_write_tokens": written,
+        "output_tokens": usage.output_tokens or 0,
+    }
+
+
+def _google_usage(metadata):
+    if not metadata or not metadata.prompt_token_count:
+        return None
+    return {
+        "input_tokens": metadata.prompt_token_count,
+        "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+        "output_tokens": metadata.candidates_token_count or 0,
+    }
+
+
+def _close_stream(stream, call, usage_of, finished):
+    """
+    close a provider stream. one we stopped reading early (the ACTION line
+    was in) still has its usage chunk to come - read the few chunks left on
+    a thread of its own, the caller has its answer and is off running tools
+    """
+    if finished:
+        stream.close()
+        return
+
+    def drain():
+        try:
+            for i, chunk in enumerate(stream):
+                usage = usage_of(chunk)
+                if usage:
+                    report_late_usage(call, usage)
+                    return
+                if i + 1 >= USAGE_DRAIN_CHUNKS:
+                    return
+        except Exception:
+            pass  # the answer was already complete, usage is just a nice-to-have
+        finally:
+            stream.close()
+
+    threading.Thread(target=tracing.bind(drain), name="usage-drain", daemon=True).start()
+
+
+def _prompt_cache_key(messages):
+    # same system prompt -> same key, so openai routes those requests to the
+    # machines that have the prefix cached
     system = next((m["content"] for m in messages if m["role"] == "system"), "")
-    user_messages = [m for m in messages if m["role"] != "system"]
-    # prefill trick from anthropic docs - start response with { to force json output
-    # note: anthropic doesn't return the prefilled part, so we add it back below
-    user_messages = user_messages + [{"role": "assistant", "content": "{"}]
-    response = client.messages.create(
-        model=model,
-        system=system,
-        messages=user_messages,
-        max_tokens=500,
-        temperature=0.3,
-    )
-    return "{" + response.content[0].text
-
-
-def _call_google(messages, model):
-    import google.generativeai as genai
-    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
+    return "netdiag-" + hashlib.sha256(system.encode()).hexdigest()[:16]
+
+
+def _anthropic_messages(messages, prefill=""):
+    """
+    system blocks + messages in anthropic's shape, with two cache breakpoints:
+    the system prompt (the same for every diagnosis) and the end of the last
+    message (the conversation so far - the next step's prefix). anthropic
+    finds the previous step's breakpoint by itself when looking one up
+    """
+    # anthropic takes system separately, not in messages list
     system = next((m["content"] for m in messages if m["role"] == "system"), "")
-    user   = next((m["content"] for m in messages if m["role"] == "user"),   "")
-    gen_model = genai.GenerativeModel(
-        model_name=model,
-        system_instruction=system,
-        generation_config=genai.GenerationConfig(
+    turns = [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"]
+    if turns:
+        turns[-1]["content"] = [{"type": "text", "text": turns[-1]["content"], "cache_control": CACHE_CONTROL}]
+    if prefill:
+        turns.append({"role": "assistant", "content": prefill})
+    if system:
+        system = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+    return system, turns
+
+
+def _call_openai(messages, model, max_tokens=500, json_mode=True):
+    client, setup = get_client("openai", model)
+    kwargs = {}
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}  # force json
+    with timed("openai", model, setup) as call:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
             temperature=0.3,
-            response_mime_type="application/json",  # force json like openai does
-        ),
-    )
-    response = gen_model.generate_content(user)
+            max_tokens=max_tokens,
+            prompt_cache_key=_prompt_cache_key(messages),
+            **kwargs,
+        )
+        call["usage"] = _openai_usage(response.usage)
+    return response.choices[0].message.content
+
+
+def _call_anthropic(messages, model, max_tokens=500, json_mode=True):
+    client, setup = get_client("anthropic", model)
+    prefill = ""
+    if json_mode:
+        # prefill trick from anthropic docs - start response with { to force json output
+        # note: anthropic doesn't return the prefilled part, so we add it back below
+        prefill = "{"
+    system, user_messages = _anthropic_messages(messages, prefill)
+    with timed("anthropic", model, setup) as call:
+        response = client.messages.create(
+            model=model,
+            system=system,
+            messages=user_messages,
+            max_tokens=max_tokens,
+            temperature=0.3,
+        )
+        call["usage"] = _anthropic_usage(response.usage)
+    return prefill + response.content[0].text
+
+
+def _google_chat(messages, model, json_mode):
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    gen_model, setup = get_client("google", model, system=system, json_mode=json_mode)
+    # Build conversation for Google
+    history = []
+    for m in messages:
+        if m["role"] == "user":
+            history.append({"role": "user", "parts": [m["content"]]})
+        elif m["role"] == "assistant":
+            history.append({"role": "model", "parts": [m["content"]]})
+    return gen_model, history, setup
+
+
+def _call_google(messages, model, max_tokens=500, json_mode=True):
+    gen_model, history, setup = _google_chat(messages, model, json_mode)
+    with timed("google", model, setup) as call:
+        chat = gen_model.start_chat(history=history[:-1])
+        response = chat.send_message(history[-1]["parts"][0])
+        call["usage"] = _google_usage(getattr(response, "usage_metadata", None))
     return response.text
 
 
-def _call_groq(messages, model):
-    from groq import Groq
-    client = Groq()
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.3,
-        max_tokens=500,
-    )
+def _call_groq(messages, model, max_tokens=500, json_mode=True):
+    # groq gets no response_format, same as before
+    client, setup = get_client("groq", model)
+    with timed("groq", model, setup) as call:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens,
+        )
+        call["usage"] = _openai_usage(response.usage)
     return response.choices[0].message.content
 
 
+PROVIDER_CALLS = {
+    "openai":    _call_openai,
+    "anthropic": _call_anthropic,
+    "google":    _call_google,
+    "groq":      _call_groq,
+}
+
+
+def register_provider(name, call, stream=None, models=()):
+    """
+    plug in another provider: call(messages, model, max_tokens, json_mode)
+    returns the reply text, stream(messages, model, max_tokens) yields
+    chunks of it. `models` are the model names that route to it
+    """
+    PROVIDER_CALLS[name] = call
+    if stream is not None:
+        PROVIDER_STREAMS[name] = stream
+    for model in models:
+        CUSTOM_MODELS[model] = name
+
+
+# cap on LLM calls in flight for the batch this context belongs to (None =
+# no cap), see max_concurrent_llm_calls
+_llm_slots = contextvars.ContextVar("llm_slots", default=None)
+
+
+@contextmanager
+def max_concurrent_llm_calls(limit: int = None):
+    """
+    batch runs use this to stay under provider rate limits. it covers what
+    runs inside the block and the pools it binds (tracing.bind), so two
+    batches in one process keep their own limits
+    """
+    token = _llm_slots.set(threading.BoundedSemaphore(limit) if limit else None)
+    try:
+        yield
+    finally:
+        _llm_slots.reset(token)
+
+
+@contextmanager
+def _llm_slot():
+    slots = _llm_slots.get()
+    if slots is None:
+        yield
+        return
+    with slots:
+        yield
+
+
+# optional hook around every model exchange (the cassette recorder uses it)
+# called as hook(kind, messages, model, options, call): kind is "call" (call()
+# returns the reply text) or "stream" (call() returns an iterator of chunks)
+_llm_hook = None
+
+
+def set_llm_hook(hook=None):
+    global _llm_hook
+    _llm_hook = hook
+
+
+def _llm_span(provider, model, messages, **attributes):
+    # token counts are estimates, the same ones the observation budget uses
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    return tracing.span("llm", provider=provider, model=model, prompt_tokens=prompt_tokens, **attributes)
+
+
+def _set_usage(span, usage):
+    # what the provider billed, when it said - input_tokens includes cached_tokens
+    if usage["calls"]:
+        span.set(input_tokens=usage["input_tokens"], cached_tokens=usage["cached_tokens"])
+
+
+# timeouts, hedging to fallback models and per-provider circuit breakers
+# (LLM_FALLBACKS / LLM_TIMEOUT / LLM_HEDGE_PERCENTILE), see resilience.py
+_policy = LLMPolicy.from_env(provider_for)
+
+
+def set_llm_policy(policy: LLMPolicy):
+    global _policy
+    _policy = policy
+
+
+def llm_policy() -> LLMPolicy:
+    return _policy
+
+
+def _policy_call(messages, model, max_tokens, json_mode, span):
+    def call(route):
+        return PROVIDER_CALLS[provider_for(route)](messages, route, max_tokens=max_tokens, json_mode=json_mode)
+    # never past the diagnosis's deadline, if it has one
+    reply, info = _policy.call(model, call, timeout=deadline.remaining())
+    span.set(**info)
+    return reply
+
+
+def _call_model(messages, model, max_tokens=500, json_mode=True):
+    provider = provider_for(model)
+    with _llm_slot(), _llm_span(provider, model, messages, json_mode=json_mode) as span, \
+            collect_usage() as usage:
+        if _llm_hook is not None:
+            reply = _llm_hook(
+                "call", messages, model, {"max_tokens": max_tokens, "json_mode": json_mode},
+                lambda: _policy_call(messages, model, max_tokens, json_mode, span),
+            )
+        else:
+            reply = _policy_call(messages, model, max_tokens, json_mode, span)
+        span.set(completion_tokens=estimate_tokens(reply or ""))
+        _set_usage(span, usage)
+        return reply
+
+
+# streaming versions - generators of text chunks. closing the generator
+# closes the underlying stream, which stops generation where the provider
+# allows it (openai, groq, anthropic drop the connection; gemini just stops
+# being read)
+
+def _stream_openai(messages, model, max_tokens=600):
+    client, setup = get_client("openai", model)
+    with timed("openai", model, setup) as call:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            prompt_cache_key=_prompt_cache_key(messages),
+        )
+        finished = False
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    call["usage"] = _openai_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            finished = True
+        finally:
+            _close_stream(stream, call, lambda chunk: _openai_usage(chunk.usage), finished)
+
+
+def _stream_anthropic(messages, model, max_tokens=600):
+    client, setup = get_client("anthropic", model)
+    system, user_messages = _anthropic_messages(messages)
+    with timed("anthropic", model, setup) as call:
+        with client.messages.stream(
+            model=model,
+            system=system,
+            messages=user_messages,
+            max_tokens=max_tokens,
+            temperature=0.3,
+        ) as stream:
+            try:
+                for text in stream.text_stream:
+                    yield text
+            finally:
+                # input and cache counts arrive with message_start, before any text
+                try:
+                    call["usage"] = _anthropic_usage(stream.current_message_snapshot.usage)
+                except Exception:
+                    pass
+
+
+def _stream_google(messages, model, max_tokens=600):
+    gen_model, history, setup = _google_chat(messages, model, json_mode=False)
+    with timed("google", model, setup) as call:
+        chat = gen_model.start_chat(history=history[:-1])
+        for chunk in chat.send_message(history[-1]["parts"][0], stream=True):
+            call["usage"] = _google_usage(getattr(chunk, "usage_metadata", None)) or call.get("usage")
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunks without text parts (e.g. the final finish_reason one)
+                continue
+            if text:
+                yield text
+
+
+def _groq_chunk_usage(chunk):
+    # groq puts a stream's usage in the last chunk's x_groq block
+    x_groq = getattr(chunk, "x_groq", None)
+    return _openai_usage(getattr(x_groq, "usage", None) or getattr(chunk, "usage", None))
+
+
+def _stream_groq(messages, model, max_tokens=600):
+    client, setup = get_client("groq", model)
+    with timed("groq", model, setup) as call:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        finished = False
+        try:
+            for chunk in stream:
+                usage = _groq_chunk_usage(chunk)
+                if usage:
+                    call["usage"] = usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            finished = True
+        finally:
+            _close_stream(stream, call, _groq_chunk_usage, finished)
+
+
+PROVIDER_STREAMS = {
+    "openai":    _stream_openai,
+    "anthropic": _stream_anthropic,
+    "google":    _stream_google,
+    "groq":      _stream_groq,
+}
+
+
 def _parse_json(raw):
     # try to parse the llm response as json
     # some models wrap it in ```json ... ``` so strip that first
@@ -105,27 +464,19 @@ def _parse_json(raw):
             }
 
 
-def get_diagnosis(symptom, tool_results, model=DEFAULT_MODEL):
+def get_diagnosis(symptom, tool_results, model=DEFAULT_MODEL, encoder=None):
     """
     send symptom + tool results to the llm and get back a diagnosis dict
+    pass an ObservationEncoder to read the prompt's token savings afterwards
     returns: { summary, root_cause, recommendations }
     """
-    user_prompt = build_user_prompt(symptom, tool_results)
+    user_prompt = build_user_prompt(symptom, tool_results, encoder)
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user",   "content": user_prompt},
     ]
 
-    if model in OPENAI_MODELS:
-        raw = _call_openai(messages, model)
-    elif model in ANTHROPIC_MODELS:
-        raw = _call_anthropic(messages, model)
-    elif model in GOOGLE_MODELS:
-        raw = _call_google(messages, model)
-    elif model in GROQ_MODELS:
-        raw = _call_groq(messages, model)
-    else:
-        raw = _call_openai(messages, model)  # default to openai
+    raw = _call_model(messages, model)
 
     return _parse_json(raw)
 
@@ -143,75 +494,169 @@ def get_react_decision(conversation_history: list[dict], model: str = DEFAULT_MO
     Returns:
         Raw string response from LLM — either "THOUGHT/ACTION" or "THOUGHT/DIAGNOSIS"
     """
-    if model in OPENAI_MODELS:
-        from openai import OpenAI
-        client = OpenAI()
-        # Note: no response_format=json_object here — ReAct responses are plain text,
-        # not JSON. The DIAGNOSIS block inside the response is parsed by parse_react_response.
-        response = client.chat.completions.create(
-            model=model,
-            messages=conversation_history,
-            temperature=0.3,
-            max_tokens=600,
-        )
-        return response.choices[0].message.content
+    # Note: no json mode here — ReAct responses are plain text, not JSON.
+    # The DIAGNOSIS block inside the response is parsed by parse_react_response.
+    return _call_model(conversation_history, model, max_tokens=600, json_mode=False)
 
-    elif model in ANTHROPIC_MODELS:
-        import anthropic
-        client = anthropic.Anthropic()
-        system = next((m["content"] for m in conversation_history if m["role"] == "system"), "")
-        user_messages = [m for m in conversation_history if m["role"] != "system"]
-        response = client.messages.create(
-            model=model,
-            system=system,
-            messages=user_messages,
-            max_tokens=600,
-            temperature=0.3,
-        )
-        return response.content[0].text
-
-    elif model in GOOGLE_MODELS:
-        import google.generativeai as genai
-        import os
-        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
-        system = next((m["content"] for m in conversation_history if m["role"] == "system"), "")
-        # Build conversation for Google
-        history = []
-        for m in conversation_history:
-            if m["role"] == "user":
-                history.append({"role": "user", "parts": [m["content"]]})
-            elif m["role"] == "assistant":
-                history.append({"role": "model", "parts": [m["content"]]})
-        gen_model = genai.GenerativeModel(
-            model_name=model,
-            system_instruction=system,
-            generation_config=genai.GenerationConfig(temperature=0.3),
-        )
-        chat = gen_model.start_chat(history=history[:-1])
-        response = chat.send_message(history[-1]["parts"][0])
-        return response.text
 
-    elif model in GROQ_MODELS:
-        from groq import Groq
-        client = Groq()
-        response = client.chat.completions.create(
-            model=model,
-            messages=conversation_history,
-            temperature=0.3,
-            max_tokens=600,
-        )
-        return response.choices[0].message.content
+def _open_stream(messages, model, max_tokens=600):
+    stream = PROVIDER_STREAMS.get(provider_for(model))
+    if stream is None:
+        # provider without streaming support - one big chunk
+        call = PROVIDER_CALLS[provider_for(model)]
+        return iter([call(messages, model, max_tokens=max_tokens, json_mode=False)])
+    return stream(messages, model, max_tokens=max_tokens)
 
-    else:
-        from openai import OpenAI
-        client = OpenAI()
-        response = client.chat.completions.create(
-            model=model,
-            messages=conversation_history,
-            temperature=0.3,
-            max_tokens=600,
-        )
-        return response.choices[0].message.content
+
+def _policy_stream(messages, model, max_tokens, span):
+    chunks, info = _policy.stream(model, lambda route: _open_stream(messages, route, max_tokens),
+                                  timeout=deadline.remaining())
+    span.set(**info)
+    return chunks
+
+
+def stream_react_decision(conversation_history: list[dict], model: str = DEFAULT_MODEL,
+                          on_thought=None) -> str:
+    """
+    Streaming version of get_react_decision.
+
+    The THOUGHT text is passed to on_thought(chunk) as it arrives, and the
+    stream is closed as soon as a complete ACTION: line is in, so the caller
+    can start the tool without waiting for the rest of the completion.
+
+    Returns:
+        Raw response text up to and including the ACTION line (or the whole
+        response for a DIAGNOSIS) — same thing parse_react_response expects
+    """
+    provider = provider_for(model)
+    parser = ReactStreamParser()
+    with _llm_slot(), _llm_span(provider, model, conversation_history, stream=True) as span, \
+            collect_usage() as usage:
+        started = time.time()
+        if _llm_hook is not None:
+            chunks = _llm_hook(
+                "stream", conversation_history, model, {"max_tokens": 600},
+                lambda: _policy_stream(conversation_history, model, 600, span),
+            )
+        else:
+            chunks = _policy_stream(conversation_history, model, 600, span)
+        try:
+            for chunk in chunks:
+                if "first_chunk_ms" not in span.attributes:
+                    span.set(first_chunk_ms=round((time.time() - started) * 1000, 1))
+                thought = parser.feed(chunk)
+                if thought and on_thought:
+                    on_thought(thought)
+                if parser.action_complete:
+                    break
+                if deadline.remaining() == 0:
+                    # out of time mid-answer - what came in is all there is
+                    span.set(cut_short=True)
+                    break
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+        span.set(completion_tokens=estimate_tokens(parser.response()))
+        _set_usage(span, usage)
+    return parser.response()
+
+
+class ReactStreamParser:
+    """
+    incremental THOUGHT/ACTION/DIAGNOSIS parser for streamed responses
+
+    feed() returns any new THOUGHT text, action_complete flips once a full
+    ACTION: line (ending in a newline) has been seen
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.thought_sent = 0
+        self.action_complete = False
+        self.action_end = None
+
+    def _line_starts(self):
+        start = 0
+        for line in self.text.split("\n"):
+            yield start, line
+            start += len(line) + 1
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        new_thought = ""
+
+        for start, line in self._line_starts():
+            if line.startswith("THOUGHT:"):
+                # only the thought line, and only what we haven't sent yet
+                thought = line[len("THOUGHT:"):].lstrip()
+                new_thought = thought[self.thought_sent:]
+                self.thought_sent = len(thought)
+            elif line.startswith("ACTION:"):
+                end = start + len(line)
+                if end < len(self.text):      # newline seen, line is complete
+                    self.action_complete = True
+                    self.action_end = end
+                break
+            elif line.startswith("DIAGNOSIS:"):
+                break
+        return new_thought
+
+    def response(self) -> str:
+        if self.action_complete:
+            return self.text[:self.action_end]
+        return self.text
+
+
+# a DNS name: labels of letters, digits, - and _, none starting or ending with -
+_HOSTNAME = re.compile(r"^(?=.{1,253}\.?$)[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?"
+                       r"(\.[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?)*\.?$", re.IGNORECASE)
+
+
+def is_host(text: str) -> bool:
+    """
+    an ip literal or a hostname, nothing else. the model's targets go into
+    ping / traceroute argv, and what it read may be a web user's symptom -
+    a "-f" or a path must never get that far
+    """
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return bool(_HOSTNAME.match(text))
+
+
+def _is_target(text: str) -> bool:
+    """an ip, or a host name with a dot in it - "ping then dns" names no host"""
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return "." in text and is_host(text)
+
+
+def parse_actions(spec: str) -> list[dict]:
+    """
+    "ping, dns example.com" -> [{"tool": "ping", "target": None},
+    {"tool": "dns", "target": "example.com"}]. target None = the diagnosis's
+    own target. a target that isn't an ip or a dotted hostname comes back as
+    "bad_target" instead, for the loop to refuse. actions past
+    MAX_ACTIONS_PER_STEP come back with "over_limit", for the loop to report
+    as not run. an empty line gives one action with tool "" (the loop
+    reports it as an unknown tool)
+    """
+    actions = []
+    for part in spec.split(","):
+        words = part.strip().strip("`").split()
+        if words:
+            target = words[1].strip("`'\".") if len(words) > 1 else None
+            action = {"tool": words[0].lower(), "target": target or None}
+            if target and not _is_target(target):
+                action = {**action, "target": None, "bad_target": target}
+            actions.append(action)
+    for action in actions[MAX_ACTIONS_PER_STEP:]:
+        action["over_limit"] = True
+    return actions or [{"tool": "", "target": None}]
 
 
 def parse_react_response(response: str) -> dict:
@@ -219,7 +664,7 @@ def parse_react_response(response: str) -> dict:
     Parse the LLM's ReAct response into a structured dict.
     
     Returns one of:
-        {"type": "action", "thought": "...", "tool": "ping"}
+        {"type": "action", "thought": "...", "tool": "ping", "actions": [{"tool", "target"}, ...]}
         {"type": "diagnosis", "thought": "...", "diagnosis": {...}}
         {"type": "error", "raw": "..."}
     """
@@ -231,8 +676,9 @@ def parse_react_response(response: str) -> dict:
             thought = line.replace("THOUGHT:", "").strip()
         
         elif line.startswith("ACTION:"):
-            tool = line.replace("ACTION:", "").strip().lower()
-            return {"type": "action", "thought": thought, "tool": tool}
+            # one line, so the stream can still stop right after it
+            actions = parse_actions(line.replace("ACTION:", ""))
+            return {"type": "action", "thought": thought, "tool": actions[0]["tool"], "actions": actions}
         
         elif line.startswith("DIAGNOSIS:"):
             # Everything after DIAGNOSIS: is the JSON block
@@ -0,0 +1,368 @@
+# src/agent/monitor.py
+
+"""
+continuous monitoring with change-triggered re-diagnosis
+
+probes every target on a schedule with the normal tools (ping and dns each
+cycle, traceroute every few cycles) and keeps each metric's recent samples
+in a fixed-size ring buffer, so memory stays flat however long it runs.
+
+the LLM is only called when something changed: a metric moved more than
+k standard deviations above its own baseline, or the result fingerprint
+(ping up/down, dns answer, traceroute end hop) differs from last time.
+the symptom text for diagnose_react is written from what changed.
+
+the host's own state (src/tools/netstate.py) is diffed every cycle too: the
+default route changing, or its link going down or piling up errors, is
+found without a probe. it's one change for the host, not one per target, so
+it gets a single diagnosis with a cooldown of its own. links the default
+route doesn't use (docker veths coming and going) are left out.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from src.tools.ping import PingTool
+from src.tools.dns import DNSTool
+from src.tools.traceroute import TracerouteTool
+from src.tools import netstate
+from src.agent.core import diagnose_react
+from src.agent.llm import DEFAULT_MODEL
+
+
+DEFAULT_INTERVAL = 60.0        # seconds between polling cycles
+DEFAULT_WINDOW = 120           # samples kept per metric
+DEFAULT_SIGMA = 3.0            # how far above baseline counts as a change
+DEFAULT_COOLDOWN = 600.0       # min seconds between diagnoses of one target
+DEFAULT_TRACEROUTE_EVERY = 10  # traceroute once per this many cycles, 0 = never
+MIN_BASELINE_SAMPLES = 10      # don't judge a metric before it has this many
+
+# local counters that trigger a diagnosis when they climb. drops and TCP
+# retransmits tick up on a healthy machine too, so they stay out
+LOCAL_TRIGGERS = (("rx_errors", "rx errors"), ("tx_errors", "tx errors"), ("tx_carrier", "carrier errors"))
+HOST = "this host"             # the trigger / diagnosis events' target for local changes
+
+# metric name -> (tool, data field, smallest change worth a diagnosis)
+# the floor stops a very stable baseline (std ~0) from firing on noise
+METRICS = {
+    "packet_loss_percent": ("ping", "packet_loss_percent", 10.0),
+    "avg_rtt_ms":          ("ping", "avg_rtt_ms", 20.0),
+    "dns_response_ms":     ("dns", "response_time_ms", 50.0),
+}
+
+
+class RingBuffer:
+    """last `size` float samples in a preallocated array"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = array("d", bytes(8 * size))
+        self._next = 0
+        self.count = 0
+
+    def push(self, value: float):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def values(self) -> list[float]:
+        """oldest first"""
+        if self.count < self.size:
+            return self._data[:self.count].tolist()
+        return (self._data[self._next:] + self._data[:self._next]).tolist()
+
+    def last(self):
+        return self._data[(self._next - 1) % self.size] if self.count else None
+
+    def mean_std(self):
+        if not self.count:
+            return None, None
+        values = self._data[:self.count] if self.count < self.size else self._data
+        mean = sum(values) / self.count
+        var = sum((v - mean) ** 2 for v in values) / self.count
+        return mean, math.sqrt(var)
+
+
+def fingerprint_parts(results: dict) -> dict:
+    """
+    the categorical state of one cycle's results - anything here changing
+    is worth a diagnosis even if no number moved
+    """
+    parts = {}
+    ping = results.get("ping")
+    if ping is not None:
+        parts["ping"] = "up" if ping["success"] else "down"
+    dns = results.get("dns")
+    if dns is not None:
+        data = dns.get("data", {})
+        parts["dns"] = {
+            "resolved": bool(dns["success"] and data.get("resolved")),
+            "rcode": data.get("rcode"),
+            "addresses": sorted(data.get("ip_addresses") or []),
+        }
+    trace = results.get("traceroute")
+    if trace is not None:
+        responding = [h["ip"] for h in trace.get("data", {}).get("hops", []) if h["ip"]]
+        parts["traceroute"] = {
+            "success": trace["success"],
+            "last_hop": responding[-1] if responding else None,
+        }
+    return parts
+
+
+def fingerprint(parts: dict) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class TargetState:
+    """everything the monitor remembers about one target"""
+
+    def __init__(self, target: str, window: int):
+        self.target = target
+        self.buffers = {name: RingBuffer(window) for name in METRICS}
+        self.parts = {}              # last fingerprint part seen per tool
+        self.last_diagnosis = 0.0
+        self.diagnosing = False
+        self.cycles = 0
+
+
+def check_metrics(state: TargetState, results: dict, sigma: float) -> list[str]:
+    """
+    push this cycle's samples, returning a description of every metric that
+    is more than `sigma` std devs (and its floor) above its baseline
+    only upward moves count - rtt getting better isn't a problem
+    """
+    changes = []
+    for name, (tool, field, floor) in METRICS.items():
+        result = results.get(tool)
+        if result is None:
+            continue
+        value = result.get("data", {}).get(field)
+        if value is None and name == "packet_loss_percent" and not result["success"]:
+            value = 100.0
+        if value is None:
+            continue
+
+        buffer = state.buffers[name]
+        if buffer.count >= MIN_BASELINE_SAMPLES:
+            mean, std = buffer.mean_std()
+            if value - mean > max(sigma * std, floor):
+                changes.append(f"{name} is {value:g} against a baseline of {mean:.1f} ± {std:.1f}")
+        buffer.push(float(value))
+    return changes
+
+
+def check_fingerprint(state: TargetState, results: dict) -> list[str]:
+    """describe every fingerprint part that differs from the last cycle that had it"""
+    changes = []
+    for tool, part in fingerprint_parts(results).items():
+        previous = state.parts.get(tool)
+        state.parts[tool] = part
+        if previous is None or previous == part:
+            continue
+        if tool == "ping":
+            changes.append(f"ping went from {previous} to {part}")
+        elif tool == "dns":
+            if previous["resolved"] and not part["resolved"]:
+                changes.append(f"DNS stopped resolving (rcode {part['rcode']})")
+            elif not previous["resolved"] and part["resolved"]:
+                changes.append("DNS started resolving again")
+            elif previous["addresses"] != part["addresses"]:
+                changes.append(
+                    f"DNS answer changed from {', '.join(previous['addresses'])} "
+                    f"to {', '.join(part['addresses'])}"
+                )
+            else:
+                changes.append(f"DNS rcode changed from {previous['rcode']} to {part['rcode']}")
+        else:
+            changes.append(
+                f"traceroute changed from {'completing' if previous['success'] else 'failing'} via "
+                f"{previous['last_hop'] or 'nothing'} to {'completing' if part['success'] else 'failing'} "
+                f"via {part['last_hop'] or 'nothing'}"
+            )
+    return changes
+
+
+def build_symptom(target: str, changes: list[str]) -> str:
+    return f"Monitoring noticed a change for {target}: " + "; ".join(changes) + "."
+
+
+def route_interfaces(*snaps) -> set:
+    """the interfaces the default route (v4 or v6) went through in any of `snaps`"""
+    return {route["interface"] for snap in snaps
+            for route in (snap["default_route"], snap["default_route_v6"]) if route}
+
+
+def on_route(changes: dict, interfaces: set) -> dict:
+    """`changes` (netstate.diff) without the links and counters of other interfaces"""
+    return {**changes,
+            "links": [link for link in changes["links"] if link[0] in interfaces],
+            "interfaces": {name: grown for name, grown in changes["interfaces"].items() if name in interfaces}}
+
+
+class Monitor:
+    """
+    polls `targets` every `interval` seconds and re-diagnoses one only when
+    its metrics or fingerprint change
+
+    on_event(event) gets a dict for every sample, trigger and diagnosis:
+        {"type": "sample",    "target", "cycle", "fingerprint", "metrics"}
+        {"type": "trigger",   "target", "changes", "symptom", "suppressed"}
+        {"type": "diagnosis", "target", "symptom", "diagnosis"} (or "error")
+    local changes trigger and diagnose with target HOST
+    """
+
+    def __init__(self,
+                 targets: list[str],
+                 interval: float = DEFAULT_INTERVAL,
+                 window: int = DEFAULT_WINDOW,
+                 sigma: float = DEFAULT_SIGMA,
+                 cooldown: float = DEFAULT_COOLDOWN,
+                 traceroute_every: int = DEFAULT_TRACEROUTE_EVERY,
+                 model: str = DEFAULT_MODEL,
+                 on_event=None,
+                 workers: int = 8,
+                 diagnosis_workers: int = 2,
+                 watch_local: bool = True):
+        self.interval = interval
+        self.sigma = sigma
+        self.cooldown = cooldown
+        self.traceroute_every = traceroute_every
+        self.model = model
+        self.on_event = on_event or (lambda event: None)
+        self.states = {t: TargetState(t, window) for t in targets}
+        self.probe_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="monitor-probe")
+        self.diagnosis_pool = ThreadPoolExecutor(max_workers=diagnosis_workers, thread_name_prefix="monitor-diagnose")
+        self._stop = threading.Event()
+        self.llm_calls_saved = 0
+        self.local = netstate.Tracker() if watch_local else None
+        self.host = TargetState(HOST, 1)
+
+    def stop(self):
+        self._stop.set()
+
+    def _tools_for(self, state: TargetState) -> dict:
+        tools = {"ping": PingTool, "dns": DNSTool}
+        if self.traceroute_every and state.cycles % self.traceroute_every == 0:
+            tools["traceroute"] = TracerouteTool
+        return tools
+
+    def _probe(self, tool_class, target):
+        try:
+            return tool_class().run(target)
+        except Exception as e:
+            # named like the tools name their own results ("ping"), so a crash
+            # lands in the same fingerprint part and metrics as a failure
+            name = tool_class.__name__.removesuffix("Tool").lower()
+            return {"tool_name": name, "target": target, "success": False,
+                    "data": {}, "raw_output": "", "error": str(e), "duration_seconds": 0.0}
+
+    def poll(self) -> dict:
+        """run one cycle's probes for every target at once, returns {target: {tool: result}}"""
+        futures = {}
+        for target, state in self.states.items():
+            for name, tool_class in self._tools_for(state).items():
+                futures[(target, name)] = self.probe_pool.submit(self._probe, tool_class, target)
+        results = {target: {} for target in self.states}
+        for (target, name), future in futures.items():
+            results[target][name] = future.result()
+        return results
+
+    def local_changes(self) -> list[str]:
+        """what changed on this host's default route since the last cycle, as trigger descriptions"""
+        if self.local is None:
+            return []
+        before = self.local.last
+        changes = self.local.poll()
+        changes = on_route(changes, route_interfaces(before, self.local.last))
+        changes = netstate.describe_diff(changes, interface_counters=LOCAL_TRIGGERS, snmp_counters=())
+        return [changes] if changes else []
+
+    def evaluate_local(self, changes: list[str]):
+        """one diagnosis for a change on this host, whatever the number of targets"""
+        if not changes:
+            return
+        symptom = build_symptom(HOST, changes)
+        suppressed = self.host.diagnosing or time.time() - self.host.last_diagnosis < self.cooldown
+        self.on_event({
+            "type": "trigger",
+            "target": HOST,
+            "changes": changes,
+            "symptom": symptom,
+            "suppressed": suppressed,
+        })
+        if suppressed:
+            self.llm_calls_saved += 1
+            return
+        self.host.diagnosing = True
+        self.host.last_diagnosis = time.time()
+        # probed through the first target - the layered probe covers the
+        # gateway and resolvers whichever it is
+        self.diagnosis_pool.submit(self._diagnose, self.host, symptom, next(iter(self.states), None))
+
+    def evaluate(self, target: str, results: dict):
+        """update baselines with one target's results and diagnose if they changed"""
+        state = self.states[target]
+        changes = check_fingerprint(state, results) + check_metrics(state, results, self.sigma)
+        state.cycles += 1
+
+        self.on_event({
+            "type": "sample",
+            "target": target,
+            "cycle": state.cycles,
+            "fingerprint": fingerprint(state.parts),
+            "metrics": {name: buf.last() for name, buf in state.buffers.items()},
+        })
+        if not changes:
+            self.llm_calls_saved += 1
+            return
+
+        symptom = build_symptom(target, changes)
+        suppressed = state.diagnosing or time.time() - state.last_diagnosis < self.cooldown
+        self.on_event({
+            "type": "trigger",
+            "target": target,
+            "changes": changes,
+            "symptom": symptom,
+            "suppressed": suppressed,
+        })
+        if suppressed:
+            self.llm_calls_saved += 1
+            return
+
+        state.diagnosing = True
+        state.last_diagnosis = time.time()
+        self.diagnosis_pool.submit(self._diagnose, state, symptom)
+
+    def _diagnose(self, state: TargetState, symptom: str, target: str = None):
+        try:
+            diagnosis = diagnose_react(symptom, model=self.model, target=target or state.target, verbose=False)
+            self.on_event({"type": "diagnosis", "target": state.target, "symptom": symptom, "diagnosis": diagnosis})
+        except Exception as e:
+            self.on_event({"type": "diagnosis", "target": state.target, "symptom": symptom, "error": str(e)})
+        finally:
+            state.diagnosing = False
+
+    def run(self, cycles: int = None):
+        """poll until stop() is called or `cycles` cycles have run"""
+        done = 0
+        try:
+            while not self._stop.is_set() and (cycles is None or done < cycles):
+                started = time.monotonic()
+                polled = self.poll()
+                self.evaluate_local(self.local_changes())
+                for target, results in polled.items():
+                    self.evaluate(target, results)
+                done += 1
+                if cycles is not None and done >= cycles:
+                    break
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            self.probe_pool.shutdown(wait=True)
+            # let diagnoses already asked for finish
+            self.diagnosis_pool.shutdown(wait=True)
@@ -0,0 +1,230 @@
+# src/agent/observations.py
+
+"""
+compact, token-budgeted encoding of tool results for the LLM
+
+the old observation format sent repr(data) plus the whole raw_output, so a
+30-hop traceroute was thousands of tokens - and get_react_decision resends
+every observation on every later step. this encoder:
+
+  - writes parsed data as short key=value pairs
+  - run-length encodes timed-out traceroute hops ("6-30: * x25")
+  - drops raw_output when the parsed data already has everything
+  - cuts whatever is left to fit a per-observation and per-conversation
+    token budget, always at the same place for the same input
+
+token counts are estimated (~4 chars per token), which is close enough to
+compare before/after without pulling in a tokenizer per provider.
+"""
+
+import math
+
+CHARS_PER_TOKEN = 4
+
+OBSERVATION_TOKEN_BUDGET = 250     # max tokens for one observation
+CONVERSATION_TOKEN_BUDGET = 1000   # max tokens for all observations in one diagnosis
+MIN_OBSERVATION_TOKENS = 40        # never squeeze an observation below this
+
+# parsed fields that have to be present (and not None) before we trust the
+# parsed data enough to drop raw_output
+REQUIRED_FIELDS = {
+    "ping":       ["packet_loss_percent", "avg_rtt_ms"],
+    "dns":        ["resolved"],
+    "traceroute": ["hops"],
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def verbose_result(result: dict) -> str:
+    """the original uncompressed format, used as the 'before' size"""
+    if result["success"]:
+        return (
+            "Status: SUCCESS\n"
+            f"Data: {result['data']}\n"
+            f"Raw Output:\n{result['raw_output']}"
+        )
+    return f"Status: FAILED\nError: {result['error']}"
+
+
+def encode_hops(hops: list[dict]) -> str:
+    """one short line per responding hop, runs of silent hops collapsed"""
+    lines = []
+    i = 0
+    while i < len(hops):
+        hop = hops[i]
+        if hop["ip"] is None and hop["rtt_ms"] is None:
+            j = i
+            while j + 1 < len(hops) and hops[j + 1]["ip"] is None and hops[j + 1]["rtt_ms"] is None:
+                j += 1
+            first, last = hop["hop_num"], hops[j]["hop_num"]
+            if first == last:
+                lines.append(f"  {first}: *")
+            else:
+                lines.append(f"  {first}-{last}: * x{j - i + 1}")
+            i = j + 1
+            continue
+
+        rtt = f"{hop['rtt_ms']}ms" if hop["rtt_ms"] is not None else "?"
+        partial = " (some probes lost)" if hop["timed_out"] else ""
+        lines.append(f"  {hop['hop_num']}: {hop['ip'] or '?'} {rtt}{partial}")
+        i += 1
+    return "\n".join(lines)
+
+
+def _compact(value) -> str:
+    if isinstance(value, list):
+        return ",".join(_compact(v) for v in value) or "none"
+    if isinstance(value, dict):
+        inner = " ".join(f"{k}:{_compact(v)}" for k, v in value.items() if v not in (None, ""))
+        return f"({inner})"
+    return str(value)
+
+
+def encode_data(data: dict) -> str:
+    parts = []
+    hops_text = None
+    for key, value in data.items():
+        if key == "hops":
+            hops_text = encode_hops(value)
+            continue
+        parts.append(f"{key}={_compact(value)}")
+    text = ", ".join(parts)
+    if hops_text:
+        text += "\nhops:\n" + hops_text
+    return text
+
+
+def data_is_complete(tool_name: str, result: dict) -> bool:
+    required = REQUIRED_FIELDS.get(tool_name)
+    if not required:
+        return False
+    data = result.get("data", {})
+    return all(data.get(field) is not None for field in required)
+
+
+def _truncate(text: str, budget: int) -> str:
+    """cut text to roughly `budget` tokens on a line boundary, noting what was dropped"""
+    if estimate_tokens(text) <= budget:
+        return text
+    limit = budget * CHARS_PER_TOKEN
+    cut = text.rfind("\n", 0, limit)
+    if cut <= 0:
+        cut = limit
+    dropped = estimate_tokens(text[cut:])
+    return text[:cut].rstrip() + f"\n[... {dropped} tokens truncated]"
+
+
+def _truncate_line(text: str, budget: int) -> str:
+    """cut one comma-separated line to roughly `budget` tokens, on a field boundary"""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text.rfind(", ", 0, budget * CHARS_PER_TOKEN - 6)
+    return (text[:cut] if cut > 0 else text[:budget * CHARS_PER_TOKEN - 6]) + ", ..."
+
+
+def _truncate_middle(text: str, budget: int) -> str:
+    """
+    like _truncate but keeps the start and the end - tool output puts its
+    summary (loss %, rtt line) last, so that's the part worth keeping
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    half = budget * CHARS_PER_TOKEN // 2
+    head_cut = text.rfind("\n", 0, half)
+    tail_cut = text.find("\n", len(text) - half)
+    if head_cut <= 0 or tail_cut < 0 or tail_cut <= head_cut:
+        return _truncate(text, budget)
+    dropped = estimate_tokens(text[head_cut:tail_cut])
+    return f"{text[:head_cut]}\n[... {dropped} tokens truncated]{text[tail_cut:]}"
+
+
+def _failure_data(data: dict) -> str:
+    """
+    what a failed run still found out (dns rcode, per-resolver errors), empty
+    fields left out and the short ones first, so a tight budget cuts the
+    long per-resolver detail before the rcode
+    """
+    fields = [f"{key}={_compact(value)}" for key, value in data.items()
+              if key != "hops" and value not in (None, "", [], {})]
+    return ", ".join(sorted(fields, key=len))
+
+
+def encode_result(tool_name: str, result: dict, budget: int = OBSERVATION_TOKEN_BUDGET) -> str:
+    """compact Status/Data(/Raw Output) block for one tool result, at most ~`budget` tokens"""
+    if not result["success"]:
+        text = f"Status: FAILED\nError: {result['error']}"
+        data = _failure_data(result.get("data") or {})
+        if data:
+            room = budget - estimate_tokens(text) - 2
+            if room >= MIN_OBSERVATION_TOKENS // 4:
+                text += "\nData: " + _truncate_line(data, room)
+        return _truncate(text, budget)
+
+    head = f"Status: SUCCESS\nData: {encode_data(result['data'])}"
+    if data_is_complete(tool_name, result) or not result.get("raw_output"):
+        return _truncate(head, budget)
+
+    # parsed data is missing something, give the model the raw text too,
+    # but only what fits after the parsed part
+    room = budget - estimate_tokens(head) - 2
+    if room < MIN_OBSERVATION_TOKENS // 2:
+        return _truncate(head, budget)
+    raw = _truncate_middle(result["raw_output"].strip(), room)
+    return f"{head}\nRaw Output:\n{raw}"
+
+
+def encode_observation(tool_name: str, result: dict, budget: int = OBSERVATION_TOKEN_BUDGET,
+                       label: str = None) -> str:
+    """compact OBSERVATION string for the ReAct loop, headed by label (default the tool name)"""
+    header = f"OBSERVATION: {label or tool_name} result:"
+    return header + "\n" + encode_result(tool_name, result, budget - estimate_tokens(header))
+
+
+class ObservationEncoder:
+    """
+    encodes every observation for one diagnosis, sharing a conversation-wide
+    token budget, and keeps before/after token counts
+    """
+
+    def __init__(self,
+                 observation_budget: int = OBSERVATION_TOKEN_BUDGET,
+                 conversation_budget: int = CONVERSATION_TOKEN_BUDGET):
+        self.observation_budget = observation_budget
+        self.conversation_budget = conversation_budget
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.last_tokens = {"before": 0, "after": 0}
+
+    def _budget(self) -> int:
+        remaining = self.conversation_budget - self.tokens_after
+        return max(MIN_OBSERVATION_TOKENS, min(self.observation_budget, remaining))
+
+    def _count(self, before: str, after: str):
+        self.last_tokens = {"before": estimate_tokens(before), "after": estimate_tokens(after)}
+        self.tokens_before += self.last_tokens["before"]
+        self.tokens_after += self.last_tokens["after"]
+
+    def encode(self, tool_name: str, result: dict, label: str = None) -> str:
+        """full OBSERVATION string, for the ReAct conversation"""
+        text = encode_observation(tool_name, result, self._budget(), label)
+        header = f"OBSERVATION: {label or tool_name} result:\n"
+        self._count(header + verbose_result(result), text)
+        return text
+
+    def encode_result(self, tool_name: str, result: dict) -> str:
+        """just the Status/Data block, for the Iter 1 prompt"""
+        text = encode_result(tool_name, result, self._budget())
+        self._count(verbose_result(result), text)
+        return text
+
+    def stats(self) -> dict:
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": saved,
+            "percent_saved": round(100.0 * saved / self.tokens_before, 1) if self.tokens_before else 0.0,
+        }
@@ -1,5 +1,7 @@
 # src/agent/prompts.py
 
+from .observations import ObservationEncoder
+
 SYSTEM_PROMPT = """You are an expert network diagnostic assistant.
 
 Your job is to analyze network diagnostic results and explain them to users
@@ -23,8 +25,13 @@ Rules:
 """
 
 
-def build_user_prompt(symptom, tool_results):
+def build_user_prompt(symptom, tool_results, encoder=None):
     # build the message we send to the llm with the symptom + all tool outputs
+    # results go through the compact encoder - raw output is only included
+    # when the parsed data is incomplete (see src/agent/observations.py)
+    if encoder is None:
+        encoder = ObservationEncoder()
+
     prompt = f"User reported issue: {symptom}\n\n"
     prompt += "Diagnostic Results:\n"
     prompt += "=" * 40 + "\n"
@@ -32,19 +39,9 @@ def build_user_prompt(symptom, tool_results):
     for result in tool_results:
         tool_name = result["tool_name"]
         target = result["target"]
-        success = result["success"]
 
         prompt += f"\n[{tool_name.upper()}] Target: {target}\n"
-
-        if not success:
-            prompt += f"Status: FAILED\n"
-            prompt += f"Error: {result['error']}\n"
-        else:
-            # include both parsed data and raw output so the llm has full context
-            prompt += f"Status: SUCCESS\n"
-            prompt += f"Data: {result['data']}\n"
-            prompt += f"Raw Output:\n{result['raw_output']}\n"
-
+        prompt += encoder.encode_result(tool_name, result) + "\n"
         prompt += "-" * 40 + "\n"
 
     prompt += "\nBased on the above diagnostic results, please analyze the network issue."
@@ -58,18 +55,18 @@ def build_user_prompt(symptom, tool_results):
 
 REACT_SYSTEM_PROMPT = """You are an expert network diagnostic assistant using the ReAct (Reasoning + Acting) framework.
 
-You diagnose network problems by reasoning step-by-step and running diagnostic tools one at a time.
+You diagnose network problems by reasoning step-by-step and running diagnostic tools.
 Stop as soon as you have enough evidence — do not run all three tools by default.
 
 ## Response format
 
 Every response must follow EXACTLY one of these two formats:
 
-### Format 1 — Run a tool:
+### Format 1 — Run tools:
 THOUGHT: <your reasoning about what to check next and why>
-ACTION: <tool_name>
+ACTION: <tool_name> [<host>], <tool_name> [<host>], ...
 
-Where <tool_name> is one of: ping, dns, traceroute
+Where <tool_name> is one of: ping, dns, traceroute. Name one tool, or several separated by commas when you already know you need all of them - they run in parallel and their observations come back together in one message, which saves a whole round. A tool checks the host from the user's problem unless you give another one (e.g. `ping 1.1.1.1` to compare against a known-good host). At most 4 per ACTION line.
 
 ### Format 2 — Provide final diagnosis (when you have enough information):
 THOUGHT: <your reasoning about why you have enough information to diagnose>
@@ -89,32 +86,43 @@ DIAGNOSIS:
 - If ping succeeds and the problem is web/hostname related, check DNS next
 - Use traceroute only if you suspect a routing or hop-level problem
 - If ping fails completely, you likely have enough to diagnose — skip remaining tools
-- Never run the same tool twice
+- If the first message has a layered probe (gateway, resolvers, destination), use it to place the fault: a dead gateway is a local network problem, a working gateway with nothing past it an ISP problem, everything but the destination answering a problem with the destination
+- If the first message has the local network state and it shows no interface up or no default route, nothing off this machine can be reached - diagnose that straight away. A LOCAL line after an observation means this machine's own counters moved while you probed (errors, drops, retransmits) - count it as evidence
+- Never run the same tool on the same host twice
 - The DIAGNOSIS JSON must be valid JSON with exactly the keys shown above
 - Do not include any text outside the specified format
 """
 
 
-def build_react_initial_message(symptom: str) -> str:
-    """Build the first user message that kicks off the ReAct loop."""
-    return (
+def build_react_initial_message(symptom: str, context: str = None) -> str:
+    """
+    Build the first user message that kicks off the ReAct loop.
+
+    context is what is already known before the first step (the local
+    netstate snapshot, the layered probe from src/agent/layers.py), added
+    after the symptom.
+    """
+    message = (
         f"A user has reported the following network problem:\n\n"
         f'"{symptom}"\n\n'
+    )
+    if context:
+        message += f"{context}\n\n"
+    return message + (
         f"Please begin diagnosing this issue step by step. "
         f"Available tools: ping, dns, traceroute."
     )
 
 
-def build_react_observation(tool_name: str, result: dict) -> str:
-    """Format a ToolResult dict as an OBSERVATION string for the LLM."""
-    lines = [f"OBSERVATION: {tool_name} result:"]
-
-    if result["success"]:
-        lines.append("Status: SUCCESS")
-        lines.append(f"Data: {result['data']}")
-        lines.append(f"Raw Output:\n{result['raw_output']}")
-    else:
-        lines.append("Status: FAILED")
-        lines.append(f"Error: {result['error']}")
+def build_react_observation(tool_name: str, result: dict, encoder: ObservationEncoder = None,
+                            label: str = None) -> str:
+    """
+    Format a ToolResult dict as an OBSERVATION string for the LLM.
 
-    return "\n".join(lines)
\ No newline at end of file
+    Pass the diagnosis's ObservationEncoder so every observation shares one
+    conversation token budget and the savings get counted. label replaces
+    the tool name in the header (e.g. "ping 1.1.1.1" for another target).
+    """
+    if encoder is None:
+        encoder = ObservationEncoder()
+    return encoder.encode(tool_name, result, label)
@@ -0,0 +1,349 @@
+# src/agent/resilience.py
+
+"""
+hedged requests + per-provider circuit breakers for LLM calls
+
+llm.py sends every model exchange through an LLMPolicy:
+
+  - the request goes to the model's first healthy route (the model itself,
+    then its fallbacks in order). if nothing has come back after the
+    route's recent p95 latency (HEDGE_PERCENTILE), a second request goes to
+    the next route, and the first valid answer wins. a stream "answers"
+    with its first chunk, the losing stream is closed as soon as it's free
+  - a request that fails outright fails over to the next route straight
+    away, no hedge delay
+  - every provider has a CircuitBreaker over its last BREAKER_WINDOW calls.
+    too many errors or slow calls and it opens: its routes are skipped for
+    BREAKER_COOLDOWN seconds, then one trial call decides whether it closes
+  - nothing waits forever - with no answer (or, for a stream, no first
+    chunk) after LLM_TIMEOUT the call raises TimeoutError
+
+with no fallbacks configured (LLM_FALLBACKS) there is nothing to hedge to
+or route around, and the policy only adds the timeout and the stats.
+
+    LLM_FALLBACKS=llama-3.3-70b-versatile=gpt-4o-mini,gemini-2.5-flash=gpt-4o-mini|claude-haiku-4-5-20251001
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from src import tracing
+
+DEFAULT_TIMEOUT = 60.0
+HEDGE_PERCENTILE = 95
+MIN_HEDGE_DELAY = 0.25      # never hedge sooner than this
+DEFAULT_HEDGE_DELAY = 3.0   # until a route has MIN_LATENCY_SAMPLES
+MIN_LATENCY_SAMPLES = 10
+LATENCY_WINDOW = 100
+
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_FAILURE_RATE = 0.5  # errors + slow calls, as a share of the window
+BREAKER_SLOW_CALL = 20.0    # seconds - a call this slow counts against the provider
+BREAKER_COOLDOWN = 30.0
+
+
+class CircuitBreaker:
+    """
+    closed -> open when the recent failure rate is too high, open -> half
+    open after the cooldown, half open -> closed (or open again) on the
+    result of the one trial call it lets through
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, slow_call=BREAKER_SLOW_CALL,
+                 cooldown=BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)   # True = failed or slow
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_started = None   # half open: when the trial call was let through
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state != "half_open":
+                return False
+            # one trial at a time - another one if it never reported back
+            now = time.monotonic()
+            if self.trial_started is None or now - self.trial_started >= self.cooldown:
+                self.trial_started = now
+                return True
+            return False
+
+    def record(self, ok: bool, seconds: float):
+        bad = not ok or seconds >= self.slow_call
+        with self._lock:
+            if self.state == "half_open":
+                self.trial_started = None
+                if bad:
+                    self._open()
+                else:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                return
+            self.outcomes.append(bad)
+            if (self.state == "closed" and len(self.outcomes) >= self.min_calls
+                    and sum(self.outcomes) / len(self.outcomes) >= self.failure_rate):
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self.outcomes),
+                "recent_failures": sum(self.outcomes),
+                "times_opened": self.times_opened,
+            }
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _spawn(fn, *args) -> Future:
+    """
+    fn(*args) on a daemon thread. a request abandoned at its timeout can't be
+    interrupted - it mustn't also keep the process alive at exit, which a
+    ThreadPoolExecutor's workers would
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-attempt", daemon=True).start()
+    return future
+
+
+def parse_fallbacks(spec: str) -> dict:
+    """"model=alt1|alt2,model2=alt" -> {"model": ["alt1", "alt2"], "model2": ["alt"]}"""
+    fallbacks = {}
+    for part in spec.split(","):
+        model, _, alternates = part.partition("=")
+        if model.strip() and alternates.strip():
+            fallbacks[model.strip()] = [a.strip() for a in alternates.split("|") if a.strip()]
+    return fallbacks
+
+
+class LLMPolicy:
+    """
+    provider_for maps a model name to its provider (the breaker key)
+    fallbacks maps a model name to the models to hedge / fail over to
+    """
+
+    def __init__(self, provider_for, fallbacks: dict = None, timeout: float = DEFAULT_TIMEOUT,
+                 hedge_percentile: float = HEDGE_PERCENTILE, min_hedge_delay: float = MIN_HEDGE_DELAY,
+                 default_hedge_delay: float = DEFAULT_HEDGE_DELAY, breaker_options: dict = None):
+        self.provider_for = provider_for
+        self.fallbacks = fallbacks or {}
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.breaker_options = breaker_options or {}
+        self.breakers = {}
+        self.latencies = {}     # (model, kind) -> deque of seconds to answer / to first chunk
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "timeouts": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, provider_for):
+        return cls(
+            provider_for,
+            fallbacks=parse_fallbacks(os.environ.get("LLM_FALLBACKS", "")),
+            timeout=float(os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT)),
+            hedge_percentile=float(os.environ.get("LLM_HEDGE_PERCENTILE", HEDGE_PERCENTILE)),
+        )
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker(**self.breaker_options)
+            return self.breakers[provider]
+
+    def routes(self, model: str) -> list[str]:
+        """the model and its fallbacks, in order"""
+        return [model] + [m for m in self.fallbacks.get(model, []) if m != model]
+
+    def _next_route(self, queue: list):
+        """
+        pop routes until one whose provider's breaker lets a call through
+        asked only for the route about to start - on a half open breaker
+        allow() takes the one trial slot, and a route that's never started
+        would never give it back
+        """
+        while queue:
+            route = queue.pop(0)
+            if self.breaker(self.provider_for(route)).allow():
+                return route
+        return None
+
+    def hedge_delay(self, model: str, kind: str) -> float:
+        with self._lock:
+            samples = list(self.latencies.get((model, kind), ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, _percentile(samples, self.hedge_percentile))
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _attempt(self, model: str, kind: str, attempt, hedge: bool):
+        provider = self.provider_for(model)
+        start = time.monotonic()
+        with tracing.span("llm_attempt", provider=provider, model=model, hedge=hedge):
+            try:
+                result = attempt(model)
+            except Exception:
+                self.breaker(provider).record(False, time.monotonic() - start)
+                raise
+        seconds = time.monotonic() - start
+        self.breaker(provider).record(True, seconds)
+        with self._lock:
+            self.latencies.setdefault((model, kind), deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        return result
+
+    def _race(self, model: str, kind: str, attempt, valid, discard=None, timeout: float = None):
+        """
+        run attempt(route) on the routes until one returns something valid
+        -> (result, info). discard(result) is called on results that lost
+        timeout can only shorten the policy's own
+        """
+        self._count("calls")
+        queue = self.routes(model)
+        timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+        deadline = time.monotonic() + timeout
+        pending = {}
+        launched = []
+        fallback = None
+        error = None
+
+        def launch(hedge=False) -> bool:
+            route = self._next_route(queue)
+            if route is None:
+                if launched:
+                    return False
+                # everything open - better to try than to fail without asking
+                route = model
+            launched.append(route)
+            future = _spawn(tracing.bind(self._attempt), route, kind, attempt, hedge)
+            pending[future] = (route, hedge)
+            return True
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_delay(launched[0], kind)
+        while pending:
+            wake = min(deadline, hedge_at) if queue else deadline
+            done, _ = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                if time.monotonic() >= deadline:
+                    break
+                # the first request is slower than usual - hedge once
+                hedge_at = math.inf
+                if launch(hedge=True):
+                    self._count("hedges")
+                continue
+            for future in done:
+                route, hedge = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if valid(result):
+                    self._drop(pending, discard)
+                    if hedge:
+                        self._count("hedge_wins")
+                    return result, {"served_by": route, "hedged": hedge, "attempts": len(launched)}
+                if fallback is None:
+                    fallback = (result, route)
+                elif discard:
+                    discard(result)
+            if not pending and queue and launch():
+                self._count("failovers")
+
+        self._drop(pending, discard)
+        if fallback is not None:
+            return fallback[0], {"served_by": fallback[1], "hedged": False, "attempts": len(launched)}
+        if error is not None:
+            raise error
+        self._count("timeouts")
+        raise TimeoutError(f"no answer from {model} (or its fallbacks) within {timeout:.1f}s")
+
+    def _drop(self, pending: dict, discard):
+        # a plain call already in flight can't be interrupted, its answer is
+        # just ignored. a losing stream gets closed once its thread lets go
+        for future in pending:
+            if not future.cancel() and discard:
+                future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+        pending.clear()
+
+    def call(self, model: str, call, timeout: float = None):
+        """call(model) -> reply text. returns (text, info)"""
+        return self._race(model, "call", call, valid=lambda text: bool(text and text.strip()), timeout=timeout)
+
+    def stream(self, model: str, open_stream, timeout: float = None):
+        """
+        open_stream(model) -> iterator of chunks. returns (chunks, info)
+        where chunks carries on from the winning stream's first chunk
+        """
+        def first_chunk(route):
+            chunks = iter(open_stream(route))
+            try:
+                return chunks, next(chunks)
+            except StopIteration:
+                return chunks, ""
+
+        def close(result):
+            close_stream = getattr(result[0], "close", None)
+            if close_stream:
+                close_stream()
+
+        (chunks, first), info = self._race(model, "stream", first_chunk, valid=lambda r: bool(r[1]),
+                                           discard=close, timeout=timeout)
+        return self._rest(chunks, first, info["served_by"]), info
+
+    def _rest(self, chunks, first, model):
+        yield first
+        try:
+            yield from chunks
+        except Exception:
+            # broke after it had started answering
+            self.breaker(self.provider_for(model)).record(False, 0.0)
+            raise
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            breakers = dict(self.breakers)
+        counts["breakers"] = {provider: b.stats() for provider, b in breakers.items()}
+        return counts
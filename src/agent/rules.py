@@ -0,0 +1,240 @@
+# src/agent/rules.py
+
+"""
+deterministic fast path for clear-cut cases
+
+some outages need no reasoning at all - ping and DNS both dead is "no
+network", NXDOMAIN is "that name doesn't exist". these rules look at the
+ping / dns / traceroute result dicts directly and, when one matches with
+high enough confidence, produce the diagnosis without an LLM call: same
+summary / root_cause / label / recommendations shape, milliseconds, no cost.
+
+rules are plain data below. compile_rule turns each one into a list of
+(getter, operator, value) checks once at import, so evaluate() is just a
+few dict lookups per rule. anything that doesn't match falls through to
+the ReAct loop.
+"""
+
+import ipaddress
+import operator
+
+
+# rules under this confidence never short-circuit the LLM
+DEFAULT_MIN_CONFIDENCE = 0.9
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    ">":  operator.gt,
+    "<=": operator.le,
+    "<":  operator.lt,
+    "in": lambda value, options: value in options,
+}
+
+# "when" checks are dotted paths into {"ping": result, "dns": result,
+# "traceroute": result, "target_is_ip": bool, "layers": layered probe (see
+# layers.py, only when it ran), "netstate": {"links_up", "default_route"}
+# (netstate.facts, only when it was read)}. every check has to pass, a path
+# that isn't there fails its check. first match wins, so the most specific
+# rules go first
+RULES = [
+    {
+        "name": "no_link_up",
+        "label": "no_connectivity",
+        "confidence": 0.95,
+        "when": [
+            ("netstate.links_up", "==", 0),
+            ("ping.success", "==", False),
+        ],
+        "summary": "No network interface on this machine is up, so {target} (and everything else) is unreachable.",
+        "root_cause": "Every network link is down - no cable, Wi-Fi not connected, or the adapter is disabled",
+        "recommendations": [
+            "Plug in the Ethernet cable or connect to your Wi-Fi network",
+            "Make sure the network adapter isn't disabled (airplane mode, network settings)",
+            "If it still shows as disconnected, restart the adapter or the machine",
+        ],
+    },
+    {
+        "name": "no_default_route",
+        "label": "no_connectivity",
+        "confidence": 0.95,
+        "when": [
+            ("netstate.default_route", "==", False),
+            ("ping.success", "==", False),
+        ],
+        "summary": "This machine has no default route, so nothing outside its own network (including {target}) can be reached.",
+        "root_cause": "No default gateway configured (not connected, DHCP failed, or the network settings are wrong)",
+        "recommendations": [
+            "Check that Wi-Fi or Ethernet is connected",
+            "Renew the DHCP lease (reconnect, or restart the network adapter) so the router hands out a gateway",
+            "If the address is set by hand, add the router's address as the default gateway",
+        ],
+    },
+    {
+        # the gateway doesn't answer and neither does anything past it
+        "name": "gateway_unreachable",
+        "label": "no_connectivity",
+        "confidence": 0.9,
+        "when": [
+            ("layers.fault_layer", "==", "lan"),
+            ("layers.gateway.status", "==", "unreachable"),
+            ("ping.success", "==", False),
+        ],
+        "summary": "Your router ({gateway}) doesn't answer, and nothing past it does either - the problem is on your local network.",
+        "root_cause": "The local network link to the router is down (cable, Wi-Fi association, or the router itself)",
+        "recommendations": [
+            "Check the cable or Wi-Fi connection to your router",
+            "Restart your router, then try again",
+            "If other devices on the same network are also offline, the router needs attention",
+        ],
+    },
+    {
+        # only for ip targets: with a hostname, ping failing just follows
+        # from dns failing and can't tell us whether the rest of the network is up
+        "name": "no_connectivity",
+        "label": "no_connectivity",
+        "confidence": 0.95,
+        "when": [
+            ("target_is_ip", "==", True),
+            ("ping.success", "==", False),
+            ("dns.success", "==", False),
+            ("dns.data.rcode", "==", None),
+        ],
+        "summary": "Nothing is getting through: {target} doesn't answer pings and none of your DNS servers answered at all.",
+        "root_cause": "No working network connection (offline, disconnected, or the local network is down)",
+        "recommendations": [
+            "Check that Wi-Fi or Ethernet is connected and has an IP address",
+            "Restart your router or modem, then try again",
+            "If other devices are also offline, contact your internet provider",
+        ],
+    },
+    {
+        "name": "dns_nxdomain",
+        "label": "dns_failure",
+        "confidence": 0.95,
+        "when": [
+            ("target_is_ip", "==", False),
+            ("dns.data.rcode", "==", "NXDOMAIN"),
+        ],
+        "summary": "Your DNS server answered, but says {target} does not exist.",
+        "root_cause": "The domain name doesn't exist (typo, expired domain, or a record that was removed)",
+        "recommendations": [
+            "Check the spelling of {target}",
+            "Check that the domain is still registered and has DNS records",
+            "If it works elsewhere, try another DNS server (e.g. 1.1.1.1) in case yours is filtering it",
+        ],
+    },
+    {
+        "name": "dns_servfail",
+        "label": "dns_failure",
+        "confidence": 0.9,
+        "when": [
+            ("target_is_ip", "==", False),
+            ("dns.success", "==", False),
+            ("dns.data.rcode", "in", ("SERVFAIL", "REFUSED")),
+        ],
+        "summary": "Your DNS server is reachable but refused or failed to look up {target} ({dns_rcode}).",
+        "root_cause": "DNS server failure for this name (misconfigured resolver or broken DNS for the domain)",
+        "recommendations": [
+            "Switch to a public DNS server such as 1.1.1.1 or 8.8.8.8 and retry",
+            "If only this domain fails, its DNS is probably broken - contact the site owner",
+            "Restart your router if it is the DNS server handing out these errors",
+        ],
+    },
+    {
+        "name": "dns_down_network_up",
+        "label": "dns_failure",
+        "confidence": 0.9,
+        "when": [
+            ("ping.success", "==", True),
+            ("target_is_ip", "==", True),
+            ("dns.success", "==", False),
+            ("dns.data.rcode", "==", None),
+        ],
+        "summary": "{target} answers pings, but none of your DNS servers responded.",
+        "root_cause": "DNS servers are unreachable while the network itself works",
+        "recommendations": [
+            "Check the DNS servers configured on this machine or your router",
+            "Try a public DNS server such as 1.1.1.1 or 8.8.8.8",
+            "Check whether a firewall or VPN is blocking port 53",
+        ],
+    },
+]
+
+
+def _getter(path: str):
+    keys = path.split(".")
+
+    def get(facts):
+        value = facts
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                raise KeyError(path)
+            value = value[key]
+        return value
+    return get
+
+
+def compile_rule(rule: dict) -> dict:
+    checks = [(_getter(path), OPERATORS[op], expected) for path, op, expected in rule["when"]]
+
+    def matches(facts):
+        try:
+            return all(op(get(facts), expected) for get, op, expected in checks)
+        except (KeyError, TypeError):
+            return False
+
+    return {**rule, "matches": matches}
+
+
+COMPILED_RULES = [compile_rule(rule) for rule in RULES]
+
+
+def _is_ip(target: str) -> bool:
+    try:
+        ipaddress.ip_address(target)
+        return True
+    except ValueError:
+        return False
+
+
+def facts_for(target: str, results: dict, layers: dict = None, local: dict = None) -> dict:
+    """
+    what the rules can look at: tool name -> result dict, target_is_ip, the
+    layered probe and the local netstate facts
+    """
+    facts = {**results, "target_is_ip": _is_ip(target)}
+    if layers is not None:
+        facts["layers"] = layers
+    if local is not None:
+        facts["netstate"] = local
+    return facts
+
+
+def evaluate(target: str, results: dict, min_confidence: float = DEFAULT_MIN_CONFIDENCE, layers: dict = None,
+             local: dict = None):
+    """
+    first rule that matches `results` (tool name -> result dict) with at
+    least `min_confidence`, as {"rule", "confidence", "diagnosis"}, or None
+    """
+    facts = facts_for(target, results, layers, local)
+    for rule in COMPILED_RULES:
+        if rule["confidence"] < min_confidence or not rule["matches"](facts):
+            continue
+        fields = {
+            "target": target,
+            "dns_rcode": (results.get("dns") or {}).get("data", {}).get("rcode"),
+            "gateway": ((layers or {}).get("gateway") or {}).get("address"),
+        }
+        return {
+            "rule": rule["name"],
+            "confidence": rule["confidence"],
+            "diagnosis": {
+                "summary": rule["summary"].format(**fields),
+                "root_cause": rule["root_cause"].format(**fields),
+                "label": rule["label"],
+                "recommendations": [rec.format(**fields) for rec in rule["recommendations"]],
+            },
+        }
+    return None
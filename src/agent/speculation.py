@@ -0,0 +1,154 @@
+# src/agent/speculation.py
+
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import tracing
+
+
+# ping numbers past these make a routing problem plausible, which is when
+# the decision rules send the model to traceroute
+SUSPECT_LOSS_PERCENT = 0.0
+SUSPECT_RTT_MS = 150.0
+
+
+def _is_ip(target: str) -> bool:
+    try:
+        ipaddress.ip_address(target)
+        return True
+    except ValueError:
+        return False
+
+
+def predict_next_tools(target: str, results: dict) -> list[str]:
+    """
+    guess which tools the LLM will ask for next, following the decision
+    rules in REACT_SYSTEM_PROMPT. results maps tool name -> result dict for
+    every tool that has run so far. most likely first
+    """
+    ping = results.get("ping")
+
+    # "Start with ping to check basic IP connectivity"
+    if ping is None:
+        guesses = ["ping"]
+        # a hostname target makes dns the usual second step, start it too
+        if not _is_ip(target) and "dns" not in results:
+            guesses.append("dns")
+        return guesses
+
+    # "If ping fails completely, you likely have enough to diagnose"
+    if not ping["success"]:
+        return []
+
+    guesses = []
+    if "dns" not in results:
+        guesses.append("dns")
+
+    # "Use traceroute only if you suspect a routing or hop-level problem"
+    data = ping.get("data", {})
+    loss = data.get("packet_loss_percent") or 0.0
+    rtt = data.get("avg_rtt_ms") or 0.0
+    if "traceroute" not in results and (loss > SUSPECT_LOSS_PERCENT or rtt > SUSPECT_RTT_MS):
+        guesses.append("traceroute")
+
+    return guesses
+
+
+class Speculator:
+    """
+    runs tools in the background while the LLM call is in flight
+
+    prefetch() starts the predicted tools, take() hands back a prefetched
+    result (waiting for it if it's still running), keep() cancels the ones
+    still running that the model's ACTION didn't name, and shutdown()
+    cancels whatever is left
+
+    hits and misses only count requests made while a prediction was out -
+    a step nothing was predicted for can't miss
+    """
+
+    def __init__(self, tool_classes: dict, target: str):
+        self.tool_classes = tool_classes
+        self.target = target
+        self.pool = ThreadPoolExecutor(max_workers=len(tool_classes))
+        self.jobs = {}          # tool name -> {"tool", "future", "started", "finished"}
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.time_saved = 0.0
+        self.predicted = False  # this step has a prediction out
+        self._lock = threading.Lock()
+
+    def _run(self, job):
+        try:
+            return job["tool"].run(self.target, budget=job["budget"])
+        finally:
+            job["finished"] = time.time()
+
+    def prefetch(self, tool_names: list[str], budget: float = None):
+        """budget: seconds each tool may take, see the tools' run()"""
+        self.predicted = bool(tool_names)
+        for name in tool_names:
+            if name in self.jobs or name not in self.tool_classes:
+                continue
+            job = {"tool": self.tool_classes[name](), "started": time.time(), "finished": None, "budget": budget}
+            # the run's span goes under the step that started it
+            job["future"] = self.pool.submit(tracing.bind(self._run), job)
+            self.jobs[name] = job
+            self.launched += 1
+
+    def take(self, tool_name: str):
+        """
+        returns (result, seconds_saved) if tool_name was prefetched, else None
+        seconds_saved is how long the tool had already been running when the
+        model asked for it
+        """
+        with self._lock:
+            job = self.jobs.pop(tool_name, None)
+            if job is None:
+                if self.predicted:
+                    self.misses += 1
+                return None
+
+        requested = time.time()
+        result = job["future"].result()
+        saved = min(requested, job["finished"]) - job["started"]
+        with self._lock:
+            self.hits += 1
+            self.time_saved += saved
+        return result, saved
+
+    def keep(self, tool_names):
+        """
+        cancel the prefetches still running that aren't in tool_names (what
+        the model just asked for) - a wrong guess shouldn't hold a
+        subprocess and a scheduler slot for the rest of the diagnosis.
+        finished ones stay, a later step may still want them
+        """
+        with self._lock:
+            for name in [n for n, job in self.jobs.items() if n not in tool_names and not job["future"].done()]:
+                self.jobs.pop(name)["tool"].cancel()
+                self.cancelled += 1
+
+    def shutdown(self):
+        """cancel every prefetched tool the model didn't use"""
+        for job in self.jobs.values():
+            if not job["future"].done():
+                job["tool"].cancel()
+                self.cancelled += 1
+        self.jobs.clear()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            # of the requests a prediction was out for, how many it served
+            "hit_rate": round(self.hits / (self.hits + self.misses), 3) if self.hits + self.misses else 0.0,
+            "time_saved_seconds": round(self.time_saved, 3),
+        }
@@ -0,0 +1,230 @@
+# src/cassette.py
+
+"""
+record / replay cassettes for tool runs and LLM exchanges
+
+recording saves every BaseTool.run result and every model reply (plain
+calls and streams) of a live run to a gzipped JSON-lines file, keyed by a
+hash of the normalized request. replaying serves them back from memory -
+no subprocesses, no API calls - optionally sleeping for the time the
+original took, so the agent's own overhead can be profiled without
+network noise.
+
+    with use_cassette("slow-dns.jsonl.gz", mode="record"):
+        diagnose_react("I can't load example.com")
+
+    with use_cassette("slow-dns.jsonl.gz", mode="replay"):
+        diagnose_react("I can't load example.com")     # milliseconds
+
+modes: "record" (always live, save everything), "replay" (never live, a
+request that isn't on the cassette raises CassetteMiss) and "auto" (replay
+what's there, record the rest).
+"""
+
+import copy
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from src.agent import llm
+from src.tools import base
+
+FORMAT_VERSION = 1
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(KeyError):
+    """replay mode was asked for something that was never recorded"""
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def request_key(request: dict) -> str:
+    """stable short hash of a normalized request"""
+    blob = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:20]
+
+
+def tool_request(tool, target: str, args, kwargs) -> dict:
+    return {
+        "kind": "tool",
+        "tool": tool.__class__.__name__,
+        "target": target.strip().lower(),
+        "args": list(args),
+        # callbacks (e.g. traceroute's on_hop) don't change the result, and a
+        # deadline's budget is different on every run
+        "kwargs": {k: v for k, v in sorted(kwargs.items()) if not callable(v) and k != "budget"},
+    }
+
+
+def llm_request(kind: str, messages, model: str, options: dict) -> dict:
+    return {
+        # a stream and a plain call for the same conversation ask the same question
+        "kind": "llm",
+        "model": model,
+        "json_mode": options.get("json_mode", False),
+        "messages": [{"role": m["role"], "content": _normalize_text(m["content"])} for m in messages],
+    }
+
+
+class Cassette:
+    """
+    the entries of one cassette file, indexed by request key
+    the same request can be recorded more than once (e.g. one diagnosis run
+    twice), replays hand them out in recorded order and then repeat the last
+    """
+
+    def __init__(self, path: str, mode: str = "replay", simulate_latency: bool = False,
+                 latency_scale: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries = defaultdict(deque)   # key -> entries not replayed yet
+        self._last = {}                      # key -> last entry replayed
+        self._new = []                       # recorded this session, written on save()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if mode != "record":
+            self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rt") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "key" in entry:
+                        self._entries[entry["key"]].append(entry)
+        except FileNotFoundError:
+            if self.mode == "replay":
+                raise
+
+    def save(self):
+        """write what was recorded - appends to the file in auto mode"""
+        if not self._new:
+            return
+        file_mode = "wt" if self.mode == "record" else "at"
+        with gzip.open(self.path, file_mode) as f:
+            if file_mode == "wt":
+                f.write(json.dumps({"cassette": FORMAT_VERSION, "created": time.time()}) + "\n")
+            for entry in self._new:
+                f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._new = []
+
+    def _find(self, key: str):
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            entry = self._last.get(key)
+            if entry is not None:
+                self.hits += 1
+            return entry
+
+    def _record(self, key: str, request: dict, response, seconds: float):
+        entry = {"key": key, "kind": request["kind"], "request": request,
+                 "response": response, "seconds": round(seconds, 4)}
+        with self._lock:
+            self._new.append(entry)
+            self.recorded += 1
+
+    def _miss(self, key: str, request: dict):
+        with self._lock:
+            self.misses += 1
+        if self.mode == "replay":
+            what = request.get("tool") or request.get("model")
+            raise CassetteMiss(f"no recorded {request['kind']} request {key} ({what}) in {self.path}")
+
+    def _wait(self, seconds: float, cancelled: threading.Event = None):
+        if not self.simulate_latency:
+            return
+        delay = seconds * self.latency_scale
+        if cancelled is not None:
+            cancelled.wait(delay)
+        else:
+            time.sleep(delay)
+
+    # BaseTool middleware
+    def tool_middleware(self, tool, target, args, kwargs, call):
+        request = tool_request(tool, target, args, kwargs)
+        key = request_key(request)
+        if self.mode != "record":
+            entry = self._find(key)
+            if entry is not None:
+                self._wait(entry["seconds"], tool._cancelled)
+                return copy.deepcopy(entry["response"])
+            self._miss(key, request)
+
+        start = time.perf_counter()
+        result = call()
+        self._record(key, request, result, time.perf_counter() - start)
+        return result
+
+    # llm hook
+    def llm_hook(self, kind, messages, model, options, call):
+        request = llm_request(kind, messages, model, options)
+        key = request_key(request)
+        if self.mode != "record":
+            entry = self._find(key)
+            if entry is not None:
+                if kind == "stream":
+                    return self._replay_stream(entry)
+                self._wait(entry["seconds"])
+                return entry["response"]["text"]
+            self._miss(key, request)
+
+        if kind == "call":
+            start = time.perf_counter()
+            text = call()
+            self._record(key, request, {"text": text}, time.perf_counter() - start)
+            return text
+        return self._record_stream(key, request, call)
+
+    def _record_stream(self, key, request, call):
+        # record whatever was read before the caller closed the stream - a
+        # replay gets closed at the same point
+        start = time.perf_counter()
+        chunks = []
+        try:
+            for chunk in call():
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            self._record(key, request, {"text": "".join(chunks), "chunks": chunks},
+                         time.perf_counter() - start)
+
+    def _replay_stream(self, entry):
+        chunks = entry["response"].get("chunks") or [entry["response"]["text"]]
+        per_chunk = entry["seconds"] / len(chunks)
+        for chunk in chunks:
+            self._wait(per_chunk)
+            yield chunk
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", simulate_latency: bool = False,
+                 latency_scale: float = 1.0):
+    """install a cassette around every tool run and LLM call in the process"""
+    cassette = Cassette(path, mode, simulate_latency, latency_scale)
+    base.add_run_middleware(cassette.tool_middleware)
+    llm.set_llm_hook(cassette.llm_hook)
+    try:
+        yield cassette
+    finally:
+        llm.set_llm_hook(None)
+        base.remove_run_middleware(cassette.tool_middleware)
+        cassette.save()
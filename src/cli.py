@@ -1,15 +1,17 @@
 # src/cli.py
 
+import contextlib
+import json
 import sys
 import os
-from dotenv import load_dotenv
+import time
 
-load_dotenv()
+_STARTED = time.perf_counter()
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.agent.core import diagnose, diagnose_react
-from src.agent.llm import DEFAULT_MODEL, MODEL_OPTIONS
+# nothing heavy up here - with a daemon running (src/daemon.py) this process
+# only forwards the request, and the agent, dotenv and the SDKs never load
 
 
 def format_diagnosis(result):
@@ -26,14 +28,24 @@ def format_diagnosis(result):
             action = step["action"]
             if action == "DIAGNOSE":
                 lines.append("  Action:  provide final diagnosis")
+            elif action == "RULE":
+                lines.append(f"  Action:  matched rule {step['rule']} (no LLM call)")
             else:
                 lines.append(f"  Action:  run {action}")
+            cache = step.get("prompt_cache")
+            if cache:
+                lines.append(f"  Prompt:  {cache['input_tokens']} input tokens, "
+                             f"{cache['cached_tokens']} from the provider's cache")
         tools_used = result.get("tools_used", [])
         steps = result.get("steps_taken", 0)
         lines.append(
             f"\n({steps} step(s) taken, "
             f"{len(tools_used)} tool(s) used: {', '.join(tools_used) or 'none'})"
         )
+        deadline = result.get("deadline")
+        if deadline:
+            forced = ", out of time - diagnosed from the evidence so far" if deadline["forced"] else ""
+            lines.append(f"(deadline {deadline['seconds']}s, used {deadline['used_seconds']}s{forced})")
         lines.append("")
 
     lines += [
@@ -50,41 +62,411 @@ def format_diagnosis(result):
     return "\n".join(lines)
 
 
+def format_timings(stats):
+    # per-model LLM call timings from src/agent/clients.py
+    lines = ["", "## LLM Call Timings"]
+    for model, s in stats.items():
+        cold = f"{s['cold_call_ms']} ms" if s["cold_call_ms"] is not None else "n/a"
+        warm = f"{s['avg_warm_call_ms']} ms" if s["avg_warm_call_ms"] is not None else "n/a"
+        lines.append(
+            f"{model}: {s['calls']} call(s), cold {cold}, "
+            f"warm avg {warm} over {s['warm_calls']}, client setup {s['setup_ms']} ms"
+        )
+        if s.get("input_tokens"):
+            share = round(100 * s["cached_tokens"] / s["input_tokens"])
+            lines.append(f"  input {s['input_tokens']} tokens, {s['cached_tokens']} cached ({share}%)")
+    return "\n".join(lines)
+
+
+def format_probes(stats):
+    # how the probe scheduler (src/tools/scheduler.py) served the tool runs
+    sub = stats["subprocesses"]
+    wait = f", queue wait p50 {sub['wait_p50_ms']} ms / p95 {sub['wait_p95_ms']} ms" if sub["admitted"] else ""
+    return (f"probes: {stats['requests']} asked, {stats['runs']} run, {stats['coalesced']} coalesced, "
+            f"{stats['cached']} cached ({round(100 * stats['coalesce_rate'])}% shared), "
+            f"{sub['admitted']} subprocess(es){wait}")
+
+
+def _flag(args, name, default=None):
+    # value that follows a --flag, or default if the flag isn't there
+    if name not in args:
+        return default
+    idx = args.index(name)
+    if idx + 1 < len(args):
+        return args[idx + 1]
+    print(f"Error: {name} needs a value after it")
+    sys.exit(1)
+
+
+def _deadline(args):
+    """--deadline S: seconds each diagnosis may take, None if not given"""
+    value = _flag(args, "--deadline")
+    return float(value) if value else None
+
+
+def _cassette(args):
+    """
+    --record PATH / --replay PATH [--replay-latency] wrap the whole command in
+    a cassette (src/cassette.py), otherwise a no-op context
+    """
+    record, replay = _flag(args, "--record"), _flag(args, "--replay")
+    if not record and not replay:
+        return contextlib.nullcontext()
+    from src.cassette import use_cassette
+    if record:
+        return use_cassette(record, mode="record")
+    return use_cassette(replay, mode="replay", simulate_latency="--replay-latency" in args)
+
+
+def run_batch_command(args, model):
+    """
+    batch <file|-> - one symptom per line (or JSON {"symptom", "target", "model"})
+    prints one JSON result per line as each diagnosis finishes, then a
+    throughput summary on stderr
+    """
+    from src.agent.batch import DEFAULT_WORKERS, load_jobs, run_batch
+
+    source = args[1]
+    if source == "-":
+        jobs = load_jobs(sys.stdin, default_model=model)
+    else:
+        with open(source) as f:
+            jobs = load_jobs(f, default_model=model)
+
+    workers = int(_flag(args, "--workers", DEFAULT_WORKERS))
+    max_llm = _flag(args, "--max-llm")
+    max_tools = _flag(args, "--max-tools")
+
+    def emit(record):
+        print(json.dumps(record, default=str), flush=True)
+
+    summary = run_batch(
+        jobs,
+        workers=workers,
+        max_llm_calls=int(max_llm) if max_llm else None,
+        max_tool_calls=int(max_tools) if max_tools else None,
+        on_result=emit,
+        deadline=_deadline(args),
+    )
+    print(json.dumps({"summary": summary}), file=sys.stderr)
+
+
+def run_sweep_command(args, model):
+    """
+    sweep <targets...|file|-> - hosts, ips or CIDR ranges, inline or one per line in a file
+    prints one JSON record per target as its probes finish, then a summary on
+    stderr. with --diagnose the unhealthy targets go on to diagnose_react
+    """
+    from src.agent.batch import jobs_from_sweep, run_batch
+    from src.tools import sweep
+
+    specs = []
+    for arg in args[1:]:
+        if arg.startswith("--"):
+            break
+        specs.append(arg)
+    lines = []
+    for spec in specs:
+        if spec == "-":
+            lines += sys.stdin.readlines()
+        elif os.path.isfile(spec):
+            with open(spec) as f:
+                lines += f.readlines()
+        else:
+            lines.append(spec)
+    targets = sweep.load_targets(lines)
+
+    def emit(record):
+        print(json.dumps(record), flush=True)
+
+    try:
+        records, summary = sweep.run_sweep(
+            targets,
+            on_result=emit,
+            count=int(_flag(args, "--count", sweep.DEFAULT_COUNT)),
+            rate=float(_flag(args, "--rate", sweep.DEFAULT_RATE)),
+            timeout=float(_flag(args, "--timeout", sweep.DEFAULT_TIMEOUT)),
+            max_loss_percent=float(_flag(args, "--max-loss", sweep.DEFAULT_MAX_LOSS_PERCENT)),
+            max_rtt_ms=float(_flag(args, "--max-rtt", sweep.DEFAULT_MAX_RTT_MS)),
+        )
+    except OSError as e:
+        print(f"Error: can't open an ICMP socket ({e}) - sweeps need ping_group_range or root")
+        sys.exit(1)
+    print(json.dumps({"summary": summary}), file=sys.stderr)
+
+    if "--diagnose" in args:
+        jobs = jobs_from_sweep(records, default_model=model)
+        limit = _flag(args, "--max-diagnoses")
+        if limit:
+            jobs = jobs[:int(limit)]
+        batch_summary = run_batch(jobs, workers=int(_flag(args, "--workers", 4)), on_result=emit,
+                                  deadline=_deadline(args))
+        print(json.dumps({"diagnosis_summary": batch_summary}), file=sys.stderr)
+
+
+def run_monitor_command(args, model):
+    """
+    monitor <targets...> - poll forever (or --cycles N), print one JSON event
+    per line: triggers and diagnoses always, per-cycle samples with --samples
+    """
+    from src.agent import monitor
+
+    targets = []
+    for arg in args[1:]:
+        if arg.startswith("--"):
+            break
+        targets.append(arg)
+
+    def emit(event):
+        if event["type"] != "sample" or "--samples" in args:
+            print(json.dumps(event, default=str), flush=True)
+
+    cycles = _flag(args, "--cycles")
+    mon = monitor.Monitor(
+        targets,
+        interval=float(_flag(args, "--interval", monitor.DEFAULT_INTERVAL)),
+        window=int(_flag(args, "--window", monitor.DEFAULT_WINDOW)),
+        sigma=float(_flag(args, "--sigma", monitor.DEFAULT_SIGMA)),
+        cooldown=float(_flag(args, "--cooldown", monitor.DEFAULT_COOLDOWN)),
+        traceroute_every=int(_flag(args, "--traceroute-every", monitor.DEFAULT_TRACEROUTE_EVERY)),
+        model=model,
+        on_event=emit,
+    )
+    try:
+        mon.run(cycles=int(cycles) if cycles else None)
+    except KeyboardInterrupt:
+        mon.stop()
+    print(json.dumps({"llm_calls_saved": mon.llm_calls_saved}), file=sys.stderr)
+
+
+def write_trace(trace_id, path, trace_format="json"):
+    """save a diagnosis's spans - plain json, or otlp for OpenTelemetry tools"""
+    from src import tracing
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        print(f"No trace recorded for {trace_id}", file=sys.stderr)
+        return
+    export = tracing.trace_to_otlp(trace) if trace_format == "otlp" else tracing.trace_to_json(trace)
+    save_trace(export, path, len(trace.spans))
+
+
+def save_trace(export, path, spans):
+    with open(path, "w") as f:
+        json.dump(export, f, indent=2, default=str)
+    print(f"\ntrace written to {path} ({spans} spans)")
+
+
+def format_startup(daemon=None, client_ms=None, in_process_ms=None):
+    """what starting up cost this run - or, through the daemon, what it saved"""
+    lines = ["", "## Startup"]
+    if daemon:
+        startup = daemon["startup"]
+        saved = round(startup["imports_ms"] + startup["warm_up_ms"], 1)
+        lines.append(
+            f"daemon pid {daemon['pid']} (up {daemon['uptime_seconds']}s, request #{daemon['requests']}): "
+            f"skipped {saved} ms of startup - imports {startup['imports_ms']} ms, "
+            f"client warm-up {startup['warm_up_ms']} ms"
+        )
+        lines.append(f"this client started in {client_ms} ms")
+    else:
+        lines.append(f"in process: imports {in_process_ms} ms "
+                     "(start `python src/cli.py daemon` to keep them loaded)")
+    lines.append(f"total wall time {round((time.perf_counter() - _STARTED) * 1000, 1)} ms")
+    return "\n".join(lines)
+
+
+def forward_diagnose(args):
+    """
+    hand the diagnosis to a running daemon and print its output as it comes
+    False when there's no daemon - the caller runs it in process instead
+    """
+    from src import daemon
+
+    trace_file = _flag(args, "--trace")
+    payload = {
+        "command": "diagnose",
+        "symptom": args[1],
+        "model": _flag(args, "--model"),
+        "stream": "--no-stream" not in args,
+        "fast_path": "--no-rules" not in args,
+        "layered": "--no-layers" not in args,
+        "local_state": "--no-netstate" not in args,
+        "deadline": _deadline(args),
+        "timings": "--timings" in args,
+        "trace_format": _flag(args, "--trace-format", "json") if trace_file else None,
+    }
+
+    def show(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    client_ms = round((time.perf_counter() - _STARTED) * 1000, 1)
+    try:
+        reply = daemon.request(payload, on_output=show)
+    except daemon.DaemonError as e:
+        print(f"Error: daemon: {e}")
+        sys.exit(1)
+    if reply is None:
+        return False
+
+    print(format_diagnosis(reply["result"]))
+    if "--timings" in args:
+        print(format_timings(reply["timings"]))
+        print(format_probes(reply["probes"]))
+        print(format_startup(daemon=reply["daemon"], client_ms=client_ms))
+    if trace_file:
+        if "trace" in reply:
+            save_trace(reply["trace"], trace_file, reply["trace_spans"])
+        else:
+            print(f"No trace recorded for {reply['result'].get('trace_id')}", file=sys.stderr)
+    return True
+
+
+def run_daemon_command(args):
+    """
+    daemon [--socket PATH] [--warm model1,model2] - serve until stopped
+    daemon status | daemon stop - ask the one that's running
+    """
+    import signal
+    from src import daemon
+
+    path = _flag(args, "--socket")
+    action = args[1] if len(args) > 1 and not args[1].startswith("--") else "serve"
+    if action in ("status", "stop"):
+        try:
+            reply = daemon.request({"command": action}, socket_path=path)
+        except daemon.DaemonError as e:
+            print(f"Error: daemon: {e}")
+            sys.exit(1)
+        if reply is None:
+            print(f"No daemon listening on {path or daemon.SOCKET_PATH}")
+            sys.exit(1)
+        print(json.dumps(reply, indent=2))
+        return
+    if action != "serve":
+        print(f"Unknown daemon command: {action} (status, stop)")
+        sys.exit(1)
+
+    # kill / systemctl stop - leave through serve()'s cleanup, not around it
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    warm = _flag(args, "--warm")
+    try:
+        daemon.serve(path, warm_models=warm.split(",") if warm else None)
+    except daemon.DaemonError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
 def main():
     """
     usage:
         python src/cli.py diagnose "I can't load any websites"
         python src/cli.py diagnose "I can't load any websites" --model gpt-4o
+        python src/cli.py diagnose "I can't load any websites" --timings
+        python src/cli.py diagnose "I can't load any websites" --no-stream
+        python src/cli.py diagnose "I can't load any websites" --no-rules
+        python src/cli.py diagnose "I can't load any websites" --no-layers --no-netstate
+        python src/cli.py diagnose "I can't load any websites" --deadline 20
+        python src/cli.py diagnose "I can't load any websites" --record slow.jsonl.gz
+        python src/cli.py diagnose "I can't load any websites" --replay slow.jsonl.gz --replay-latency
+        python src/cli.py diagnose "I can't load any websites" --trace trace.json [--trace-format otlp]
+        python src/cli.py batch tickets.jsonl --workers 8 --max-llm 4 --max-tools 16
+        cat symptoms.txt | python src/cli.py batch -
+        python src/cli.py sweep 10.0.0.0/22 hosts.txt --rate 2000 --diagnose --max-diagnoses 10
+        python src/cli.py monitor google.com 1.1.1.1 --interval 30 --cooldown 900
+        python src/cli.py daemon &           # later diagnose runs are forwarded to it
+        python src/cli.py daemon stop
     """
     args = sys.argv[1:]
 
+    if args[:1] == ["daemon"]:
+        run_daemon_command(args)
+        return
+
+    # a running daemon has all of this loaded already. cassettes hook the
+    # whole process, so those runs stay here
+    if (args[:1] == ["diagnose"] and len(args) >= 2 and "--no-daemon" not in args
+            and not _flag(args, "--record") and not _flag(args, "--replay")):
+        if forward_diagnose(args):
+            return
+
+    load_start = time.perf_counter()
+    from dotenv import load_dotenv
+    load_dotenv()
+    from src.agent.core import diagnose_react
+    from src.agent.clients import call_stats
+    from src.agent.llm import DEFAULT_MODEL, MODEL_OPTIONS
+    load_ms = round((time.perf_counter() - load_start) * 1000, 1)
+
     if len(args) < 2:
-        print("Usage: python src/cli.py diagnose \"<symptom>\" [--model <model>]")
+        print("Usage: python src/cli.py diagnose \"<symptom>\" [--model <model>] [--timings] [--no-stream] [--no-rules]")
+        print("                                         [--record <cassette> | --replay <cassette> [--replay-latency]]")
+        print("                                         [--trace <file> [--trace-format json|otlp]] [--deadline S]")
+        print("                                         [--no-layers] [--no-netstate] [--no-daemon]")
+        print("       python src/cli.py batch <file|-> [--model <model>] [--workers N] [--max-llm N] [--max-tools N]")
+        print("                               [--deadline S]")
+        print("       python src/cli.py sweep <targets|cidr|file|-> [--count N] [--rate PPS] [--timeout S]")
+        print("                               [--max-loss PCT] [--max-rtt MS] [--diagnose] [--max-diagnoses N]")
+        print("                               [--deadline S]")
+        print("       python src/cli.py monitor <targets...> [--interval S] [--window N] [--sigma K]")
+        print("                               [--cooldown S] [--traceroute-every N] [--cycles N] [--samples]")
+        print("       python src/cli.py daemon [status|stop] [--socket <path>] [--warm <model,...>]")
         print("\nAvailable models:")
         for model_id, label in MODEL_OPTIONS.items():
             print(f"  {model_id:35s} {label}")
         sys.exit(1)
 
     command = args[0]
-    symptom = args[1]
 
-    if command != "diagnose":
+    if command not in ("diagnose", "batch", "sweep", "monitor"):
         print(f"Unknown command: {command}")
-        print("Available commands: diagnose")
+        print("Available commands: diagnose, batch, sweep, monitor, daemon")
         sys.exit(1)
 
     # check if --model flag was passed
-    model = DEFAULT_MODEL
-    if "--model" in args:
-        idx = args.index("--model")
-        if idx + 1 < len(args):
-            model = args[idx + 1]
-        else:
-            print("Error: --model needs a model name after it")
-            sys.exit(1)
+    model = _flag(args, "--model", DEFAULT_MODEL)
+
+    if command == "batch":
+        with _cassette(args) as cassette:
+            run_batch_command(args, model)
+        if cassette:
+            print(json.dumps({"cassette": cassette.stats()}), file=sys.stderr)
+        return
+
+    if command == "sweep":
+        run_sweep_command(args, model)
+        return
 
-    result = diagnose_react(symptom, model=model)
+    if command == "monitor":
+        run_monitor_command(args, model)
+        return
+
+    symptom = args[1]
+    with _cassette(args) as cassette:
+        result = diagnose_react(
+            symptom,
+            model=model,
+            stream="--no-stream" not in args,
+            fast_path="--no-rules" not in args,
+            layered="--no-layers" not in args,
+            local_state="--no-netstate" not in args,
+            deadline=_deadline(args),
+        )
     print(format_diagnosis(result))
+    if cassette:
+        print(f"\n(cassette {cassette.mode}: {cassette.hits} replayed, {cassette.recorded} recorded)")
+
+    if "--timings" in args:
+        from src.tools.scheduler import SCHEDULER
+        print(format_timings(call_stats()))
+        print(format_probes(SCHEDULER.stats()))
+        print(format_startup(in_process_ms=load_ms))
+
+    trace_file = _flag(args, "--trace")
+    if trace_file:
+        write_trace(result.get("trace_id"), trace_file, _flag(args, "--trace-format", "json"))
 
 
 if __name__ == "__main__":
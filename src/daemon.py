@@ -0,0 +1,292 @@
+# src/daemon.py
+
+"""
+resident diagnose daemon behind a unix socket
+
+every `python src/cli.py diagnose ...` used to pay for the whole startup:
+dotenv, the agent and tool modules, the provider SDK import and a fresh
+client with a cold connection pool. the daemon pays that once and keeps
+it - imported modules, warm clients (src/agent/clients.py), breaker and
+latency state (src/agent/resilience.py), recent traces - for every
+request after.
+
+    python src/cli.py daemon &                 # serve on SOCKET_PATH
+    python src/cli.py diagnose "..."           # forwarded to the daemon
+    python src/cli.py daemon stop
+
+protocol: one JSON request line per connection, answered by JSON lines -
+{"type": "output", "text"} for everything the diagnosis prints, as it
+prints it, then one {"type": "result"} (or {"type": "error"}). the client
+side is stdlib only, so the CLI stays thin when a daemon is up; request()
+returns None when there isn't one and the CLI runs the diagnosis itself.
+"""
+
+import contextvars
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+PROTOCOL = 1
+
+
+def _runtime_dir() -> str:
+    """$XDG_RUNTIME_DIR when there is one, else a directory of our own under /tmp"""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return runtime
+    return f"/tmp/netdiag-{os.getuid()}"
+
+
+SOCKET_PATH = os.environ.get("NETDIAG_SOCKET") or os.path.join(_runtime_dir(), "netdiag.sock")
+
+# where print() goes in the thread (and the pool work it binds) handling a request
+_output = contextvars.ContextVar("daemon_output", default=None)
+
+
+class DaemonError(Exception):
+    """the daemon took the request but failed it, or went away halfway"""
+
+
+def _check_owner(path: str, allow_root: bool = False):
+    """DaemonError unless path is ours - anyone can put a file where we look for the socket"""
+    owner = os.lstat(path).st_uid
+    if owner != os.getuid() and not (allow_root and owner == 0):
+        raise DaemonError(f"{path} belongs to uid {owner}, not to you - "
+                          f"remove it, or point NETDIAG_SOCKET elsewhere")
+
+
+# -- client -----------------------------------------------------------------
+
+def request(payload: dict, socket_path: str = None, on_output=None):
+    """
+    send one request, calling on_output(text) for whatever it prints
+    returns the final message, or None when no daemon is listening
+    """
+    path = socket_path or SOCKET_PATH
+    if not hasattr(socket, "AF_UNIX") or not os.path.lexists(path):
+        return None
+    # someone else's socket would get our symptom, and its answers get printed
+    _check_owner(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # no socket file, or a stale one left by a daemon that died
+        sock.close()
+        return None
+
+    with sock, sock.makefile("rwb") as f:
+        f.write(json.dumps({"protocol": PROTOCOL, **payload}).encode() + b"\n")
+        f.flush()
+        for line in f:
+            message = json.loads(line)
+            if message["type"] == "output":
+                if on_output:
+                    on_output(message["text"])
+            elif message["type"] == "error":
+                raise DaemonError(message["error"])
+            else:
+                return message
+    raise DaemonError("the daemon closed the connection before answering")
+
+
+# -- server -----------------------------------------------------------------
+
+class _Stdout:
+    """sys.stdout stand-in that sends writes to the current request's client"""
+
+    def __init__(self, real):
+        self.real = real
+
+    def write(self, text):
+        send = _output.get()
+        if send is None:
+            return self.real.write(text)
+        if text:
+            send({"type": "output", "text": text})
+        return len(text)
+
+    def flush(self):
+        if _output.get() is None:
+            self.real.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.real, name)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+        gone = False
+
+        def send(message):
+            # a client that hung up (ctrl-c) doesn't stop the diagnosis, its
+            # output just has nowhere to go
+            nonlocal gone
+            if gone:
+                return
+            data = json.dumps(message, default=str).encode() + b"\n"
+            with lock:
+                try:
+                    self.wfile.write(data)
+                except OSError:
+                    gone = True
+
+        try:
+            req = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            send({"type": "error", "error": "request is not valid JSON"})
+            return
+        if req.get("protocol") != PROTOCOL:
+            send({"type": "error", "error": f"protocol {req.get('protocol')} not supported, "
+                                            f"this daemon speaks {PROTOCOL} - restart it"})
+            return
+
+        with self.server.lock:
+            self.server.requests += 1
+        token = _output.set(send)
+        try:
+            reply = self.server.dispatch(req)
+        except Exception as e:
+            reply = {"type": "error", "error": f"{e.__class__.__name__}: {e}"}
+        finally:
+            _output.reset(token)
+        send(reply)
+        if reply.get("type") == "stopped":
+            # only once the reply is out - serve() exits as soon as this returns
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, startup: dict):
+        self.path = path
+        self.startup = startup
+        self.started = time.time()
+        self.requests = 0
+        self.lock = threading.Lock()    # handlers run on their own threads
+        old_umask = os.umask(0o177)     # the socket runs tools as us - owner only
+        try:
+            super().__init__(path, _Handler)
+        finally:
+            os.umask(old_umask)
+
+    def status(self) -> dict:
+        from src.tools.scheduler import SCHEDULER
+        return {
+            "type": "status",
+            "pid": os.getpid(),
+            "socket": self.path,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "startup": self.startup,
+            # shared by every request - the daemon is where coalescing pays off
+            "probes": SCHEDULER.stats(),
+        }
+
+    def dispatch(self, req: dict) -> dict:
+        command = req.get("command")
+        if command == "diagnose":
+            return _diagnose(req, self.status())
+        if command == "status":
+            return self.status()
+        if command == "stop":
+            return {"type": "stopped", "pid": os.getpid()}
+        raise ValueError(f"unknown command {command!r}")
+
+
+def _diagnose(req: dict, status: dict) -> dict:
+    from src import tracing
+    from src.agent.clients import call_stats
+    from src.agent.core import diagnose_react
+    from src.agent.llm import DEFAULT_MODEL
+    from src.tools.scheduler import SCHEDULER
+
+    result = diagnose_react(
+        req["symptom"],
+        model=req.get("model") or DEFAULT_MODEL,
+        stream=req.get("stream", True),
+        fast_path=req.get("fast_path", True),
+        layered=req.get("layered", True),
+        local_state=req.get("local_state", True),
+        deadline=req.get("deadline"),
+    )
+    reply = {"type": "result", "result": result, "daemon": status}
+    if req.get("timings"):
+        reply["timings"] = call_stats()
+        reply["probes"] = SCHEDULER.stats()
+    trace_format = req.get("trace_format")
+    trace = tracing.get_trace(result.get("trace_id")) if trace_format else None
+    if trace is not None:
+        reply["trace"] = tracing.trace_to_otlp(trace) if trace_format == "otlp" else tracing.trace_to_json(trace)
+        reply["trace_spans"] = len(trace.spans)
+    return reply
+
+
+def _in_use(path: str) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def serve(socket_path: str = None, warm_models: list = None):
+    """
+    load everything a diagnosis needs, then answer requests until stopped
+    the time that takes is what each forwarded request no longer pays
+    """
+    path = socket_path or SOCKET_PATH
+    directory = os.path.dirname(path) or "."
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    except OSError as e:
+        raise DaemonError(f"can't create {directory}: {e}") from None
+    # /tmp itself is root's. anything else on the way must be ours, or whoever
+    # owns it can swap the socket out from under us
+    _check_owner(directory, allow_root=True)
+    if os.path.lexists(path):
+        _check_owner(path)
+        if _in_use(path):
+            raise DaemonError(f"a daemon is already listening on {path}")
+        try:
+            os.unlink(path)
+        except OSError as e:
+            raise DaemonError(f"can't remove the stale socket {path}: {e}") from None
+
+    start = time.perf_counter()
+    from dotenv import load_dotenv
+    load_dotenv()
+    import src.agent.core  # noqa: F401 - the agent, the tools and their imports
+    from src.agent.clients import warm_up
+    from src.agent.llm import DEFAULT_MODEL, provider_for
+    imported = time.perf_counter()
+    for model in warm_models or [DEFAULT_MODEL]:
+        warm_up(provider_for(model), model)
+    warmed = time.perf_counter()
+    startup = {
+        "imports_ms": round((imported - start) * 1000, 1),
+        "warm_up_ms": round((warmed - imported) * 1000, 1),
+    }
+
+    sys.stdout = _Stdout(sys.stdout)
+    server = DaemonServer(path, startup)
+    print(f"netdiag daemon pid {os.getpid()} listening on {path} "
+          f"(imports {startup['imports_ms']} ms, client warm-up {startup['warm_up_ms']} ms)", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        sys.stdout = sys.stdout.real
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
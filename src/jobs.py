@@ -0,0 +1,140 @@
+# src/jobs.py
+
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.agent.core import diagnose_react
+
+
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+DEFAULT_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", "16"))
+# seconds a diagnosis may take before it answers with what it has, 0 = no limit
+DEFAULT_DEADLINE = float(os.environ.get("JOB_DEADLINE", "60"))
+KEEP_FINISHED = 200          # finished jobs kept around for late readers
+HEARTBEAT_SECONDS = 15.0
+
+
+class QueueFull(Exception):
+    """every worker is busy and the waiting queue is at its limit"""
+
+
+class Job:
+    """
+    one diagnosis and everything it has reported so far
+    events are appended by the worker thread and read by any number of
+    event streams, each keeping its own position
+    """
+
+    def __init__(self, symptom: str, model: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.symptom = symptom
+        self.model = model
+        self.status = "queued"
+        self.result = None
+        self.error = ""
+        self.created = time.time()
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def add_event(self, event: dict, status: str = None):
+        # status changes go in under the same lock so a reader never sees
+        # "done" without the event that goes with it
+        with self._cond:
+            if status:
+                self.status = status
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def wait_for_events(self, seen: int, timeout: float) -> list[dict]:
+        """events after the first `seen`, waiting up to `timeout` for new ones"""
+        with self._cond:
+            if len(self.events) <= seen and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[seen:]
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "symptom": self.symptom,
+            "model": self.model,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    runs diagnoses on a fixed pool of worker threads so web requests return
+    right away. at most workers + queue_depth jobs can be waiting or running
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 deadline: float = DEFAULT_DEADLINE):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.deadline = deadline or None
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnosis")
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def active(self) -> int:
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def submit(self, symptom: str, model: str) -> Job:
+        with self._lock:
+            if self.active() >= self.workers + self.queue_depth:
+                raise QueueFull(f"{self.active()} diagnoses already queued or running")
+            job = Job(symptom, model)
+            self.jobs[job.id] = job
+            self._forget_old()
+        job.add_event({"type": "queued", "job_id": job.id})
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in itertools.islice(finished, max(0, len(finished) - KEEP_FINISHED)):
+            del self.jobs[job_id]
+
+    def _run(self, job: Job):
+        job.add_event({"type": "started"}, status="running")
+        try:
+            job.result = diagnose_react(job.symptom, model=job.model, on_event=job.add_event, verbose=False,
+                                        deadline=self.deadline)
+            job.add_event({"type": "done"}, status="done")
+        except Exception as e:
+            job.error = f"Diagnosis failed: {e}"
+            job.add_event({"type": "error", "message": job.error}, status="failed")
+
+    def stream(self, job: Job):
+        """
+        yields every event of the job, past and future, until it finishes
+        yields None every HEARTBEAT_SECONDS with nothing new, so the caller
+        can keep the connection alive
+        """
+        seen = 0
+        while True:
+            new = job.wait_for_events(seen, HEARTBEAT_SECONDS)
+            if not new:
+                if job.finished:
+                    return
+                yield None
+                continue
+            seen += len(new)
+            for event in new:
+                yield event
+            if job.finished and seen >= len(job.events):
+                return
@@ -0,0 +1,39 @@
+# src/tools/aio.py
+
+"""
+blocking entry points into the asyncio tools
+
+asyncio.run() refuses to start inside a thread that's already running an
+event loop - a tool called from async code (a web handler, a job runner)
+would raise RuntimeError instead of pinging. run_sync() notices and runs
+the coroutine's own loop on a helper thread instead, in a copy of the
+caller's context so spans and deadlines carry over.
+"""
+
+import asyncio
+import contextvars
+import threading
+
+
+def run_sync(coro):
+    """asyncio.run(coro), also from a thread whose event loop is running"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    context = contextvars.copy_context()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = context.run(asyncio.run, coro)
+        except BaseException as e:
+            outcome["error"] = e
+
+    helper = threading.Thread(target=run, name="aio-run-sync", daemon=True)
+    helper.start()
+    helper.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
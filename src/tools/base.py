@@ -1,8 +1,231 @@
+import functools
+import shutil
+import subprocess
+import threading
+import time
 from abc import ABC, abstractmethod
 
+from src import tracing
+from src.tools.scheduler import SCHEDULER
+
+_local = threading.local()
+
+# coreutils' stdbuf, to get line-buffered output out of programs that
+# block-buffer when writing to a pipe. None where there isn't one (macOS)
+STDBUF = shutil.which("stdbuf")
+
+# functions every outermost run() goes through, first added = outermost
+# each is called as middleware(tool, target, args, kwargs, call) and either
+# returns call() (the rest of the chain + the real run) or a result of its own
+_middleware = []
+
+
+def max_concurrent_tools(limit: int = None):
+    """
+    context manager: at most `limit` tool runs at once inside it, the rest
+    queue fairly (src/tools/scheduler.py). a batch wraps its diagnoses in
+    this so a burst can't start hundreds of probes at the same time, without
+    touching any other batch's limit. None = no cap - the subprocesses stay
+    under MAX_TOOL_SUBPROCESSES either way. yields the admission, for stats
+    """
+    return SCHEDULER.run_limit(limit)
+
+
+def _limited(tool, target, run):
+    """run() once a run slot is free"""
+    with SCHEDULER.run_slot(tool._cancelled) as admitted:
+        if not admitted:
+            return {"tool_name": tool.__class__.__name__.removesuffix("Tool").lower(), "target": target,
+                    "success": False, "data": {}, "raw_output": "", "error": "cancelled before it started",
+                    "duration_seconds": 0.0}
+        return run()
+
+
+def add_run_middleware(middleware):
+    _middleware.append(middleware)
+
+
+def remove_run_middleware(middleware):
+    if middleware in _middleware:
+        _middleware.remove(middleware)
+
+
+def _wrap_run(run):
+    """
+    every subclass's run() goes through here, so process-wide policy lives
+    in one place instead of in each tool
+    """
+    @functools.wraps(run)
+    def wrapper(self, target, *args, **kwargs):
+        # only the outermost run goes through the scheduler and sees the
+        # middleware - a tool built on other tools must not wait on itself
+        if getattr(_local, "depth", 0):
+            return run(self, target, *args, **kwargs)
+        _local.depth = 1
+        name = self.__class__.__name__.removesuffix("Tool").lower()
+        try:
+            with tracing.span("tool", tool=name, target=target) as span:
+                def scheduled():
+                    # innermost, so a cassette records (and replays) every request
+                    result, served = SCHEDULER.run(
+                        self, target, args, kwargs,
+                        lambda: _limited(self, target, lambda: run(self, target, *args, **kwargs)))
+                    span.set(served=served)
+                    return result
+
+                call = scheduled
+                for middleware in reversed(_middleware):
+                    call = functools.partial(middleware, self, target, args, kwargs, call)
+                result = call()
+                if isinstance(result, dict):
+                    span.set(tool=result.get("tool_name", name), success=bool(result.get("success")))
+                return result
+        finally:
+            _local.depth = 0
+    return wrapper
+
+
 class BaseTool(ABC):
-    
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "run" in cls.__dict__:
+            cls.run = _wrap_run(cls.__dict__["run"])
+
+    def __init__(self):
+        self._proc = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.returncode = None
+        self.timed_out = False
+
     @abstractmethod
     def run(self, target: str) -> dict:
         """Every tool must implement this method"""
-        pass
\ No newline at end of file
+        pass
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """
+        stop this tool from another thread
+        kills the subprocess if one is running, and stops new ones from starting
+        """
+        with self._lock:
+            self._cancelled.set()
+            proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def _run_command(self, cmd: list[str], timeout: float = None) -> subprocess.CompletedProcess:
+        """
+        same as subprocess.run(cmd, capture_output=True, text=True)
+        but the process can be killed with cancel() while it runs
+        past `timeout` seconds it's killed, whatever it printed so far is
+        returned and self.timed_out is set
+        """
+        self.timed_out = False
+        started = time.monotonic()
+        with SCHEDULER.subprocess_slot(cmd[0], timeout, self._cancelled) as admitted:
+            if not admitted:
+                if self._cancelled.is_set():
+                    return subprocess.CompletedProcess(cmd, -9, "", "cancelled")
+                self.timed_out = True
+                return subprocess.CompletedProcess(cmd, -9, "", "no free subprocess slot in time")
+            if timeout is not None:
+                # the wait for a slot came out of the same time
+                timeout = max(0.0, timeout - (time.monotonic() - started))
+            return self._communicate(cmd, timeout)
+
+    def _communicate(self, cmd: list[str], timeout: float = None) -> subprocess.CompletedProcess:
+        with self._lock:
+            if self._cancelled.is_set():
+                return subprocess.CompletedProcess(cmd, -9, "", "cancelled")
+            self._proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            proc = self._proc
+        with tracing.span("subprocess", command=cmd[0]) as span:
+            try:
+                try:
+                    stdout, stderr = proc.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    self.timed_out = True
+                    proc.kill()
+                    stdout, stderr = proc.communicate()
+            finally:
+                with self._lock:
+                    self._proc = None
+            span.set(returncode=proc.returncode)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    def _stream_command(self, cmd: list[str], timeout: float = None, line_buffered: bool = False):
+        """
+        like _run_command, but yields stdout (stderr merged in) line by line
+        while the process is still running. closing the generator early
+        kills the process. the exit code ends up in self.returncode
+        line_buffered runs it under stdbuf -oL (when there is one) - a stdio
+        program writing to a pipe may otherwise hold its lines back and send
+        them in a burst
+        """
+        self.timed_out = False
+        started = time.monotonic()
+        with SCHEDULER.subprocess_slot(cmd[0], timeout, self._cancelled) as admitted:
+            if not admitted:
+                self.timed_out = not self._cancelled.is_set()
+                self.returncode = -9
+                return
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - started))
+            name = cmd[0]
+            if line_buffered and STDBUF:
+                cmd = [STDBUF, "-oL"] + cmd
+            yield from self._stream_process(cmd, timeout, name)
+
+    def _stream_process(self, cmd: list[str], timeout: float = None, name: str = None):
+        with self._lock:
+            if self._cancelled.is_set():
+                self.returncode = -9
+                return
+            self._proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
+            )
+            proc = self._proc
+        started = time.time()
+        # reading blocks until the next line, so the timeout has to come
+        # from another thread
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, self._expire, args=(proc,))
+            timer.daemon = True
+            timer.start()
+        try:
+            for line in proc.stdout:
+                yield line
+            proc.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            with self._lock:
+                self._proc = None
+            self.returncode = proc.returncode
+            # a generator can't hold the current span across yields
+            tracing.record("subprocess", started, time.time(), command=name or cmd[0], returncode=proc.returncode)
+
+    def _expire(self, proc):
+        if proc.poll() is None:
+            self.timed_out = True
+            proc.kill()
@@ -1,23 +1,125 @@
-import subprocess
 import time
+from src.tools import resolver
 from src.tools.base import BaseTool
 
 
 class DNSTool(BaseTool):
     """
     target -> host
-    cmd -> nslookup
+    cmd -> in-process DNS queries (src/tools/resolver.py), nslookup as fallback
     """
 
-    def run(self, target: str) -> dict:
+    def run(self, target: str, servers: list = None, timeout: float = resolver.DEFAULT_TIMEOUT,
+            budget: float = None) -> dict:
+        """
+        servers: resolvers to ask, default is everything in /etc/resolv.conf
+        budget: most seconds this run may take - a query can be a UDP try
+                then a TCP retry, so each gets half
+        """
+        if budget is not None:
+            timeout = max(0.05, min(timeout, budget / 2))
+        start = time.time()
+        try:
+            lookup = resolver.lookup_sync(target, servers=servers, timeout=timeout)
+        except ValueError as e:
+            # a name no query can carry ("label too long" and the like)
+            return {"tool_name": "dns", "target": target, "success": False, "data": {}, "raw_output": "",
+                    "error": f"DNS lookup failed for {target} ({e})",
+                    "duration_seconds": time.time() - start}
+        except OSError:
+            # no resolv.conf to read (or no sockets), let nslookup figure it out
+            return self._run_subprocess(target, budget)
+        duration = time.time() - start
+
+        answers = lookup["answers"]
+        # the answer that speaks for the lookup - A when there is one, but a
+        # resolver that only answered AAAA (or CNAME) still answered
+        main = next((answers[qtype] for qtype in ("A", "PTR", "AAAA", "CNAME", "NS") if answers.get(qtype)), None)
+        records = [r for a in answers.values() if a for r in a["records"]]
+        addresses = [r for r in records if r["type"] in ("A", "AAAA")]
+
+        data = {
+            "resolved": False,
+            "ip_addresses": [r["value"] for r in addresses],
+            "response_time_ms": main["latency_ms"] if main else None,
+            "rcode": main["rcode"] if main else None,
+            "ttl": min((r["ttl"] for r in addresses), default=None),
+            "cnames": [r["value"] for r in records if r["type"] == "CNAME"],
+            "nameservers": [r["value"] for r in records if r["type"] == "NS"],
+            "answered_by": main["server"] if main else None,
+            "resolvers": lookup["resolvers"],
+        }
+        if "PTR" in answers:
+            data["hostnames"] = [r["value"] for r in records if r["type"] == "PTR"]
+            data["resolved"] = len(data["hostnames"]) > 0
+            if main and main["rcode"] in ("NOERROR", "NXDOMAIN") and not data["resolved"]:
+                # most addresses have no reverse record - the resolver
+                # answered, which is all this says about DNS
+                data["note"] = "no PTR record for this address (normal, not a DNS problem)"
+        else:
+            data["resolved"] = len(data["ip_addresses"]) > 0
+
+        raw_output = self._format_raw_output(lookup)
+
+        # deal with error - nobody answered, or the name doesn't exist
+        if main is None or (main["rcode"] != "NOERROR" and "note" not in data):
+            if main is None:
+                failures = ", ".join(
+                    f"{server} {stats['error'] or 'no answer'}"
+                    for server, stats in lookup["resolvers"].items()
+                )
+                reason = f"no resolver answered: {failures}"
+            else:
+                reason = f"{main['rcode']} from {main['server']}"
+            return {
+                "tool_name": "dns",
+                "target": target,
+                "success": False,
+                "data": data,
+                "raw_output": raw_output,
+                "error": f"DNS lookup failed for {target} ({reason})",
+                "duration_seconds": duration
+            }
+
+        return {
+            "tool_name": "dns",
+            "target": target,
+            "success": True,
+            "data": data,
+            "raw_output": raw_output,
+            "error": "",
+            "duration_seconds": duration
+        }
+
+    def _format_raw_output(self, lookup: dict) -> str:
+        # dig-ish summary of every answer, for anything that reads raw_output
+        lines = []
+        for qtype, answer in lookup["answers"].items():
+            if answer is None:
+                lines.append(f";; {lookup['name']} {qtype}: no answer")
+                continue
+            lines.append(
+                f";; {lookup['name']} {qtype}: {answer['rcode']} from {answer['server']} "
+                f"in {answer['latency_ms']} ms{' (tcp)' if answer['tcp'] else ''}"
+            )
+            for r in answer["records"]:
+                lines.append(f"{r['name']}\t{r['ttl']}\t{r['type']}\t{r['value']}")
+        for server, stats in lookup["resolvers"].items():
+            lines.append(
+                f";; resolver {server}: rcode={stats['rcode']} "
+                f"latency_ms={stats['latency_ms']} {stats['error']}".rstrip()
+            )
+        return "\n".join(lines) + "\n"
+
+    def _run_subprocess(self, target: str, budget: float = None) -> dict:
 
         start = time.time()
 
-        result = subprocess.run(
-            ["nslookup", target],
-            capture_output=True,
-            text=True
-        )
+        # nslookup reads any "-word" as an option, "--" included
+        if target.startswith("-"):
+            return {"tool_name": "dns", "target": target, "success": False, "data": {}, "raw_output": "",
+                    "error": f"not a hostname: {target}", "duration_seconds": 0.0}
+        result = self._run_command(["nslookup", target], timeout=budget)
 
         duration = time.time() - start
 
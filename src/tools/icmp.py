@@ -0,0 +1,330 @@
+"""
+asyncio ICMP echo engine
+
+one socket is shared by every probe in flight, so a single event loop can
+ping hundreds of hosts at once without forking a `ping` per target.
+
+tries an unprivileged datagram ICMP socket first (linux, needs
+net.ipv4.ping_group_range to include our gid), then a raw socket (root).
+if neither can be opened the OSError is raised so the caller can fall back
+to the subprocess path.
+
+ipv4 only for now.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import struct
+import time
+
+from src.tools.aio import run_sync
+from src.tools.samples import RttSamples
+
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+DEFAULT_COUNT = 4
+DEFAULT_INTERVAL = 1.0   # seconds between probes to the same target, like ping
+DEFAULT_TIMEOUT = 1.0    # seconds to wait for each reply
+PAYLOAD_SIZE = 56        # same as ping's default
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _build_echo(ident: int, seq: int, payload: bytes) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = _checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+
+class IcmpSocket:
+    """
+    one ICMP socket + the table of probes waiting for a reply
+    replies are matched on (address, sequence number)
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.raw = False
+        except PermissionError:
+            # if this raises too there's no icmp for us at all
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+
+        self.sock.setblocking(False)
+        # datagram sockets get their id rewritten by the kernel, raw sockets
+        # see every icmp packet on the host so we need our own id to filter
+        self.ident = random.getrandbits(16)
+        self._seq = random.getrandbits(16)
+        self._waiters = {}
+        self._replies = {}     # (addr, seq) -> replies seen, for probes counting duplicates
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def close(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        for fut in self._waiters.values():
+            if not fut.done():
+                fut.cancel()
+        self._waiters.clear()
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFFFF
+        return self._seq
+
+    def _on_readable(self):
+        while True:
+            try:
+                packet, (addr, _) = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received = time.perf_counter()
+
+            if self.raw:
+                # raw sockets hand us the ip header too
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < 8:
+                continue
+
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            if self.raw and ident != self.ident:
+                continue
+
+            if (addr, seq) in self._replies:
+                self._replies[(addr, seq)] += 1
+            fut = self._waiters.get((addr, seq))
+            if fut is not None and not fut.done():
+                fut.set_result(received)
+
+    async def probe(self, addr: str, timeout: float, count_replies: bool = False):
+        """
+        send one echo request, return (seq, rtt_ms) - rtt is None on timeout
+        count_replies keeps counting replies to this seq after the first one,
+        collect the count with pop_reply_count
+        """
+        seq = self._next_seq()
+        fut = self.loop.create_future()
+        self._waiters[(addr, seq)] = fut
+        if count_replies:
+            self._replies[(addr, seq)] = 0
+        packet = _build_echo(self.ident, seq, os.urandom(PAYLOAD_SIZE))
+        try:
+            sent = time.perf_counter()
+            try:
+                self.sock.sendto(packet, (addr, 0))
+            except OSError:
+                # e.g. network unreachable - counts as a lost probe
+                return seq, None
+            try:
+                received = await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return seq, None
+            return seq, round((received - sent) * 1000, 3)
+        finally:
+            self._waiters.pop((addr, seq), None)
+
+    def pop_reply_count(self, addr: str, seq: int) -> int:
+        """replies seen so far for a count_replies probe (more than 1 = duplicates)"""
+        return self._replies.pop((addr, seq), 0)
+
+
+async def _resolve(loop, target: str):
+    try:
+        infos = await loop.getaddrinfo(target, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    except socket.gaierror:
+        return None
+    return infos[0][4][0] if infos else None
+
+
+def _format_raw_output(target, addr, probes, stats, duplicates):
+    # mimic ping's output so anything that reads raw_output still makes sense
+    lines = [f"PING {target} ({addr}): {PAYLOAD_SIZE} data bytes"]
+    for i, (_, rtt) in enumerate(probes):
+        if rtt is None:
+            lines.append(f"Request timeout for icmp_seq {i}")
+        else:
+            lines.append(f"{PAYLOAD_SIZE + 8} bytes from {addr}: icmp_seq={i} time={rtt:.3f} ms")
+    loss = stats["packet_loss_percent"]
+    dups = f"+{duplicates} duplicates, " if duplicates else ""
+    lines += [
+        "",
+        f"--- {target} ping statistics ---",
+        f"{stats['transmitted']} packets transmitted, {stats['received']} packets received, "
+        f"{dups}{loss:.1f}% packet loss",
+    ]
+    if stats["received"]:
+        lines.append(
+            f"round-trip min/avg/max/stddev = {stats['min_rtt_ms']:.3f}/"
+            f"{stats['avg_rtt_ms']:.3f}/{stats['max_rtt_ms']:.3f}/{stats['stddev_rtt_ms']:.3f} ms"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def sample_data(stats: dict) -> dict:
+    """the RttSamples stats that go into a ping result's data"""
+    return {
+        "packet_loss_percent": stats["packet_loss_percent"],
+        "avg_rtt_ms": stats["avg_rtt_ms"],
+        "min_rtt_ms": stats["min_rtt_ms"],
+        "max_rtt_ms": stats["max_rtt_ms"],
+        "jitter_ms": stats["jitter_ms"],
+        "p50_rtt_ms": stats["p50_rtt_ms"],
+        "p95_rtt_ms": stats["p95_rtt_ms"],
+        "p99_rtt_ms": stats["p99_rtt_ms"],
+        "duplicate_percent": stats["duplicate_percent"],
+        "out_of_order": stats["out_of_order"],
+        "loss_bursts": stats["loss_bursts"],
+        "max_loss_burst": stats["max_loss_burst"],
+    }
+
+
+async def ping(target: str,
+               count: int = DEFAULT_COUNT,
+               interval: float = DEFAULT_INTERVAL,
+               timeout: float = DEFAULT_TIMEOUT,
+               icmp: IcmpSocket = None,
+               samples: RttSamples = None) -> dict:
+    """
+    ping one target, returns the same result dict as PingTool.run
+    pass `icmp` to share a socket between concurrent pings (see ping_many)
+    and `samples` to keep every reply (see src/tools/samples.py)
+    """
+    if samples is None:
+        samples = RttSamples()
+    loop = asyncio.get_running_loop()
+    owns_socket = icmp is None
+    if owns_socket:
+        icmp = IcmpSocket(loop)
+
+    start = time.time()
+    try:
+        addr = await _resolve(loop, target)
+        if addr is None:
+            return {
+                "tool_name": "ping",
+                "target": target,
+                "success": False,
+                "data": {},
+                "raw_output": f"ping: cannot resolve {target}: Unknown host\n",
+                "error": f"ping failed for {target}",
+                "duration_seconds": time.time() - start,
+            }
+
+        # fire probes on a fixed schedule, don't wait for each reply first
+        probes = []
+        sent_at = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            sent_at.append(time.perf_counter())
+            probes.append(asyncio.ensure_future(icmp.probe(addr, timeout, count_replies=True)))
+        probes = await asyncio.gather(*probes)
+        replies = [icmp.pop_reply_count(addr, seq) for seq, _ in probes]
+    finally:
+        if owns_socket:
+            icmp.close()
+
+    duration = time.time() - start
+
+    # feed the samples in arrival order so out-of-order replies get flagged,
+    # extra replies to the same probe are duplicates
+    samples.transmitted += len(probes)
+    answered = [(sent_at[i] + rtt / 1000, i, rtt) for i, (_, rtt) in enumerate(probes) if rtt is not None]
+    for _, i, rtt in sorted(answered):
+        samples.add_reply(i, rtt)
+    duplicates = 0
+    for i, seen in enumerate(replies):
+        for _ in range(seen - 1):
+            samples.add_reply(i, None, duplicate=True)
+            duplicates += 1
+
+    stats = samples.stats()
+    raw_output = _format_raw_output(target, addr, probes, stats, duplicates)
+
+    # same rule as the ping binary: no replies at all means failure
+    if stats["received"] == 0:
+        return {
+            "tool_name": "ping",
+            "target": target,
+            "success": False,
+            "data": {},
+            "raw_output": raw_output,
+            "error": f"ping failed for {target}",
+            "duration_seconds": duration,
+        }
+
+    return {
+        "tool_name": "ping",
+        "target": target,
+        "success": True,
+        "data": sample_data(stats),
+        "raw_output": raw_output,
+        "error": "",
+        "duration_seconds": duration,
+    }
+
+
+async def ping_many(targets: list[str],
+                    count: int = DEFAULT_COUNT,
+                    interval: float = DEFAULT_INTERVAL,
+                    timeout: float = DEFAULT_TIMEOUT) -> list[dict]:
+    """
+    ping every target concurrently over one shared socket
+    results come back in the same order as `targets`
+    """
+    loop = asyncio.get_running_loop()
+    icmp = IcmpSocket(loop)
+    try:
+        return await asyncio.gather(*(
+            ping(t, count=count, interval=interval, timeout=timeout, icmp=icmp)
+            for t in targets
+        ))
+    finally:
+        icmp.close()
+
+
+def fit_budget(count: int, interval: float, timeout: float, budget: float):
+    """fewer probes / a shorter reply wait so count probes fit in `budget` seconds -> (count, timeout)"""
+    timeout = max(0.05, min(timeout, budget / 2))
+    count = max(1, min(count, int((budget - timeout) / interval) + 1 if interval > 0 else count))
+    return count, timeout
+
+
+def ping_sync(target: str, budget: float = None, **kwargs) -> dict:
+    """blocking wrapper for callers that aren't async, gives up after `budget` seconds"""
+    if budget is None:
+        return run_sync(ping(target, **kwargs))
+    try:
+        return run_sync(asyncio.wait_for(ping(target, **kwargs), budget))
+    except asyncio.TimeoutError:
+        # e.g. the name lookup for the target hung
+        return {
+            "tool_name": "ping",
+            "target": target,
+            "success": False,
+            "data": {},
+            "raw_output": "",
+            "error": f"ping timed out for {target} (budget {budget:.1f}s)",
+            "duration_seconds": budget,
+        }
+
+
+def ping_many_sync(targets: list[str], **kwargs) -> list[dict]:
+    """blocking wrapper around ping_many"""
+    return run_sync(ping_many(targets, **kwargs))
@@ -0,0 +1,353 @@
+# src/tools/netstate.py
+
+"""
+the host's own network state, straight from procfs / sysfs
+
+no tool answers "is this machine even connected?" without a network round
+trip - ping a 4 s timeout into a missing default route and the agent has
+spent a whole ReAct step learning something the kernel already knew. this
+reads it directly, in a few milliseconds and without forking anything:
+
+    /proc/net/route             default route (ipv6: /proc/net/ipv6_route)
+    /sys/class/net/*/operstate  which links are up (and carrier)
+    /proc/net/dev               per interface packet / error / drop counters
+    /proc/net/snmp              ip / icmp / tcp / udp counters (retransmits...)
+    /etc/resolv.conf            configured resolvers
+
+    before = netstate.snapshot()
+    ...
+    changes = netstate.diff(before, netstate.snapshot())
+    netstate.describe_diff(changes)     # "eth0 rx errors +12", ...
+
+a source that isn't there (not linux, a sandbox without /sys) is listed in
+the snapshot's "unavailable" instead of failing the whole snapshot.
+"""
+
+import ipaddress
+import os
+import socket
+import struct
+import time
+
+from src.tools import resolver
+
+ROUTE_TABLE = "/proc/net/route"
+IPV6_ROUTE_TABLE = "/proc/net/ipv6_route"
+NET_DEV = "/proc/net/dev"
+NET_SNMP = "/proc/net/snmp"
+SYS_CLASS_NET = "/sys/class/net"
+RTF_UP = 0x1
+RTF_GATEWAY = 0x2
+
+DEV_FIELDS = ("rx_bytes", "rx_packets", "rx_errors", "rx_dropped", "rx_fifo", "rx_frame",
+              "rx_compressed", "rx_multicast", "tx_bytes", "tx_packets", "tx_errors",
+              "tx_dropped", "tx_fifo", "tx_collisions", "tx_carrier", "tx_compressed")
+
+# the /proc/net/snmp counters worth keeping - the rest is noise for a diagnosis
+SNMP_COUNTERS = {
+    "Ip": ("InReceives", "InDiscards", "OutRequests", "OutNoRoutes"),
+    "Icmp": ("InDestUnreachs", "InTimeExcds", "OutDestUnreachs"),
+    "Tcp": ("ActiveOpens", "AttemptFails", "EstabResets", "OutSegs", "RetransSegs", "InErrs"),
+    "Udp": ("InDatagrams", "NoPorts", "InErrors", "RcvbufErrors", "SndbufErrors"),
+}
+
+# counters whose climbing between two snapshots means something is wrong
+# (name, what to call it)
+INTERFACE_PROBLEMS = (("rx_errors", "rx errors"), ("tx_errors", "tx errors"),
+                      ("rx_dropped", "rx drops"), ("tx_dropped", "tx drops"),
+                      ("tx_carrier", "carrier errors"))
+SNMP_PROBLEMS = (("Tcp", "RetransSegs", "TCP retransmits"), ("Tcp", "AttemptFails", "failed TCP connects"),
+                 ("Ip", "OutNoRoutes", "packets with no route"), ("Udp", "InErrors", "UDP receive errors"),
+                 ("Udp", "RcvbufErrors", "UDP receive buffer overflows"))
+
+
+def _hex_ipv4(value: str) -> str:
+    return socket.inet_ntoa(struct.pack("<L", int(value, 16)))
+
+
+def read_routes(path: str = ROUTE_TABLE) -> list[dict]:
+    """the IPv4 routing table. OSError if it can't be read (not linux)"""
+    routes = []
+    with open(path) as f:
+        next(f, None)  # header
+        for line in f:
+            fields = line.split()
+            if len(fields) < 8:
+                continue
+            flags = int(fields[3], 16)
+            routes.append({
+                "interface": fields[0],
+                "destination": _hex_ipv4(fields[1]),
+                "gateway": _hex_ipv4(fields[2]) if flags & RTF_GATEWAY else None,
+                "mask": _hex_ipv4(fields[7]),
+                "metric": int(fields[6]),
+                "up": bool(flags & RTF_UP),
+            })
+    return routes
+
+
+def default_gateway(path: str = ROUTE_TABLE):
+    """
+    {"interface", "address"} of the IPv4 default route with the lowest
+    metric, None if there is no default route. OSError if the routing table
+    can't be read
+    """
+    return _default_route(read_routes(path))
+
+
+def _default_route(routes: list[dict]):
+    defaults = [r for r in routes
+                if r["destination"] == "0.0.0.0" and r["mask"] == "0.0.0.0" and r["up"] and r["gateway"]]
+    if not defaults:
+        return None
+    best = min(defaults, key=lambda r: r["metric"])
+    return {"interface": best["interface"], "address": best["gateway"]}
+
+
+def default_gateway_v6(path: str = IPV6_ROUTE_TABLE):
+    """next hop of an IPv6 default route, None if there isn't one (or no table)"""
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 10 and fields[0] == "0" * 32 and fields[1] == "00" and fields[4] != "0" * 32:
+                    return {"interface": fields[9], "address": str(ipaddress.IPv6Address(int(fields[4], 16)))}
+    except OSError:
+        pass
+    return None
+
+
+def read_dev(path: str = NET_DEV) -> dict:
+    """interface -> {rx_bytes, rx_errors, ..., tx_carrier}"""
+    interfaces = {}
+    with open(path) as f:
+        for line in f:
+            name, sep, counters = line.partition(":")
+            if not sep or "|" in line:
+                continue
+            values = counters.split()
+            if len(values) >= len(DEV_FIELDS):
+                interfaces[name.strip()] = dict(zip(DEV_FIELDS, map(int, values)))
+    return interfaces
+
+
+def read_snmp(path: str = NET_SNMP) -> dict:
+    """{"Ip": {...}, "Icmp": {...}, "Tcp": {...}, "Udp": {...}} - SNMP_COUNTERS only"""
+    counters = {}
+    with open(path) as f:
+        lines = f.read().splitlines()
+    # the file is pairs of lines: "Tcp: Name Name ..." then "Tcp: 1 2 ..."
+    for names, values in zip(lines[::2], lines[1::2]):
+        proto, _, names = names.partition(":")
+        wanted = SNMP_COUNTERS.get(proto)
+        if not wanted:
+            continue
+        row = dict(zip(names.split(), values.partition(":")[2].split()))
+        counters[proto] = {name: int(row[name]) for name in wanted if name in row}
+    return counters
+
+
+def _read_sys(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        # e.g. carrier on a link that's administratively down is EINVAL
+        return None
+
+
+def read_links(path: str = SYS_CLASS_NET) -> dict:
+    """interface -> {"operstate", "carrier"} (carrier None when the kernel won't say)"""
+    links = {}
+    for name in sorted(os.listdir(path)):
+        carrier = _read_sys(f"{path}/{name}/carrier")
+        links[name] = {
+            "operstate": _read_sys(f"{path}/{name}/operstate") or "unknown",
+            "carrier": None if carrier is None else carrier == "1",
+        }
+    return links
+
+
+def snapshot() -> dict:
+    """
+    one read of everything above:
+        {"taken_at", "read_ms", "interfaces": {name: {operstate, carrier, counters...}},
+         "default_route", "default_route_v6", "routes", "resolvers", "snmp", "unavailable"}
+    """
+    started = time.perf_counter()
+    unavailable = []
+
+    def read(name, reader, default):
+        try:
+            return reader()
+        except (OSError, ValueError):
+            unavailable.append(name)
+            return default
+
+    links = read("links", read_links, {})
+    counters = read("dev", read_dev, {})
+    routes = read("routes", read_routes, None)
+    interfaces = {}
+    for name in sorted(set(links) | set(counters)):
+        interfaces[name] = {**links.get(name, {"operstate": "unknown", "carrier": None}),
+                            **counters.get(name, {})}
+
+    return {
+        "taken_at": time.time(),
+        "interfaces": interfaces,
+        "default_route": _default_route(routes) if routes is not None else None,
+        "default_route_v6": default_gateway_v6(),
+        "routes": None if routes is None else len(routes),
+        "resolvers": resolver.read_resolv_conf(),
+        "snmp": read("snmp", read_snmp, {}),
+        "unavailable": unavailable,
+        "read_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def _is_loopback(name: str) -> bool:
+    return name == "lo" or name.startswith("lo:")
+
+
+def is_up(interface: dict) -> bool:
+    """
+    a link that can carry traffic. tun / ppp / wireguard devices never say
+    "up", they say "unknown" - with a carrier that's as up as they get
+    """
+    state = interface.get("operstate")
+    return state == "up" or (state == "unknown" and bool(interface.get("carrier")))
+
+
+def _links_up(snap: dict) -> list[str]:
+    return [name for name, i in snap["interfaces"].items() if not _is_loopback(name) and is_up(i)]
+
+
+def facts(snap: dict) -> dict:
+    """what the rules look at (see rules.py "netstate.*")"""
+    known = "links" not in snap["unavailable"] and any(not _is_loopback(n) for n in snap["interfaces"])
+    has_route = (None if "routes" in snap["unavailable"]
+                 else bool(snap["default_route"] or snap["default_route_v6"]))
+    links_up = len(_links_up(snap)) if known else None
+    if links_up == 0 and has_route:
+        # a default route goes out through something - we just can't tell what
+        links_up = None
+    return {"links_up": links_up, "default_route": has_route}
+
+
+def _size(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def describe(snap: dict) -> str:
+    """the compact block the LLM gets in its first message"""
+    lines = ["Local network state (read from /proc and /sys, nothing sent on the network):"]
+
+    up, down = [], []
+    for name, i in snap["interfaces"].items():
+        if _is_loopback(name):
+            continue
+        if is_up(i):
+            details = [f"rx {_size(i['rx_bytes'])}, tx {_size(i['tx_bytes'])}"] if "rx_bytes" in i else []
+            details += [f"{i[field]} {label}" for field, label in INTERFACE_PROBLEMS if i.get(field)]
+            up.append(f"{name} ({', '.join(details)})" if details else name)
+        else:
+            down.append(f"{name} {i.get('operstate')}")
+    if "links" in snap["unavailable"] and not snap["interfaces"]:
+        lines.append("  interfaces: unknown (no /sys/class/net)")
+    else:
+        lines.append(f"  interfaces up: {'; '.join(up) if up else 'NONE'}")
+        if down:
+            lines.append(f"  interfaces down: {', '.join(down)}")
+
+    route = snap["default_route"]
+    if "routes" in snap["unavailable"]:
+        lines.append("  default route: unknown (no /proc/net/route)")
+    elif route:
+        lines.append(f"  default route: via {route['address']} dev {route['interface']}")
+    elif snap["default_route_v6"]:
+        lines.append(f"  default route: IPv6 only, via {snap['default_route_v6']['address']}")
+    else:
+        lines.append("  default route: NONE - nothing off the local network is reachable")
+
+    lines.append(f"  resolvers: {', '.join(snap['resolvers']) or 'none configured'}")
+
+    tcp = snap["snmp"].get("Tcp") or {}
+    if tcp.get("OutSegs"):
+        lines.append(f"  tcp since boot: {tcp.get('RetransSegs', 0)} of {tcp['OutSegs']} segments "
+                     f"retransmitted, {tcp.get('AttemptFails', 0)} failed connects")
+    return "\n".join(lines)
+
+
+def diff(before: dict, after: dict) -> dict:
+    """
+    what changed between two snapshots:
+        {"seconds", "links": [(name, old operstate, new)], "default_route": (old, new) or None,
+         "interfaces": {name: {counter: increase}}, "snmp": {"Proto.Name": increase}}
+    counters that went backwards (interface re-created, counter wrapped) are left out
+    """
+    changes = {"seconds": round(after["taken_at"] - before["taken_at"], 3),
+               "links": [], "default_route": None, "interfaces": {}, "snmp": {}}
+
+    for name, now in after["interfaces"].items():
+        was = before["interfaces"].get(name)
+        if was is None:
+            continue
+        if was.get("operstate") != now.get("operstate"):
+            changes["links"].append((name, was.get("operstate"), now.get("operstate")))
+        grown = {field: now[field] - was[field] for field in DEV_FIELDS
+                 if field in now and field in was and now[field] > was[field]}
+        if grown:
+            changes["interfaces"][name] = grown
+    for name in before["interfaces"].keys() - after["interfaces"].keys():
+        changes["links"].append((name, before["interfaces"][name].get("operstate"), "gone"))
+
+    if before["default_route"] != after["default_route"]:
+        changes["default_route"] = (before["default_route"], after["default_route"])
+
+    for proto, counters in after["snmp"].items():
+        for name, value in counters.items():
+            old = before["snmp"].get(proto, {}).get(name)
+            if old is not None and value > old:
+                changes["snmp"][f"{proto}.{name}"] = value - old
+    return changes
+
+
+def describe_diff(changes: dict, interface_counters=INTERFACE_PROBLEMS, snmp_counters=SNMP_PROBLEMS) -> str:
+    """
+    the changes worth telling the LLM about, "" when there are none
+    link and default route changes always count, counters only the ones given
+    """
+    notes = []
+    for name, old, new in changes["links"]:
+        notes.append(f"{name} went {old} -> {new}")
+    if changes["default_route"]:
+        old, new = changes["default_route"]
+        notes.append(f"default route {'via ' + old['address'] if old else 'none'} -> "
+                     f"{'via ' + new['address'] if new else 'NONE'}")
+    for name, grown in changes["interfaces"].items():
+        for field, label in interface_counters:
+            if grown.get(field):
+                notes.append(f"{name} {label} +{grown[field]}")
+    for proto, name, label in snmp_counters:
+        increase = changes["snmp"].get(f"{proto}.{name}")
+        if increase:
+            notes.append(f"{label} +{increase}")
+    if not notes:
+        return ""
+    return f"local counters in the last {changes['seconds']:g}s: " + ", ".join(notes)
+
+
+class Tracker:
+    """keeps the last snapshot, poll() gives the changes since then"""
+
+    def __init__(self, first: dict = None):
+        self.last = first or snapshot()
+
+    def poll(self) -> dict:
+        now = snapshot()
+        changes = diff(self.last, now)
+        self.last = now
+        return changes
@@ -1,23 +1,42 @@
-import subprocess
+import sys
 import time
+from src.tools import icmp
 from src.tools.base import BaseTool
+from src.tools.samples import RttSamples, parse_reply_line
 
 
 class PingTool(BaseTool):
     """
     target -> host
-    cmd -> ping
+    cmd -> in-process ICMP echo (src/tools/icmp.py), `ping` as fallback
+    every reply of the last run is kept in self.samples
     """
 
-    def run(self, target: str, count: int = 4) -> dict:
+    def __init__(self):
+        super().__init__()
+        self.samples = RttSamples()
+
+    def run(self, target: str, count: int = 4, interval: float = 0.2, timeout: float = 1.0,
+            budget: float = None) -> dict:
+        """
+        budget: most seconds this run may take - fewer probes and a shorter
+        reply wait so they fit, and a hard stop at the end of it
+        """
+        if budget is not None:
+            count, timeout = icmp.fit_budget(count, interval, timeout, budget)
+        self.samples = RttSamples()
+        try:
+            return icmp.ping_sync(target, budget=budget, count=count, interval=interval,
+                                  timeout=timeout, samples=self.samples)
+        except OSError:
+            # no datagram or raw icmp socket for us, shell out instead
+            return self._run_subprocess(target, count, budget)
+
+    def _run_subprocess(self, target: str, count: int, budget: float = None) -> dict:
 
         start = time.time()
 
-        result = subprocess.run(
-            ["ping", "-c", str(count), target],
-            capture_output=True,
-            text=True
-        )
+        result = self._run_command(["ping", "-c", str(count), "--", target], timeout=budget)
 
         duration = time.time() - start
 
@@ -29,44 +48,64 @@ class PingTool(BaseTool):
                 "success": False,
                 "data": {},
                 "raw_output": result.stdout + result.stderr,
-                "error": f"ping failed for {target}",
+                "error": f"ping timed out for {target} (budget {budget:.1f}s)" if self.timed_out
+                         else f"ping failed for {target}",
                 "duration_seconds": duration
             }
 
         # parse output
         '''
+        macos:
+        64 bytes from 8.8.8.8: icmp_seq=0 ttl=117 time=6.107 ms
         4 packets transmitted, 4 received, 0.0% packet loss
         round-trip min/avg/max/stddev = 6.107/11.503/14.397/3.201 ms
+        linux:
+        64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=6.10 ms (DUP!)
+        4 packets transmitted, 4 received, +1 duplicates, 0% packet loss, time 3004ms
+        rtt min/avg/max/mdev = 6.107/11.503/14.397/3.201 ms
         '''
         lines = result.stdout.split("\n")
 
+        # linux numbers its probes from 1, macos from 0
+        self.samples = RttSamples(first_seq=1 if sys.platform.startswith("linux") else 0)
         packet_loss = None
         avg_rtt = None
         min_rtt = None
         max_rtt = None
 
         for line in lines:
+            reply = parse_reply_line(line)
+            if reply:
+                seq, rtt, dup = reply
+                self.samples.add_reply(seq, rtt, duplicate=dup or None)
+                continue
+
+            if "packets transmitted" in line:
+                self.samples.transmitted = int(line.split()[0])
+
             if "packet loss" in line:
                 for part in line.split():
-                    if "%" in part:
+                    if part.endswith("%"):
                         packet_loss = float(part.replace("%", ""))
 
-            if "round-trip" in line and "/" in line:
-                parts = line.split("/")
-                min_rtt = float(parts[3].split("= ")[1])
-                avg_rtt = float(parts[4])
-                max_rtt = float(parts[5])
+            if "min/avg/max" in line and "=" in line:
+                values = line.split("=")[1].split()[0].split("/")
+                min_rtt = float(values[0])
+                avg_rtt = float(values[1])
+                max_rtt = float(values[2])
+
+        # the summary lines win where they exist, the samples fill in the rest
+        data = icmp.sample_data(self.samples.stats())
+        for field, value in (("packet_loss_percent", packet_loss), ("avg_rtt_ms", avg_rtt),
+                             ("min_rtt_ms", min_rtt), ("max_rtt_ms", max_rtt)):
+            if value is not None:
+                data[field] = value
 
         return {
             "tool_name": "ping",
             "target": target,
             "success": True,
-            "data": {
-                "packet_loss_percent": packet_loss,
-                "avg_rtt_ms": avg_rtt,
-                "min_rtt_ms": min_rtt,
-                "max_rtt_ms": max_rtt
-            },
+            "data": data,
             "raw_output": result.stdout,
             "error": "",
             "duration_seconds": duration
@@ -0,0 +1,362 @@
+"""
+asyncio DNS client
+
+talks to the resolvers directly (UDP, retrying over TCP when the answer is
+truncated) instead of forking nslookup, so one lookup costs one round trip.
+A, AAAA, CNAME and NS are asked in parallel, every configured resolver is
+raced for each of them, and the answer records rcode, ttl and which
+resolver answered how fast - or how it failed.
+
+servers are "ip", "ip:port" or (ip, port) tuples, so a stub server on a
+local port works the same as the ones in /etc/resolv.conf. short names go
+through resolv.conf's search list the way libc does it (search, ndots).
+"""
+
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+
+from src.tools.aio import run_sync
+
+RESOLV_CONF = "/etc/resolv.conf"
+DNS_PORT = 53
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_QTYPES = ("A", "AAAA", "CNAME", "NS")
+
+QTYPES = {"A": 1, "NS": 2, "CNAME": 5, "PTR": 12, "AAAA": 28}
+QTYPE_NAMES = {v: k for k, v in QTYPES.items()}
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+# rcodes that are a real answer about the name, as opposed to a resolver problem
+FINAL_RCODES = {"NOERROR", "NXDOMAIN"}
+
+
+def read_resolv_conf(path: str = RESOLV_CONF) -> list[str]:
+    """nameserver entries from resolv.conf, in order"""
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    servers.append(parts[1])
+    except OSError:
+        pass
+    return servers
+
+
+def read_search(path: str = RESOLV_CONF):
+    """(search domains, ndots) from resolv.conf - the last search / domain line wins, like libc"""
+    search, ndots = [], 1
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if parts[0] == "search":
+                    search = parts[1:]
+                elif parts[0] == "domain":
+                    search = parts[1:2]
+                elif parts[0] == "options":
+                    for option in parts[1:]:
+                        if option.startswith("ndots:") and option[6:].isdigit():
+                            ndots = min(int(option[6:]), 15)
+    except OSError:
+        pass
+    return search, ndots
+
+
+def search_names(name: str, search=(), ndots: int = 1) -> list[str]:
+    """
+    the names libc tries for `name`, in order. a trailing dot means fully
+    qualified. with ndots or more dots the name goes first, else the
+    search domains do
+    """
+    if name.endswith("."):
+        return [name.rstrip(".")]
+    expanded = [f"{name}.{domain.strip('.')}" for domain in search if domain.strip(".")]
+    if name.count(".") >= ndots:
+        return [name] + expanded
+    return expanded + [name]
+
+
+def _split_server(server):
+    if isinstance(server, tuple):
+        return server
+    # "1.2.3.4:5353" - but leave bare ipv6 addresses alone. a zone
+    # ("fe80::1%eth0") stays on: getaddrinfo turns it into the sockaddr's
+    # scope id, and a link-local resolver can't be reached without it
+    if server.count(":") == 1:
+        host, port = server.split(":")
+        return host, int(port)
+    return server, DNS_PORT
+
+
+def _server_label(server) -> str:
+    host, port = _split_server(server)
+    return host if port == DNS_PORT else f"{host}:{port}"
+
+
+def check_name(name: str):
+    """ValueError if `name` can't go in a query (a label over 63 bytes, not encodable...)"""
+    try:
+        build_query(name, "A", 0)
+    except ValueError as e:     # UnicodeError included
+        raise ValueError(f"not a valid DNS name: {e}") from None
+
+
+def build_query(name: str, qtype: str, query_id: int) -> bytes:
+    # header: id, flags (just RD), 1 question
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b""
+    for label in name.rstrip(".").split("."):
+        if label:
+            encoded = label.encode("idna")
+            qname += bytes([len(encoded)]) + encoded
+    return header + qname + b"\x00" + struct.pack("!HH", QTYPES[qtype], 1)
+
+
+def _read_name(msg: bytes, offset: int):
+    """decode a (possibly compressed) name, returns (name, offset after it)"""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = msg[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | msg[offset + 1]
+            jumps += 1
+            if jumps > 20:
+                raise ValueError("compression loop")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(msg[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    return ".".join(labels), (end if end is not None else offset)
+
+
+def parse_response(msg: bytes) -> dict:
+    query_id, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", msg[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(msg, offset)
+        offset += 4
+
+    records = []
+    for _ in range(ancount):
+        name, offset = _read_name(msg, offset)
+        rtype, _, ttl, rdlength = struct.unpack("!HHIH", msg[offset:offset + 10])
+        offset += 10
+        rdata = msg[offset:offset + rdlength]
+
+        if rtype == QTYPES["A"]:
+            value = socket.inet_ntop(socket.AF_INET, rdata)
+        elif rtype == QTYPES["AAAA"]:
+            value = socket.inet_ntop(socket.AF_INET6, rdata)
+        elif rtype in (QTYPES["CNAME"], QTYPES["NS"], QTYPES["PTR"]):
+            value, _ = _read_name(msg, offset)
+        else:
+            value = rdata.hex()
+        offset += rdlength
+
+        records.append({
+            "name": name,
+            "type": QTYPE_NAMES.get(rtype, str(rtype)),
+            "ttl": ttl,
+            "value": value,
+        })
+
+    return {
+        "id": query_id,
+        "truncated": bool(flags & 0x0200),
+        "rcode": RCODES.get(flags & 0x000F, str(flags & 0x000F)),
+        "records": records,
+    }
+
+
+class _UdpQuery(asyncio.DatagramProtocol):
+
+    def __init__(self, query_id: int, fut: asyncio.Future):
+        self.query_id = query_id
+        self.fut = fut
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 12 and struct.unpack("!H", data[:2])[0] == self.query_id and not self.fut.done():
+            self.fut.set_result(data)
+
+    def error_received(self, exc):
+        if not self.fut.done():
+            self.fut.set_exception(exc)
+
+
+async def _query_udp(host, port, packet, query_id, timeout):
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _UdpQuery(query_id, fut), remote_addr=(host, port)
+    )
+    try:
+        transport.sendto(packet)
+        return await asyncio.wait_for(fut, timeout)
+    finally:
+        transport.close()
+
+
+async def _query_tcp(host, port, packet, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(struct.pack("!H", len(packet)) + packet)
+        await writer.drain()
+        length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), timeout))[0]
+        return await asyncio.wait_for(reader.readexactly(length), timeout)
+    finally:
+        writer.close()
+
+
+async def query(server, name: str, qtype: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    one question to one resolver. never raises - failures come back with
+    rcode None and an error string
+    """
+    host, port = _split_server(server)
+    query_id = random.getrandbits(16)
+    answer = {
+        "server": _server_label(server),
+        "qtype": qtype,
+        "rcode": None,
+        "records": [],
+        "latency_ms": None,
+        "tcp": False,
+        "error": "",
+    }
+
+    start = time.perf_counter()
+    try:
+        packet = build_query(name, qtype, query_id)
+        response = parse_response(await _query_udp(host, port, packet, query_id, timeout))
+        if response["truncated"]:
+            # too big for udp, ask again over tcp
+            answer["tcp"] = True
+            response = parse_response(await _query_tcp(host, port, packet, timeout))
+    except asyncio.TimeoutError:
+        answer["error"] = "timed out"
+        return answer
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        answer["error"] = str(e) or e.__class__.__name__
+        return answer
+
+    answer["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    answer["rcode"] = response["rcode"]
+    answer["records"] = response["records"]
+    return answer
+
+
+async def race(servers, name: str, qtype: str, timeout: float = DEFAULT_TIMEOUT):
+    """
+    ask every resolver at once, the first real answer (NOERROR / NXDOMAIN)
+    wins and the rest are cancelled. returns (winner or None, every answer
+    that came back before that)
+    """
+    pending = {asyncio.ensure_future(query(s, name, qtype, timeout)) for s in servers}
+    answers = []
+    winner = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                answer = task.result()
+                answers.append(answer)
+                if winner is None and answer["rcode"] in FINAL_RCODES:
+                    winner = answer
+    finally:
+        for task in pending:
+            task.cancel()
+    return winner, answers
+
+
+def _ptr_name(ip: str) -> str:
+    return ipaddress.ip_address(ip).reverse_pointer
+
+
+def _found(result: dict) -> bool:
+    return any(a is not None and a["rcode"] == "NOERROR" and a["records"] for a in result["answers"].values())
+
+
+async def lookup(name: str, servers=None, qtypes=DEFAULT_QTYPES, timeout: float = DEFAULT_TIMEOUT,
+                 search=None, ndots: int = None) -> dict:
+    """
+    resolve `name` against `servers` (default: /etc/resolv.conf)
+    an ip address gets a reverse (PTR) lookup instead, like nslookup does
+    search / ndots default to resolv.conf's. each search name is tried in
+    turn until one has records - the result is that name's, or the name
+    as given if none had any
+    """
+    servers = list(servers) if servers else read_resolv_conf()
+    if not servers:
+        raise OSError("no DNS servers configured")
+    check_name(name)
+
+    try:
+        ipaddress.ip_address(name)
+        return await _lookup_name(_ptr_name(name), servers, ("PTR",), timeout)
+    except ValueError:
+        pass
+
+    if search is None or ndots is None:
+        conf_search, conf_ndots = read_search()
+        search = conf_search if search is None else search
+        ndots = conf_ndots if ndots is None else ndots
+    names = search_names(name, search, ndots)
+
+    as_given = None
+    for candidate in names:
+        result = await _lookup_name(candidate, servers, qtypes, timeout)
+        if len(names) > 1:
+            result["searched"] = names
+        if _found(result):
+            return result
+        if candidate == name.rstrip("."):
+            as_given = result
+        if not any(a is not None for a in result["answers"].values()):
+            # nobody answered at all - the next name won't do better, and
+            # each try costs a full timeout
+            break
+    return as_given or result
+
+
+async def _lookup_name(name: str, servers: list, qtypes, timeout: float) -> dict:
+    races = await asyncio.gather(*(race(servers, name, qtype, timeout) for qtype in qtypes))
+
+    winners = {}
+    resolvers = {_server_label(s): {"latency_ms": None, "rcode": None, "error": "", "answered": 0} for s in servers}
+    for qtype, (winner, answers) in zip(qtypes, races):
+        winners[qtype] = winner
+        for answer in answers:
+            stats = resolvers[answer["server"]]
+            if answer["rcode"] is not None:
+                stats["answered"] += 1
+                stats["rcode"] = stats["rcode"] if stats["rcode"] == "NOERROR" else answer["rcode"]
+                if stats["latency_ms"] is None or answer["latency_ms"] < stats["latency_ms"]:
+                    stats["latency_ms"] = answer["latency_ms"]
+            elif not stats["error"]:
+                stats["error"] = answer["error"]
+
+    for stats in resolvers.values():
+        if not stats["answered"] and not stats["error"]:
+            # still waiting when the race was decided - not necessarily broken
+            stats["error"] = "no answer before winner"
+
+    return {"name": name, "qtypes": list(qtypes), "answers": winners, "resolvers": resolvers}
+
+
+def lookup_sync(name: str, **kwargs) -> dict:
+    """blocking wrapper for callers that aren't async"""
+    return run_sync(lookup(name, **kwargs))
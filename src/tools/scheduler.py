@@ -0,0 +1,349 @@
+# src/tools/scheduler.py
+
+"""
+shared probe scheduler under BaseTool.run
+
+during an outage everyone diagnoses the same thing - fifty web users on
+8.8.8.8 used to mean fifty identical pings and traceroutes. every outermost
+tool run goes through here (base.py) first:
+
+  - singleflight: a run identical to one already in flight (same tool
+    class, target and arguments) waits for that one's result instead of
+    starting its own
+  - a short TTL cache per tool (TOOL_TTLS): a ping is stale after a few
+    seconds, a DNS answer can be reused for as long as its own TTL allows
+    (capped). failures are kept only FAILURE_TTL, an outage may be ending
+  - fair admission for subprocesses: at most MAX_SUBPROCESSES ping /
+    traceroute / nslookup processes at once, the rest queue. the queue takes
+    turns between diagnoses (one per trace), so a batch of a hundred can't
+    starve a single web request
+  - the same kind of admission around whole tool runs, off unless a batch
+    asks for it (run_limit) - ping and dns run in process, the subprocess
+    limit never sees them. it's per batch, not per process: two batches in
+    one daemon each get their own
+
+a result is only shared with a run whose budget it (nearly) covers - a
+traceroute cut short by a 2 s budget isn't what a caller with 20 s wants.
+runs with a callback argument (traceroute's on_hop) always run themselves,
+and a leader that was cancelled (a speculative run nobody wanted) makes
+its followers run on their own.
+
+    PROBE_SCHEDULER=off         no coalescing, no cache
+    MAX_TOOL_SUBPROCESSES=32    admission limit, 0 = none
+"""
+
+import contextvars
+import copy
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from src import tracing
+
+MAX_SUBPROCESSES = int(os.environ.get("MAX_TOOL_SUBPROCESSES", "32"))
+ENABLED = os.environ.get("PROBE_SCHEDULER", "on").lower() not in ("0", "off", "false", "no")
+
+# seconds a successful result stays fresh, per tool. tools not listed are
+# coalesced but never cached
+TOOL_TTLS = {"ping": 5.0, "dns": 30.0, "traceroute": 30.0}
+FAILURE_TTL = 2.0
+MAX_CACHE_ENTRIES = 1024
+BUDGET_SLACK = 0.8      # a run with 80% of a caller's budget is close enough
+WAIT_SLICE = 0.1        # how often a waiter looks at its tool's cancel flag
+WAIT_SAMPLES = 1000     # recent admission waits kept for the percentiles
+
+
+# the whole-run admission of the batch this context belongs to, see run_limit
+_run_admission = contextvars.ContextVar("tool_run_admission", default=None)
+
+
+def tool_name(tool) -> str:
+    return tool.__class__.__name__.removesuffix("Tool").lower()
+
+
+def ttl_for(name: str, result: dict) -> float:
+    """how long `result` of tool `name` may be handed out again"""
+    ttl = TOOL_TTLS.get(name, 0.0)
+    if not ttl or not isinstance(result, dict):
+        return 0.0
+    if not result.get("success"):
+        return min(ttl, FAILURE_TTL)
+    if name == "dns":
+        answer_ttl = (result.get("data") or {}).get("ttl")
+        if answer_ttl is not None:
+            return min(ttl, float(answer_ttl))
+    return ttl
+
+
+def _covers(have, want) -> bool:
+    """
+    a run with budget `have` is good enough for a caller with budget `want`.
+    budgets come from deadlines and never match exactly, hence the slack
+    """
+    return have is None or (want is not None and have >= want * BUDGET_SLACK)
+
+
+def _owner() -> str:
+    """who's asking, for fair queueing - the diagnosis's trace, else the thread"""
+    span = tracing.current_span()
+    return span.trace.trace_id if span is not None else f"thread-{threading.get_ident()}"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class _Flight:
+    def __init__(self, budget):
+        self.budget = budget
+        self.done = threading.Event()
+        self.result = None      # stays None if the leader failed or was cancelled
+
+
+class FairAdmission:
+    """
+    at most `limit` holders at once (None = no limit). waiters are served
+    round robin across owners, first come first served within one owner
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = limit or None
+        self.running = 0
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()    # owner -> deque of tickets, oldest owner first
+        self.admitted = 0
+        self.queued = 0                 # admissions that had to wait
+        self.given_up = 0               # waits that timed out or were cancelled
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def set_limit(self, limit: int = None):
+        with self._cond:
+            self.limit = limit or None
+            self._cond.notify_all()
+
+    def _free(self) -> bool:
+        return self.limit is None or self.running < self.limit
+
+    def acquire(self, owner: str, timeout: float = None, cancelled: threading.Event = None) -> bool:
+        """False if `timeout` ran out or `cancelled` was set before a slot came free"""
+        started = time.monotonic()
+        with self._cond:
+            if not self._queues and self._free():
+                self.running += 1
+                self.admitted += 1
+                self.waits.append(0.0)
+                return True
+            ticket = object()
+            self._queues.setdefault(owner, deque()).append(ticket)
+            self.queued += 1
+            while True:
+                head_owner, queue = next(iter(self._queues.items()))
+                if queue[0] is ticket and self._free():
+                    queue.popleft()
+                    # round robin - the next turn goes to someone else
+                    del self._queues[head_owner]
+                    if queue:
+                        self._queues[head_owner] = queue
+                    self.running += 1
+                    self.admitted += 1
+                    self.waits.append(time.monotonic() - started)
+                    self._cond.notify_all()
+                    return True
+                left = None if timeout is None else timeout - (time.monotonic() - started)
+                if (left is not None and left <= 0) or (cancelled is not None and cancelled.is_set()):
+                    mine = self._queues[owner]
+                    mine.remove(ticket)
+                    if not mine:
+                        del self._queues[owner]
+                    self.given_up += 1
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(WAIT_SLICE if left is None else min(WAIT_SLICE, left))
+
+    def release(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = list(self.waits)
+            return {
+                "limit": self.limit,
+                "running": self.running,
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "given_up": self.given_up,
+                "wait_p50_ms": round(_percentile(waits, 50) * 1000, 1) if waits else None,
+                "wait_p95_ms": round(_percentile(waits, 95) * 1000, 1) if waits else None,
+                "wait_max_ms": round(max(waits) * 1000, 1) if waits else None,
+            }
+
+
+class ProbeScheduler:
+    def __init__(self, enabled: bool = ENABLED, max_subprocesses: int = MAX_SUBPROCESSES):
+        self.enabled = enabled
+        self.default_limit = max_subprocesses
+        self.admission = FairAdmission(max_subprocesses)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._cache = OrderedDict()     # key -> (expires, budget, result), oldest first
+        self.counts = {"requests": 0, "runs": 0, "coalesced": 0, "cached": 0}
+
+    def _count(self, name: str, served: str):
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts[{"run": "runs"}.get(served, served)] += 1
+        tracing.PROBE_REQUESTS.inc(tool=name, served=served)
+
+    @staticmethod
+    def _key(tool, target: str, args, kwargs):
+        # the class, not its name - two classes called PingTool (test doubles)
+        # must never share results
+        options = {k: v for k, v in kwargs.items() if k != "budget"}
+        return (type(tool), target.strip().lower(),
+                json.dumps([list(args), options], sort_keys=True, default=str))
+
+    def run(self, tool, target: str, args, kwargs, call):
+        """call() (the real run) unless an identical run can answer -> (result, "run"|"coalesced"|"cached")"""
+        name = tool_name(tool)
+        if not self.enabled or any(callable(v) for v in list(args) + list(kwargs.values())):
+            self._count(name, "run")
+            return call(), "run"
+
+        budget = kwargs.get("budget")
+        key = self._key(tool, target, args, kwargs)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic() and _covers(cached[1], budget):
+                self._cache.move_to_end(key)
+                result = copy.deepcopy(cached[2])
+            else:
+                result = None
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight(budget)
+                elif not _covers(flight.budget, budget):
+                    flight = None
+        if result is not None:
+            self._count(name, "cached")
+            return result, "cached"
+
+        if flight is None:
+            # one is in flight, but with a tighter budget than ours
+            self._count(name, "run")
+            return call(), "run"
+        if not leader:
+            result = self._follow(flight, tool, budget)
+            if result is not None:
+                self._count(name, "coalesced")
+                return result, "coalesced"
+            self._count(name, "run")
+            return call(), "run"
+
+        self._count(name, "run")
+        result = None
+        try:
+            result = call()
+            return result, "run"
+        finally:
+            shareable = isinstance(result, dict) and not tool.cancelled
+            with self._lock:
+                self._inflight.pop(key, None)
+                ttl = ttl_for(name, result) if shareable else 0.0
+                if ttl > 0:
+                    self._cache[key] = (time.monotonic() + ttl, budget, copy.deepcopy(result))
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > MAX_CACHE_ENTRIES:
+                        self._cache.popitem(last=False)
+            flight.result = copy.deepcopy(result) if shareable else None
+            flight.done.set()
+
+    def _follow(self, flight: _Flight, tool, budget):
+        """the leader's result, or None if it failed / we gave up / we were cancelled"""
+        give_up = None if budget is None else time.monotonic() + budget
+        while not flight.done.is_set():
+            if tool.cancelled or (give_up is not None and time.monotonic() >= give_up):
+                return None
+            left = WAIT_SLICE if give_up is None else min(WAIT_SLICE, give_up - time.monotonic())
+            flight.done.wait(max(0.0, left))
+        return copy.deepcopy(flight.result) if flight.result is not None else None
+
+    @contextmanager
+    def subprocess_slot(self, command: str, timeout: float = None, cancelled: threading.Event = None):
+        """
+        hold one admission slot around a tool subprocess. yields False (and
+        holds nothing) if none came free within `timeout` or `cancelled` was set
+        """
+        started = time.time()
+        admitted = self.admission.acquire(_owner(), timeout, cancelled)
+        waited = time.time() - started
+        tracing.SUBPROCESS_QUEUE_SECONDS.observe(waited, command=command)
+        if waited >= 0.001:
+            tracing.record("subprocess_queue", started, started + waited,
+                           status="ok" if admitted else "error", command=command)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.admission.release()
+
+    @contextmanager
+    def run_limit(self, limit: int = None):
+        """
+        at most `limit` real tool runs at once for everything run in this
+        context, and the pools it binds (tracing.bind). yields the
+        FairAdmission, for its stats. None = no limit
+        """
+        admission = FairAdmission(limit)
+        token = _run_admission.set(admission if limit else None)
+        try:
+            yield admission
+        finally:
+            _run_admission.reset(token)
+
+    @contextmanager
+    def run_slot(self, cancelled: threading.Event = None):
+        """
+        hold one whole-run slot around a real tool run (coalesced and cached
+        answers don't take one), when there's a run_limit. yields False if
+        `cancelled` was set first
+        """
+        admission = _run_admission.get()
+        if admission is None:
+            yield True
+            return
+        admitted = admission.acquire(_owner(), None, cancelled)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                admission.release()
+
+    def set_subprocess_limit(self, limit: int = None):
+        """None goes back to the default (MAX_TOOL_SUBPROCESSES)"""
+        self.admission.set_limit(self.default_limit if limit is None else limit)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            counts["cache_entries"] = len(self._cache)
+            counts["in_flight"] = len(self._inflight)
+        shared = counts["coalesced"] + counts["cached"]
+        counts["coalesce_rate"] = round(shared / counts["requests"], 3) if counts["requests"] else 0.0
+        counts["subprocesses"] = self.admission.stats()
+        return counts
+
+
+SCHEDULER = ProbeScheduler()
@@ -1,72 +1,143 @@
-import subprocess
 import time
 import re
 from src.tools.base import BaseTool
 
 
+# stop after this many "* * *" hops in a row - the path is blackholed and
+# waiting out the rest of max_hops tells us nothing new
+DEFAULT_MAX_CONSECUTIVE_TIMEOUTS = 5
+
+# with a time budget: hops worth probing per second of it, and the range
+# the per-probe wait (-w) is kept in
+HOPS_PER_SECOND = 3
+MIN_HOPS = 8
+MIN_WAIT = 0.5
+MAX_WAIT = 5.0
+
+
+def parse_hop_line(line: str):
+    """turn one line of traceroute output into a hop dict, or None if it isn't a hop"""
+    line = line.strip()
+    if not line:
+        return None
+
+    # skip indented lines (multi-path hops)
+    hop_match = re.match(r"^(\d+)\s", line)
+    if not hop_match:
+        return None
+    hop_num = int(hop_match.group(1))
+
+    # extract ip
+    ip_match = re.search(r"\((\d+\.\d+\.\d+\.\d+)\)", line)
+    ip = ip_match.group(1) if ip_match else None
+
+    # extract delays
+    times = re.findall(r"(\d+\.\d+)\s+ms", line)
+    rtt_ms = round(sum(float(t) for t in times) / len(times), 3) if times else None
+
+    # identify timeout
+    timed_out = "*" in line
+
+    return {
+        "hop_num": hop_num,
+        "ip": ip,
+        "rtt_ms": rtt_ms,
+        "timed_out": timed_out
+    }
+
+
 class TracerouteTool(BaseTool):
     """
     target -> host
     cmd -> traceroute
+
+    output is parsed as it streams in, so self.hops always holds the hops
+    seen so far (readable from another thread while run() is going)
     """
 
-    def run(self, target: str, max_hops: int = 30) -> dict:
+    def __init__(self):
+        super().__init__()
+        self.hops = []
+        self.aborted_early = False
+        self._output = []
+
+    def stream(self, target: str, max_hops: int = 30,
+               max_consecutive_timeouts: int = DEFAULT_MAX_CONSECUTIVE_TIMEOUTS,
+               budget: float = None):
+        """
+        generator - yields each hop dict as soon as traceroute prints it
+        kills traceroute after `max_consecutive_timeouts` fully timed-out hops
+        in a row (pass None to always run to max_hops)
+        with a budget (seconds), max_hops and the per-probe wait shrink to
+        fit and traceroute is killed when it runs out
+        """
+        self.hops = []
+        self.aborted_early = False
+        self._output = []
+        streak = 0
+
+        cmd = ["traceroute"]
+        if budget is not None:
+            max_hops = min(max_hops, max(MIN_HOPS, int(budget * HOPS_PER_SECOND)))
+            # enough of a wait that a run of silent hops still ends inside the budget
+            wait = budget / ((max_consecutive_timeouts or max_hops) + 1)
+            cmd += ["-w", f"{min(MAX_WAIT, max(MIN_WAIT, wait)):.1f}"]
+        # "--": a target is never an option, whatever it starts with
+        cmd += ["-m", str(max_hops), "--", target]
+
+        # hop by hop as they finish, or the silent-hop abort can't see them
+        lines = self._stream_command(cmd, timeout=budget, line_buffered=True)
+        try:
+            for line in lines:
+                self._output.append(line)
+                hop = parse_hop_line(line)
+                if hop is None:
+                    continue
+
+                self.hops.append(hop)
+                yield hop
+
+                # a hop with no ip and no rtt got nothing back at all
+                if hop["ip"] is None and hop["rtt_ms"] is None:
+                    streak += 1
+                else:
+                    streak = 0
+                if max_consecutive_timeouts and streak >= max_consecutive_timeouts:
+                    self.aborted_early = True
+                    break
+        finally:
+            lines.close()
+
+    def run(self, target: str, max_hops: int = 30,
+            max_consecutive_timeouts: int = DEFAULT_MAX_CONSECUTIVE_TIMEOUTS,
+            on_hop=None, budget: float = None) -> dict:
+        """
+        on_hop: optional callback, called with each hop dict as it arrives
+        budget: most seconds this run may take, the hops seen by then are kept
+        """
 
         start = time.time()
 
-        result = subprocess.run(
-            ["traceroute", "-m", str(max_hops), target],
-            capture_output=True,
-            text=True
-        )
+        for hop in self.stream(target, max_hops, max_consecutive_timeouts, budget):
+            if on_hop:
+                on_hop(hop)
 
         duration = time.time() - start
+        raw_output = "".join(self._output)
+        hops = self.hops
 
-        # deal with error
-        if result.returncode != 0:
+        # deal with error - killing it ourselves isn't one
+        if self.returncode != 0 and not (self.aborted_early or self.timed_out):
             return {
                 "tool_name": "traceroute",
                 "target": target,
                 "success": False,
                 "data": {},
-                "raw_output": result.stdout + result.stderr,
+                "raw_output": raw_output,
                 "error": f"traceroute failed for {target}",
                 "duration_seconds": duration
             }
 
-        # parse output
-        lines = result.stdout.split("\n")
-        hops = []
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # skip indented lines (multi-path hops)
-            hop_match = re.match(r"^(\d+)\s", line)
-            if not hop_match:
-                continue
-            hop_num = int(hop_match.group(1))
-
-            # extract ip
-            ip_match = re.search(r"\((\d+\.\d+\.\d+\.\d+)\)", line)
-            ip = ip_match.group(1) if ip_match else None
-
-            # extract delays
-            times = re.findall(r"(\d+\.\d+)\s+ms", line)
-            rtt_ms = round(sum(float(t) for t in times) / len(times), 3) if times else None
-
-            # identify timeout
-            timed_out = "*" in line
-
-            hops.append({
-                "hop_num": hop_num,
-                "ip": ip,
-                "rtt_ms": rtt_ms,
-                "timed_out": timed_out
-            })
-
         return {
             "tool_name": "traceroute",
             "target": target,
@@ -74,9 +145,11 @@ class TracerouteTool(BaseTool):
             "data": {
                 "hops": hops,
                 "total_hops": len(hops),
-                "reached_destination": len(hops) > 0 and hops[-1]["ip"] is not None and hops[-1]["rtt_ms"] is not None
+                "reached_destination": len(hops) > 0 and hops[-1]["ip"] is not None and hops[-1]["rtt_ms"] is not None,
+                "aborted_early": self.aborted_early,
+                "budget_exhausted": self.timed_out
             },
-            "raw_output": result.stdout,
+            "raw_output": raw_output,
             "error": "",
             "duration_seconds": duration
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,298 @@
+# src/tracing.py
+
+"""
+hierarchical spans + prometheus metrics for the diagnose pipeline
+
+    with tracing.span("llm", provider="openai", model=model) as s:
+        ...
+        s.set(prompt_tokens=1200)
+
+spans nest through a contextvar: diagnosis -> react step -> llm call / tool
+run -> subprocess. work handed to a thread pool keeps its parent if it's
+submitted through bind(). every finished trace is kept (last MAX_TRACES)
+and can be exported as plain JSON or OTLP/JSON, the OpenTelemetry wire
+format - set OTEL_EXPORTER_OTLP_ENDPOINT and each trace is also POSTed to
+<endpoint>/v1/traces.
+
+every span also feeds latency histograms per phase, LLM provider/model and
+tool, plus token counters (prompt cache hits vs misses, where the provider
+reports them). the probe scheduler (src/tools/scheduler.py) adds how tool
+runs were served and subprocess queue waits. all of it is rendered in the prometheus text format by render_metrics() (app.py
+serves it on /metrics). no client library needed.
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_TRACES = 200
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "network-diagnostic-agent")
+
+# seconds - from an in-process dns answer up to a full traceroute
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current = contextvars.ContextVar("current_span", default=None)
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    def __init__(self, name: str, trace: Trace, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def current_span():
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """time a block as a child of the current span (or as a new trace's root)"""
+    parent = _current.get()
+    trace = parent.trace if parent else Trace()
+    s = Span(name, trace, parent.span_id if parent else None, attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except GeneratorExit:
+        # a stream closed on purpose, not a failure
+        raise
+    except BaseException as e:
+        s.status = "error"
+        s.attributes["error"] = f"{e.__class__.__name__}: {e}"[:200]
+        raise
+    finally:
+        _current.reset(token)
+        _finish(s, root=parent is None)
+
+
+def record(name: str, start: float, end: float, status: str = "ok", **attributes):
+    """
+    add an already-finished span under the current one - for work timed
+    inside a generator, where changing the current span would leak into
+    the caller between yields
+    """
+    parent = _current.get()
+    trace = parent.trace if parent else Trace()
+    s = Span(name, trace, parent.span_id if parent else None, attributes)
+    s.start, s.end, s.status = start, end, status
+    _finish(s, root=parent is None)
+    return s
+
+
+def bind(fn):
+    """fn, set to run in (a copy of) the current context - use when submitting to a pool"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def _finish(s: Span, root: bool):
+    if s.end is None:
+        s.end = time.time()
+    s.trace.add(s)
+    _observe(s)
+    if root:
+        with _traces_lock:
+            _traces[s.trace.trace_id] = s.trace
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+        if OTLP_ENDPOINT:
+            threading.Thread(target=_post_otlp, args=(s.trace,), daemon=True).start()
+
+
+def get_trace(trace_id: str):
+    with _traces_lock:
+        return _traces.get(trace_id)
+
+
+# -- export -----------------------------------------------------------------
+
+def trace_to_json(trace: Trace) -> dict:
+    spans = sorted(trace.spans, key=lambda s: s.start)
+    return {"trace_id": trace.trace_id, "spans": [s.to_dict() for s in spans]}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def trace_to_otlp(trace: Trace) -> dict:
+    """OTLP/JSON (ExportTraceServiceRequest), what an OpenTelemetry collector accepts"""
+    spans = []
+    for s in sorted(trace.spans, key=lambda s: s.start):
+        otlp = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # internal
+            "startTimeUnixNano": str(int(s.start * 1e9)),
+            "endTimeUnixNano": str(int(s.end * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2 if s.status == "error" else 1},
+        }
+        if s.parent_id:
+            otlp["parentSpanId"] = s.parent_id
+        spans.append(otlp)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "src.tracing"}, "spans": spans}],
+    }]}
+
+
+def _post_otlp(trace: Trace):
+    request = urllib.request.Request(
+        OTLP_ENDPOINT.rstrip("/") + "/v1/traces",
+        data=json.dumps(trace_to_otlp(trace)).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        urllib.request.urlopen(request, timeout=5).close()
+    except OSError:
+        pass  # tracing must never break a diagnosis
+
+
+# -- metrics ----------------------------------------------------------------
+
+class Histogram:
+    """prometheus-style cumulative histogram, one series per label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(self.labelnames, key))
+                sep = "," if labels else ""
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = ",".join(f'{n}="{v}"' for n, v in zip(self.labelnames, key))
+                lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+PHASE_SECONDS = Histogram("netdiag_phase_duration_seconds", "Time per pipeline phase (span name)", ("phase", "status"))
+LLM_SECONDS = Histogram("netdiag_llm_duration_seconds", "Time per LLM call", ("provider", "model"))
+TOOL_SECONDS = Histogram("netdiag_tool_duration_seconds", "Time per tool run", ("tool",))
+LLM_TOKENS = Counter("netdiag_llm_tokens_total", "Estimated LLM tokens", ("provider", "model", "type"))
+LLM_INPUT_TOKENS = Counter("netdiag_llm_input_tokens_total",
+                           "LLM input tokens as reported by the provider, by prompt cache hit", ("provider", "model", "cache"))
+PROBE_REQUESTS = Counter("netdiag_probe_requests_total",
+                         "Tool runs asked for, by how the probe scheduler served them (run, coalesced, cached)",
+                         ("tool", "served"))
+SUBPROCESS_QUEUE_SECONDS = Histogram("netdiag_subprocess_queue_wait_seconds",
+                                     "Time a tool subprocess waited for an admission slot", ("command",))
+METRICS = [PHASE_SECONDS, LLM_SECONDS, TOOL_SECONDS, LLM_TOKENS, LLM_INPUT_TOKENS, PROBE_REQUESTS,
+           SUBPROCESS_QUEUE_SECONDS]
+
+
+def _observe(s: Span):
+    PHASE_SECONDS.observe(s.duration, phase=s.name, status=s.status)
+    a = s.attributes
+    if s.name == "llm":
+        LLM_SECONDS.observe(s.duration, provider=a.get("provider"), model=a.get("model"))
+        for kind in ("prompt", "completion"):
+            if a.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc(a[f"{kind}_tokens"], provider=a.get("provider"), model=a.get("model"), type=kind)
+        if a.get("input_tokens"):
+            cached = a.get("cached_tokens", 0)
+            LLM_INPUT_TOKENS.inc(cached, provider=a.get("provider"), model=a.get("model"), cache="hit")
+            LLM_INPUT_TOKENS.inc(a["input_tokens"] - cached, provider=a.get("provider"), model=a.get("model"),
+                                 cache="miss")
+    elif s.name == "tool":
+        TOOL_SECONDS.observe(s.duration, tool=a.get("tool"))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"